@@ -0,0 +1,359 @@
+"""
+Метрики в формате Prometheus: счетчики, gauge и гистограммы в памяти
+процесса и страница /metrics для сборщика.
+
+Обновление метрики - словарь и блокировка, без ввода-вывода, поэтому их
+можно вызывать на горячих путях (каждый запрос, каждое сообщение чата).
+
+Несколько процессов (METRICS_DIR): каждый процесс раз в
+METRICS_FLUSH_INTERVAL секунд и при завершении пишет снимок своих метрик в
+METRICS_DIR/metrics-<pid>.json. /metrics, в каком бы процессе он ни
+выполнился, складывает снимки всех процессов:
+
+- счетчики и гистограммы суммируются, включая завершившиеся процессы
+  (иначе счетчики уменьшались бы при перезапуске воркера);
+- gauge (открытые соединения, очередь потоков) суммируются только по живым
+  процессам.
+
+Каталог METRICS_DIR стоит очищать при развертывании.
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Границы гистограмм по умолчанию, секунды
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_metrics = {}
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        # значения меток -> значение
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics[name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+
+    def _copy(self, value):
+        return value
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [попадания в каждый интервал (последний - +Inf), сумма]
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def time(self, **labels):
+        """Контекстный менеджер: наблюдает время выполнения блока"""
+        return _Timer(self, labels)
+
+    def _copy(self, value):
+        return [list(value[0]), value[1]]
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+# HTTP
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP-запросы", ["view", "method", "status"])
+HTTP_DURATION = Histogram("http_request_duration_seconds", "Время ответа на HTTP-запрос", ["view", "method"])
+
+# WebSocket
+CHAT_CONNECTIONS = Gauge("chat_connections_open", "Открытые WebSocket чатов задач")
+CHAT_CONNECTS = Counter("chat_connects_total", "Подключения к чатам задач")
+CHAT_DISCONNECTS = Counter("chat_disconnects_total", "Отключения от чатов задач")
+CHAT_MESSAGES = Counter("chat_messages_received_total", "Сообщения чата, полученные от клиентов")
+BOARD_CONNECTIONS = Gauge("board_connections_open", "Открытые WebSocket досок проектов")
+GROUP_SEND_DURATION = Histogram(
+    "group_send_duration_seconds", "Время рассылки события в группу слоя каналов", ["group"]
+)
+CONSUMER_DB_DURATION = Histogram(
+    "consumer_db_duration_seconds", "Время обращения consumer к БД (в потоке)", ["call"]
+)
+
+# Потоки sync_to_async
+THREAD_POOL_QUEUED = Gauge(
+    "sync_to_async_queued", "Вызовы sync_to_async, ждущие свободного потока", ["pool"]
+)
+THREAD_POOL_WAIT = Histogram(
+    "sync_to_async_wait_seconds", "Ожидание потока вызовами sync_to_async", ["pool"]
+)
+
+
+def metered_sync_to_async(func, pool, thread_sensitive=True):
+    """
+    sync_to_async с учетом очереди потоков: сколько вызовов ждут поток
+    (THREAD_POOL_QUEUED) и сколько ждал каждый (THREAD_POOL_WAIT).
+    """
+    def run(queued_at, state, *args, **kwargs):
+        state["started"] = True
+        THREAD_POOL_QUEUED.dec(pool=pool)
+        THREAD_POOL_WAIT.observe(time.perf_counter() - queued_at, pool=pool)
+        return func(*args, **kwargs)
+
+    in_thread = sync_to_async(run, thread_sensitive=thread_sensitive)
+
+    async def call(*args, **kwargs):
+        state = {"started": False}
+        THREAD_POOL_QUEUED.inc(pool=pool)
+        try:
+            return await in_thread(time.perf_counter(), state, *args, **kwargs)
+        finally:
+            # Вызов отменили, пока он ждал в очереди
+            if not state["started"]:
+                THREAD_POOL_QUEUED.dec(pool=pool)
+
+    return call
+
+
+def consumer_db_call(func):
+    """Замена @sync_to_async для методов consumer, обращающихся к БД"""
+    def timed(*args, **kwargs):
+        with CONSUMER_DB_DURATION.time(call=func.__name__):
+            return func(*args, **kwargs)
+
+    return metered_sync_to_async(timed, pool="consumer")
+
+
+# Снимки процессов
+
+def snapshot():
+    return {
+        "pid": os.getpid(),
+        "metrics": {name: metric.snapshot() for name, metric in _metrics.items()},
+    }
+
+
+def _snapshot_path(directory, pid):
+    return Path(directory) / f"metrics-{pid}.json"
+
+
+def write_snapshot(directory):
+    """Атомарно записывает снимок метрик процесса в directory"""
+    path = _snapshot_path(directory, os.getpid())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Снимок может писаться одновременно фоновым потоком и /metrics
+    temporary = path.with_name(f"{path.stem}.{threading.get_ident()}.tmp")
+    temporary.write_text(json.dumps(snapshot()))
+    os.replace(temporary, path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect(directory=None):
+    """Метрики всех процессов: {имя: {значения меток: значение}}"""
+    if not directory:
+        snapshots = [snapshot()]
+    else:
+        write_snapshot(directory)
+        snapshots = []
+        for path in Path(directory).glob("metrics-*.json"):
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                # Файл удален или перезаписывается - процесс учтется в следующий раз
+                continue
+
+    merged = {name: {} for name in _metrics}
+    for process in snapshots:
+        alive = process["pid"] == os.getpid() or _pid_alive(process["pid"])
+        for name, values in process["metrics"].items():
+            metric = _metrics.get(name)
+            if metric is None or (metric.type == "gauge" and not alive):
+                continue
+            for key, value in values:
+                key = tuple(key)
+                current = merged[name].get(key)
+                if current is None:
+                    merged[name][key] = value
+                elif metric.type == "histogram":
+                    merged[name][key] = [[a + b for a, b in zip(current[0], value[0])], current[1] + value[1]]
+                else:
+                    merged[name][key] = current + value
+    return merged
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render(merged):
+    """Текстовый формат экспозиции Prometheus"""
+    lines = []
+    for name, metric in _metrics.items():
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.type}")
+        for key, value in sorted(merged.get(name, {}).items()):
+            if metric.type != "histogram":
+                lines.append(f"{name}{_labels(metric.labels, key)} {value}")
+                continue
+            counts, total = value
+            cumulative = 0
+            bounds = [str(bound) for bound in metric.buckets] + ["+Inf"]
+            for bound, bucket in zip(bounds, counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_labels(metric.labels, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(metric.labels, key)} {total}")
+            lines.append(f"{name}_count{_labels(metric.labels, key)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+_flusher_started = False
+_flusher_lock = threading.Lock()
+
+
+def start_flusher():
+    """Периодическая запись снимка процесса в METRICS_DIR (если задан)"""
+    global _flusher_started
+    directory = settings.METRICS_DIR
+    if not directory:
+        return
+    with _flusher_lock:
+        if _flusher_started:
+            return
+        _flusher_started = True
+
+    def run():
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            write_snapshot(directory)
+
+    threading.Thread(target=run, name="metrics-flush", daemon=True).start()
+    atexit.register(write_snapshot, directory)
+
+
+# Адреса, с которых /metrics доступен без METRICS_TOKEN
+LOCAL_ADDRESSES = ("127.0.0.1", "::1")
+
+
+def metrics_view(request):
+    """
+    Страница /metrics для сборщика Prometheus.
+
+    С METRICS_TOKEN нужен заголовок "Authorization: Bearer <токен>", без
+    него страница отдается только локальным клиентам (сборщик на той же
+    машине): метрики раскрывают трафик по адресам и состояние потоков.
+    За обратным прокси на той же машине локальными выглядят все клиенты -
+    там METRICS_TOKEN обязателен.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        if request.headers.get("Authorization") != f"Bearer {token}":
+            return HttpResponseForbidden()
+    elif request.META.get("REMOTE_ADDR") not in LOCAL_ADDRESSES:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render(collect(settings.METRICS_DIR)),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+class MetricsMiddleware:
+    """Число и время HTTP-запросов по представлениям (url_name)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        start_flusher()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, start)
+        return response
+
+    @staticmethod
+    def observe(request, response, start):
+        match = request.resolver_match
+        # Незнакомые URL не раздувают число рядов метрики
+        view = (match.url_name or match.view_name) if match else "unmatched"
+        HTTP_DURATION.observe(time.perf_counter() - start, view=view, method=request.method)
+        HTTP_REQUESTS.inc(view=view, method=request.method, status=response.status_code)
@@ -0,0 +1,114 @@
+"""
+Маршрутизация запросов к БД: чтение моделей core - с реплик, запись - в default.
+
+Реплики перечислены в settings.READ_REPLICAS (пусто - все идет в default).
+Чтобы пользователь сразу видел свои изменения несмотря на отставание
+реплик, после записи чтение на REPLICA_PIN_SECONDS секунд закрепляется за
+основной БД:
+
+- в пределах запроса или WebSocket-соединения - через contextvar;
+- между запросами - через сессию (ReplicaPinMiddleware), чтобы страница,
+  загруженная сразу после POST, тоже читала из основной БД.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ROUTED_APPS = {"core"}
+SESSION_KEY = "_db_pinned_until"
+
+# До какого момента (time.time()) чтение идет в основную БД
+_pinned_until = ContextVar("db_pinned_until", default=0.0)
+
+
+def pin_to_primary(seconds=None):
+    """Закрепляет чтение за основной БД на REPLICA_PIN_SECONDS секунд"""
+    if seconds is None:
+        seconds = settings.REPLICA_PIN_SECONDS
+    _pinned_until.set(max(_pinned_until.get(), time.time() + seconds))
+
+
+def is_pinned():
+    return _pinned_until.get() > time.time()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS or not settings.READ_REPLICAS:
+            return None
+        # Внутри транзакции читаем то же, что пишем
+        if is_pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.READ_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        if settings.READ_REPLICAS:
+            pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и в основной БД
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик приходит вместе с данными из основной БД
+        if db in settings.READ_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """
+    Переносит закрепление за основной БД между запросами одной сессии.
+
+    Подключается после SessionMiddleware. Поддерживает и async-цепочку
+    (ASYNC_VIEWS), чтобы не переводить асинхронные представления в поток.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        pinned_until = self._session_pin(request)
+        token = _pinned_until.set(pinned_until)
+        try:
+            response = self.get_response(request)
+            self._save_pin(request, pinned_until)
+        finally:
+            _pinned_until.reset(token)
+        return response
+
+    async def __acall__(self, request):
+        # Сессия читается из БД, поэтому в потоке и только при наличии реплик
+        pinned_until = await sync_to_async(self._session_pin)(request) if settings.READ_REPLICAS else 0
+        token = _pinned_until.set(pinned_until)
+        try:
+            response = await self.get_response(request)
+            if _pinned_until.get() > pinned_until:
+                await sync_to_async(self._save_pin)(request, pinned_until)
+        finally:
+            _pinned_until.reset(token)
+        return response
+
+    @staticmethod
+    def _session_pin(request):
+        return request.session.get(SESSION_KEY, 0) if settings.READ_REPLICAS else 0
+
+    @staticmethod
+    def _save_pin(request, pinned_until):
+        # Сессия пишется, только если в этом запросе была запись
+        if _pinned_until.get() > pinned_until:
+            request.session[SESSION_KEY] = _pinned_until.get()
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -23,9 +24,30 @@ INSTALLED_APPS = [
     "core",
 ]
 
+# Замеры запросов (config/timing.py): заголовок Server-Timing (только при
+# DEBUG и персоналу) и журнал медленных запросов. Включаются REQUEST_TIMING=1,
+# по умолчанию middleware не подключается, а шаблоны рендерит обычный бэкенд.
+REQUEST_TIMING = os.environ.get("REQUEST_TIMING", "0") == "1"
+# Медленный запрос: дольше SLOW_REQUEST_MS или от SLOW_REQUEST_QUERIES SQL-запросов
+SLOW_REQUEST_MS = 500
+SLOW_REQUEST_QUERIES = 50
+# Сколько самых долгих SQL-запросов попадает в журнал
+SLOW_QUERIES_LOGGED = 3
+
+# Метрики Prometheus на /metrics (config/metrics.py). При нескольких
+# процессах METRICS_DIR - общий каталог для снимков метрик процессов,
+# METRICS_TOKEN - токен Bearer, без которого /metrics не отдается; если токен
+# не задан, /metrics доступен только с localhost.
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = 5
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
 MIDDLEWARE = [
+    'config.timing.RequestTimingMiddleware',
+    'config.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'config.routers.ReplicaPinMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -37,7 +59,7 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'config.timing.TimedDjangoTemplates' if REQUEST_TIMING else 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -50,15 +72,98 @@ TEMPLATES = [
     },
 ]
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # Медленные запросы, по одной JSON-строке
+        'config.timing': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 WSGI_APPLICATION = 'config.wsgi.application'
 ASGI_APPLICATION = 'config.asgi.application'
 
-CHANNEL_LAYERS = {
+# Слой каналов (переменная окружения CHANNEL_LAYER):
+#   memory - только один процесс (по умолчанию)
+#   sqlite - несколько процессов на одной машине через общий файл, без доп. сервисов
+#   redis  - несколько машин, адрес в REDIS_URL (нужен channels-redis)
+CHANNEL_LAYER = os.environ.get("CHANNEL_LAYER", "memory")
+
+if CHANNEL_LAYER == "redis":
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/0")]},
+        }
+    }
+elif CHANNEL_LAYER == "sqlite":
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "core.channel_layers.SQLiteChannelLayer",
+            "CONFIG": {"path": os.environ.get("CHANNEL_LAYER_PATH", BASE_DIR / "channels.sqlite3")},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer"
+        }
+    }
+
+CACHES = {
     "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     }
 }
 
+# Время жизни отрендеренных колонок доски в кэше (секунды).
+# Актуальность гарантирует версия доски в ключе, а не TTL.
+BOARD_CACHE_TIMEOUT = 300
+
+# Асинхронные представления страниц чтения (core/async_views.py) вместо
+# обычных. Имеет смысл только под ASGI (daphne): под WSGI каждое
+# async-представление выполняется в отдельном цикле событий.
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "") == "1"
+
+# Сколько карточек колонки рендерится сразу, остальные догружаются при прокрутке
+BOARD_PAGE_SIZE = 50
+
+# Сколько сообщений чата отправляется при подключении и за одну догрузку
+CHAT_PAGE_SIZE = 50
+
+# Отложенная запись сообщений чата: сообщение рассылается сразу, а в БД
+# пишется пачками не реже раза в CHAT_FLUSH_INTERVAL секунд (см. core/chat_buffer.py)
+CHAT_WRITE_BEHIND = os.environ.get("CHAT_WRITE_BEHIND", "") == "1"
+CHAT_FLUSH_INTERVAL = 0.2
+CHAT_FLUSH_BATCH_SIZE = 100
+
+# Присутствие в чатах задач (core/presence.py): клиент шлет heartbeat раз в
+# PRESENCE_HEARTBEAT секунд, без него участник пропадает через PRESENCE_TTL.
+# Изменения рассылаются не чаще раза в PRESENCE_BROADCAST_INTERVAL секунд,
+# "печатает" гаснет через TYPING_TIMEOUT секунд без новых нажатий.
+PRESENCE_HEARTBEAT = 15
+PRESENCE_TTL = 45
+PRESENCE_BROADCAST_INTERVAL = 0.3
+TYPING_TIMEOUT = 5
+
+# Длина ключа сортировки, после которой список перенумеровывается в фоне
+RANK_REBALANCE_LENGTH = 24
+
+# Архив (core/archive.py, команда archive_tasks): задачи, которые больше
+# ARCHIVE_AFTER_DAYS дней не менялись в последней колонке проекта,
+# переносятся в архив пачками по ARCHIVE_BATCH_SIZE
+ARCHIVE_AFTER_DAYS = 30
+ARCHIVE_BATCH_SIZE = 500
+
+# Импорт проекта через страницу идет одной транзакцией и держит блокировку
+# записи SQLite (около 0,5 с на мегабайт выгрузки). Файлы больше
+# IMPORT_MAX_UPLOAD_SIZE байт загружаются командой import_project
+IMPORT_MAX_UPLOAD_SIZE = 2 * 1024 * 1024
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -66,6 +171,72 @@ DATABASES = {
     }
 }
 
+# Профиль БД (переменная окружения DB_PROFILE):
+#   default    - стандартные настройки SQLite, для разработки
+#   production - WAL, PRAGMA, busy timeout, BEGIN IMMEDIATE и постоянные
+#                соединения (см. config/sqlite/base.py)
+DB_PROFILE = os.environ.get('DB_PROFILE', 'default')
+
+# PRAGMA production-профиля, выполняются при каждом подключении
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # В режиме WAL NORMAL не теряет целостность, только последние
+    # транзакции при отключении питания
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,  # 20 МБ
+    'mmap_size': 134217728,  # 128 МБ
+    'temp_store': 'MEMORY',
+}
+
+
+def sqlite_init_command(pragmas):
+    return '; '.join(f'PRAGMA {name} = {value}' for name, value in pragmas.items())
+
+
+if DB_PROFILE == 'production':
+    DATABASES['default'].update({
+        'ENGINE': 'config.sqlite',
+        'OPTIONS': {
+            # Сколько секунд ждать освобождения блокировки записи
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': sqlite_init_command(SQLITE_PRAGMAS),
+        },
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    })
+
+# Реплики только для чтения (переменная окружения DB_REPLICAS - пути через
+# запятую). Для локальной проверки подойдет та же база, открытая только на
+# чтение: DB_REPLICAS="file:db.sqlite3?mode=ro"
+READ_REPLICAS = []
+# journal_mode хранится в самом файле, а соединение только на чтение не может
+# его менять. BEGIN IMMEDIATE на реплике не нужен: она ничего не пишет
+REPLICA_OPTIONS = {
+    name: value for name, value in DATABASES['default'].get('OPTIONS', {}).items()
+    if name != 'transaction_mode'
+}
+if 'init_command' in REPLICA_OPTIONS:
+    REPLICA_OPTIONS['init_command'] = sqlite_init_command({
+        name: value for name, value in SQLITE_PRAGMAS.items() if name != 'journal_mode'
+    })
+for index, name in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': name.strip(),
+        'OPTIONS': REPLICA_OPTIONS,
+        # В тестах реплики смотрят в тестовую основную БД
+        'TEST': {'MIRROR': 'default'},
+    }
+    READ_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['config.routers.ReplicaRouter']
+
+# Сколько секунд после записи пользователь читает из основной БД
+# (должно покрывать отставание реплик)
+REPLICA_PIN_SECONDS = 5
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
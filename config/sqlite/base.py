@@ -0,0 +1,39 @@
+"""
+SQLite для production-профиля (DB_PROFILE=production в settings).
+
+Стандартный бэкенд Django 4.2 не позволяет выполнить команды при
+подключении и задать режим начала транзакции, поэтому здесь это делается
+для каждого нового соединения:
+
+- OPTIONS["init_command"] - SQL через ";", выполняемый при подключении
+  (PRAGMA journal_mode=WAL: читатели не блокируют писателя и наоборот;
+  synchronous, cache_size, mmap_size).
+- OPTIONS["transaction_mode"] - как начинать транзакции. IMMEDIATE берет
+  блокировку записи сразу в BEGIN: конкурирующие транзакции ждут в busy
+  timeout (OPTIONS["timeout"]), а не падают с "database is locked" при
+  попытке перейти от чтения к записи.
+
+Обе опции называются и работают так же, как в стандартном бэкенде
+Django 5.1, поэтому после обновления достаточно сменить ENGINE.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        # Это не параметры sqlite3.connect
+        kwargs.pop("init_command", None)
+        kwargs.pop("transaction_mode", None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for statement in self.settings_dict["OPTIONS"].get("init_command", "").split(";"):
+            if statement.strip():
+                conn.execute(statement)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict["OPTIONS"].get("transaction_mode")
+        self.cursor().execute(f"BEGIN {mode}" if mode else "BEGIN")
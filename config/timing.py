@@ -0,0 +1,187 @@
+"""
+Замеры запросов: число и время SQL-запросов, время рендера шаблонов и
+общее время ответа.
+
+Результат уходит в заголовке Server-Timing (виден во вкладке Network
+браузера) - только при DEBUG и персоналу (is_staff), чтобы посторонние не
+видели число и время SQL-запросов. Запросы дольше SLOW_REQUEST_MS или с числом SQL-запросов
+от SLOW_REQUEST_QUERIES пишутся в журнал "config.timing" одной JSON-строкой
+вместе с самыми долгими SQL-запросами.
+
+Замеры собираются в объект текущего запроса в contextvar, поэтому учитываются
+и запросы из потоков sync_to_async (асинхронные представления,
+gather_queries). При REQUEST_TIMING = False middleware не подключается
+(MiddlewareNotUsed), обертка SQL не ставится, а шаблоны рендерит обычный
+бэкенд - накладных расходов нет.
+"""
+import heapq
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from itertools import count
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+# Замеры текущего запроса (None - вне запроса)
+_current = ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    def __init__(self, slowest=3):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self._slowest_size = slowest
+        # (время, порядковый номер, sql) самых долгих запросов, min-куча
+        self._slowest = []
+        self._order = count()
+        # Запросы могут идти из нескольких потоков одновременно
+        self._lock = threading.Lock()
+
+    def add_query(self, sql, duration):
+        with self._lock:
+            self.queries += 1
+            self.db_time += duration
+            item = (duration, next(self._order), sql)
+            if len(self._slowest) < self._slowest_size:
+                heapq.heappush(self._slowest, item)
+            elif self._slowest_size:
+                heapq.heappushpop(self._slowest, item)
+
+    def add_template(self, duration):
+        with self._lock:
+            self.template_time += duration
+
+    def slowest(self):
+        return [
+            {"sql": sql[:1000], "ms": round(duration * 1000, 2)}
+            for duration, _, sql in sorted(self._slowest, reverse=True)
+        ]
+
+    def server_timing(self, total):
+        return ", ".join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} SQL"',
+            f"tpl;dur={self.template_time * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+
+
+def _timed_execute(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.add_query(sql, time.perf_counter() - start)
+
+
+def _install_execute_wrapper(sender, connection, **kwargs):
+    # Сигнал приходит при каждом переподключении того же объекта соединения
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timing = _current.get()
+        if timing is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timing.add_template(time.perf_counter() - start)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django с замером времени рендера (при REQUEST_TIMING)"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def _show_timing(request):
+    """Можно ли отдать Server-Timing клиенту этого запроса"""
+    if settings.DEBUG:
+        return True
+    user = getattr(request, "user", None)
+    return bool(user is not None and user.is_staff)
+
+
+class RequestTimingMiddleware:
+    """
+    Замеры каждого запроса: заголовок Server-Timing и журнал медленных.
+
+    Подключается первым, чтобы время включало остальные middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        connection_created.connect(_install_execute_wrapper, dispatch_uid="config.timing")
+        for connection in connections.all(initialized_only=True):
+            _install_execute_wrapper(None, connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timing = RequestTiming(settings.SLOW_QUERIES_LOGGED)
+        token = _current.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timing, _show_timing(request))
+
+    async def __acall__(self, request):
+        timing = RequestTiming(settings.SLOW_QUERIES_LOGGED)
+        token = _current.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        # Пользователь сессии загружается из БД - не в цикле событий
+        show_timing = await sync_to_async(_show_timing)(request)
+        return self.finish(request, response, timing, show_timing)
+
+    def finish(self, request, response, timing, show_timing):
+        total = time.perf_counter() - timing.started
+        # Потоковый ответ еще не отдан: его время здесь неполное
+        if show_timing and not response.streaming:
+            response["Server-Timing"] = timing.server_timing(total)
+
+        if total * 1000 >= settings.SLOW_REQUEST_MS or timing.queries >= settings.SLOW_REQUEST_QUERIES:
+            logger.warning(json.dumps({
+                "event": "slow_request",
+                "method": request.method,
+                "path": request.get_full_path(),
+                "status": response.status_code,
+                "total_ms": round(total * 1000, 1),
+                "db_ms": round(timing.db_time * 1000, 1),
+                "queries": timing.queries,
+                "template_ms": round(timing.template_time * 1000, 1),
+                "slowest_queries": timing.slowest(),
+            }, ensure_ascii=False))
+        return response
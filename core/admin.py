@@ -1,11 +1,55 @@
 from django.contrib import admin
+from django.db.models import F, Q
+from .board_cache import bump_board_version
 from .models import Project, Column, Task, Label, ChecklistItem, Message
+from .search import search_condition, search_rank
+
+
+class TaskCountersMixin:
+    """Пересчет счетчиков задачи после правок чеклиста/сообщений в админке"""
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        Task.objects.filter(id=obj.task_id).rebuild_counters()
+        bump_board_version(obj.task.project_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        Task.objects.filter(id=obj.task_id).rebuild_counters()
+        bump_board_version(obj.task.project_id)
+
+    def delete_queryset(self, request, queryset):
+        task_ids = list(queryset.values_list('task_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        tasks = Task.objects.filter(id__in=task_ids)
+        tasks.rebuild_counters()
+        for project_id in tasks.values_list('project_id', flat=True).distinct():
+            bump_board_version(project_id)
+
+
+class BoardVersionMixin:
+    """Сброс версии доски после правок в админке (кэш колонок и ETag страниц)"""
+    board_project_field = 'project_id'
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        bump_board_version(getattr(form.instance, self.board_project_field))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_board_version(getattr(obj, self.board_project_field))
+
+    def delete_queryset(self, request, queryset):
+        project_ids = list(queryset.values_list(self.board_project_field, flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        for project_id in project_ids:
+            bump_board_version(project_id)
 
 
 class ColumnInline(admin.TabularInline):
     model = Column
     extra = 0
-    ordering = ['order']
+    ordering = ['rank']
 
 
 class LabelInline(admin.TabularInline):
@@ -14,7 +58,9 @@ class LabelInline(admin.TabularInline):
 
 
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(BoardVersionMixin, admin.ModelAdmin):
+    board_project_field = 'id'
+
     list_display = ['name', 'slug', 'icon', 'color', 'task_count', 'created_at']
     list_filter = ['color', 'icon', 'created_at']
     search_fields = ['name', 'slug']
@@ -28,11 +74,11 @@ class ProjectAdmin(admin.ModelAdmin):
 
 
 @admin.register(Column)
-class ColumnAdmin(admin.ModelAdmin):
-    list_display = ['name', 'project', 'color', 'order', 'task_count']
+class ColumnAdmin(BoardVersionMixin, admin.ModelAdmin):
+    list_display = ['name', 'project', 'color', 'rank', 'task_count']
     list_filter = ['project']
     search_fields = ['name', 'project__name']
-    ordering = ['project', 'order']
+    ordering = ['project', 'rank']
 
     def task_count(self, obj):
         return obj.tasks.count()
@@ -42,7 +88,7 @@ class ColumnAdmin(admin.ModelAdmin):
 class ChecklistInline(admin.TabularInline):
     model = ChecklistItem
     extra = 0
-    ordering = ['order']
+    ordering = ['rank']
 
 
 class MessageInline(admin.TabularInline):
@@ -56,11 +102,11 @@ class MessageInline(admin.TabularInline):
 
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(BoardVersionMixin, admin.ModelAdmin):
     list_display = ['title', 'project', 'column', 'priority', 'due_date', 'created_by', 'is_overdue_display', 'created_at']
     list_filter = ['priority', 'project', 'column', 'created_by', 'due_date']
     search_fields = ['title', 'description', 'project__name']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['created_at', 'updated_at', 'message_count', 'completed_checklist_count', 'total_checklist_count']
     filter_horizontal = ['labels']
     inlines = [ChecklistInline, MessageInline]
     date_hierarchy = 'created_at'
@@ -71,21 +117,43 @@ class TaskAdmin(admin.ModelAdmin):
             'fields': ('title', 'description', 'project', 'column')
         }),
         ('Детали', {
-            'fields': ('priority', 'due_date', 'labels', 'order')
+            'fields': ('priority', 'due_date', 'labels', 'rank')
         }),
         ('Метаданные', {
-            'fields': ('created_by', 'created_at', 'updated_at'),
+            'fields': ('created_by', 'created_at', 'updated_at',
+                       'message_count', 'completed_checklist_count', 'total_checklist_count'),
             'classes': ('collapse',)
         }),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        # Название и описание ищутся по полнотекстовому индексу - по началу
+        # слов, а не по подстроке, как в стандартном поиске админки
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        queryset = queryset.filter(
+            search_condition(search_term) | Q(project__name__icontains=search_term)
+        ).annotate(search_rank=search_rank(search_term))
+        return queryset, False
+
+    def get_ordering(self, request):
+        # При поиске сначала самые релевантные задачи
+        if request.GET.get('q', '').strip():
+            return [F('search_rank').asc(nulls_last=True), '-created_at']
+        return super().get_ordering(request)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        Task.objects.filter(id=form.instance.id).rebuild_counters()
+
     def is_overdue_display(self, obj):
         return '⚠️ Да' if obj.is_overdue else '✓ Нет'
     is_overdue_display.short_description = 'Просрочено'
 
 
 @admin.register(Label)
-class LabelAdmin(admin.ModelAdmin):
+class LabelAdmin(BoardVersionMixin, admin.ModelAdmin):
     list_display = ['name', 'project', 'color', 'task_count']
     list_filter = ['project', 'color']
     search_fields = ['name', 'project__name']
@@ -96,15 +164,15 @@ class LabelAdmin(admin.ModelAdmin):
 
 
 @admin.register(ChecklistItem)
-class ChecklistItemAdmin(admin.ModelAdmin):
-    list_display = ['text', 'task', 'is_completed', 'order']
+class ChecklistItemAdmin(TaskCountersMixin, admin.ModelAdmin):
+    list_display = ['text', 'task', 'is_completed', 'rank']
     list_filter = ['is_completed', 'task__project']
     search_fields = ['text', 'task__title']
     list_editable = ['is_completed']
 
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
+class MessageAdmin(TaskCountersMixin, admin.ModelAdmin):
     list_display = ['short_text', 'user', 'task', 'created_at']
     list_filter = ['user', 'task__project', 'created_at']
     search_fields = ['text', 'user__username', 'task__title']
@@ -0,0 +1,166 @@
+"""
+Архив выполненных задач.
+
+Задачи, которые больше ARCHIVE_AFTER_DAYS дней не менялись в последней
+колонке проекта, переносятся вместе с метками, чеклистом и сообщениями в
+таблицы Archived* (команда archive_tasks, запускается по расписанию). Доска,
+счетчики колонок и дашборд читают только Task, поэтому их стоимость не
+растет с числом завершенных задач.
+
+Перенос идет пачками по ARCHIVE_BATCH_SIZE задач, каждая пачка - отдельная
+транзакция, чтобы не держать блокировку записи SQLite надолго.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .board_cache import bump_board_version
+from .board_events import publish_tasks
+from .models import ArchivedChecklistItem, ArchivedMessage, ArchivedTask, ChecklistItem, Message, Project, Task
+from .ranking import next_rank
+
+
+def final_column(project):
+    """Последняя колонка доски проекта ("Готово") или None"""
+    return project.columns.order_by('-rank', '-id').first()
+
+
+def archive_candidates(project, cutoff):
+    """
+    Задачи последней колонки, не менявшиеся с cutoff.
+
+    Перемещение задачи обновляет updated_at, поэтому это и время, которое
+    задача пролежала в последней колонке (если ее с тех пор не правили).
+    """
+    column = final_column(project)
+    if column is None:
+        return Task.objects.none()
+    return Task.objects.filter(column=column, updated_at__lt=cutoff)
+
+
+def archive_tasks(projects=None, days=None, batch_size=None, dry_run=False):
+    """
+    Переносит в архив задачи, пролежавшие в последней колонке больше days дней.
+
+    projects - queryset проектов (по умолчанию все). Возвращает
+    {проект: число задач}; с dry_run только считает.
+    """
+    days = settings.ARCHIVE_AFTER_DAYS if days is None else days
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=days)
+
+    archived = {}
+    for project in (Project.objects.all() if projects is None else projects):
+        candidates = archive_candidates(project, cutoff)
+        if dry_run:
+            archived[project] = candidates.count()
+            continue
+        archived[project] = 0
+        while True:
+            task_ids = list(candidates.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not task_ids:
+                break
+            archived[project] += archive_batch(project, task_ids, cutoff)
+    return archived
+
+
+def archive_batch(project, task_ids, cutoff):
+    """Переносит задачи task_ids (если они все еще подходят) одной транзакцией"""
+    with transaction.atomic():
+        # Задачу могли переместить или изменить после выборки id
+        tasks = list(archive_candidates(project, cutoff).filter(id__in=task_ids).select_related('column'))
+        task_ids = [task.id for task in tasks]
+        if not task_ids:
+            return 0
+
+        ArchivedTask.objects.bulk_create([
+            ArchivedTask(
+                id=task.id,
+                project_id=task.project_id,
+                column_id=task.column_id,
+                column_name=task.column.name if task.column else '',
+                title=task.title,
+                description=task.description,
+                priority=task.priority,
+                due_date=task.due_date,
+                rank=task.rank,
+                created_by_id=task.created_by_id,
+                created_at=task.created_at,
+                updated_at=task.updated_at,
+                message_count=task.message_count,
+                completed_checklist_count=task.completed_checklist_count,
+                total_checklist_count=task.total_checklist_count,
+            )
+            for task in tasks
+        ])
+        task_labels = Task.labels.through.objects.filter(task_id__in=task_ids).values_list('task_id', 'label_id')
+        ArchivedTask.labels.through.objects.bulk_create([
+            ArchivedTask.labels.through(archivedtask_id=task_id, label_id=label_id)
+            for task_id, label_id in task_labels
+        ])
+        ArchivedChecklistItem.objects.bulk_create([
+            ArchivedChecklistItem(**item)
+            for item in ChecklistItem.objects.filter(task_id__in=task_ids).values(
+                'id', 'task_id', 'text', 'is_completed', 'rank'
+            )
+        ])
+        ArchivedMessage.objects.bulk_create([
+            ArchivedMessage(**message)
+            for message in Message.objects.filter(task_id__in=task_ids).values(
+                'id', 'task_id', 'user_id', 'text', 'uid', 'created_at'
+            )
+        ])
+
+        # Сообщения, метки и чеклист удаляются каскадом
+        Task.objects.filter(id__in=task_ids).delete()
+        bump_board_version(project.id)
+        publish_tasks(project.id, deleted=task_ids)
+    return len(task_ids)
+
+
+def restore_task(archived):
+    """
+    Возвращает задачу из архива на доску с прежним id.
+
+    Задача встает в конец своей колонки (если колонку удалили - в последнюю
+    колонку проекта). updated_at становится текущим временем, поэтому
+    archive_tasks не уберет ее обратно раньше, чем через ARCHIVE_AFTER_DAYS.
+    """
+    with transaction.atomic():
+        project = archived.project
+        column = archived.column if archived.column_id else final_column(project)
+        task = Task(
+            id=archived.id,
+            project=project,
+            column=column,
+            title=archived.title,
+            description=archived.description,
+            priority=archived.priority,
+            due_date=archived.due_date,
+            rank=next_rank(column.tasks.all()) if column else '',
+            created_by_id=archived.created_by_id,
+            message_count=archived.message_count,
+            completed_checklist_count=archived.completed_checklist_count,
+            total_checklist_count=archived.total_checklist_count,
+        )
+        task.save(force_insert=True)
+        # created_at - auto_now_add, исходная дата возвращается отдельно
+        Task.objects.filter(id=task.id).update(created_at=archived.created_at)
+        task.created_at = archived.created_at
+
+        task.labels.set(archived.labels.all())
+        ChecklistItem.objects.bulk_create([
+            ChecklistItem(**item)
+            for item in archived.checklist_items.values('id', 'task_id', 'text', 'is_completed', 'rank')
+        ])
+        Message.objects.bulk_create([
+            Message(**message)
+            for message in archived.messages.values('id', 'task_id', 'user_id', 'text', 'uid', 'created_at')
+        ])
+
+        archived.delete()
+        bump_board_version(project.id)
+        publish_tasks(project.id, changed=[task])
+    return task
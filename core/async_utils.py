@@ -0,0 +1,93 @@
+"""
+Помощники для асинхронных представлений (core/async_views.py).
+
+В Django 4.2 login_required, get_object_or_404 и request.user не умеют
+работать в асинхронном коде, а асинхронный ORM (aget, acount, aiterator)
+выполняет все запросы по очереди в одном общем потоке. Здесь - их
+асинхронные замены и запуск независимых запросов одновременно.
+"""
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import Http404
+
+from config.metrics import metered_sync_to_async
+
+
+def async_login_required(view):
+    """login_required для async-представлений"""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # Пользователь из сессии загружается в потоке: дальше request.user
+        # уже не обращается к БД и безопасен в асинхронном коде
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+def _in_own_thread(func):
+    def run():
+        try:
+            return func()
+        finally:
+            # Как в конце обычного запроса: соединение потока пула
+            # переиспользуется в пределах CONN_MAX_AGE
+            for connection in connections.all(initialized_only=True):
+                connection.close_if_unusable_or_obsolete()
+
+    return metered_sync_to_async(run, pool="gather", thread_sensitive=False)
+
+
+async def gather_queries(*funcs):
+    """
+    Выполняет независимые функции чтения из БД одновременно.
+
+    Каждая функция работает в своем потоке пула со своим соединением, а не
+    в общем потоке ORM. Незакоммиченные данные из других соединений не
+    видны, поэтому внутри транзакции (например, в TestCase) функции
+    выполняются по очереди в общем потоке.
+    """
+    if await sync_to_async(_in_transaction)():
+        return [await sync_to_async(func)() for func in funcs]
+    return await asyncio.gather(*(_in_own_thread(func)() for func in funcs))
+
+
+def _in_transaction():
+    return any(connection.in_atomic_block for connection in connections.all(initialized_only=True))
+
+
+def streaming_content(request, chunks):
+    """
+    Итератор кусков для StreamingHttpResponse, который не копится в памяти.
+
+    Django 4.2 под ASGI собирает синхронный итератор ответа в список целиком
+    (а под WSGI - асинхронный), поэтому под ASGI куски читаются по одному
+    через sync_to_async - в потоке запроса, где открыт курсор БД.
+    """
+    if not isinstance(request, ASGIRequest):
+        return chunks
+    return _iterate_in_thread(chunks)
+
+
+async def _iterate_in_thread(chunks):
+    next_chunk = sync_to_async(next)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Клиент мог прервать загрузку: курсор закрывается в том же потоке
+        await sync_to_async(chunks.close)()
@@ -0,0 +1,171 @@
+"""
+Асинхронные версии страниц чтения: главная, dashboard, доска и ее фрагменты.
+
+Подключаются вместо представлений из views.py при ASYNC_VIEWS=1 (под
+daphne/ASGI). Обычное представление под ASGI занимает поток на весь
+запрос; здесь поток нужен только на время запроса к БД и рендера шаблона,
+а независимые запросы страницы выполняются одновременно (gather_queries).
+
+Декораторы condition/cache_control/vary_on_headers в Django 4.2 не умеют
+оборачивать корутины, поэтому условный GET и заголовки кэширования
+выставляются здесь вручную с тем же результатом.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+from django.utils.safestring import mark_safe
+
+from .async_utils import aget_object_or_404, async_login_required, gather_queries
+from .board_cache import aget_board_html, aprojects_etag, board_cache_key, project_board_etag
+from .board_events import MAX_TASK_DELTAS
+from .filters import BoardFilter, after_cursor, paginate_tasks, parse_cursor
+from .models import ChecklistItem, Column, Project, Task
+from .stats import adashboard_stats
+from .views import render_board_columns
+
+arender = sync_to_async(render)
+
+
+def _not_modified(request, etag):
+    """304 (или 412), если у клиента актуальная версия - как @condition"""
+    return get_conditional_response(request, etag=quote_etag(etag))
+
+
+def _cache_headers(request, response, etag, vary=()):
+    """Заголовки, которые в views.py ставят condition и cache_control"""
+    if request.method in ("GET", "HEAD") and not response.has_header("ETag"):
+        response["ETag"] = quote_etag(etag)
+    patch_cache_control(response, private=True, no_cache=True)
+    if vary:
+        patch_vary_headers(response, vary)
+    return response
+
+
+@async_login_required
+async def home(request):
+    etag = await aprojects_etag(request)
+    response = _not_modified(request, etag)
+    if response is None:
+        projects = [project async for project in Project.objects.order_by("-created_at").aiterator()]
+        response = await arender(request, "core/home.html", {"projects": projects})
+    return _cache_headers(request, response, etag)
+
+
+@async_login_required
+async def dashboard(request):
+    """Dashboard со статистикой"""
+    etag = await aprojects_etag(request)
+    response = _not_modified(request, etag)
+    if response is None:
+        context = await adashboard_stats(request.user)
+        response = await arender(request, "core/dashboard.html", context)
+    return _cache_headers(request, response, etag)
+
+
+@async_login_required
+async def project_board(request, slug):
+    project = await aget_object_or_404(Project.objects.all(), slug=slug)
+    etag = project_board_etag(request, project)
+    response = _not_modified(request, etag)
+    if response is None:
+        response = await _project_board(request, project)
+    return _cache_headers(request, response, etag, vary=("HX-Request",))
+
+
+async def _project_board(request, project):
+    board_filter = BoardFilter(request.GET, request.user)
+
+    async def render_columns():
+        # Задачи колонок и счетчики - разными соединениями одновременно
+        columns, counts = await gather_queries(
+            lambda: board_filter.load_columns(project, settings.BOARD_PAGE_SIZE),
+            lambda: board_filter.column_counts(project),
+        )
+        return await sync_to_async(render_board_columns)(request, project, board_filter, columns, counts)
+
+    cache_key = board_cache_key(project, request.user, board_filter)
+    board_html = mark_safe(await aget_board_html(cache_key, render_columns))
+
+    if request.headers.get("HX-Request") and not request.GET.get("full"):
+        return HttpResponse(board_html)
+
+    columns, labels, task_count = await gather_queries(
+        lambda: list(project.columns.all()),
+        lambda: list(project.labels.all()),
+        lambda: project.tasks.count(),
+    )
+    return await arender(request, "core/board.html", {
+        "project": project,
+        "board_html": board_html,
+        "columns": columns,
+        "task_count": task_count,
+        "priorities": Task.Priority.choices,
+        "labels": labels,
+        **board_filter.as_context(),
+    })
+
+
+@async_login_required
+async def column_tasks(request, column_id):
+    """Следующая страница задач колонки (догрузка при прокрутке)"""
+    board_filter = BoardFilter(request.GET, request.user)
+    page_size = settings.BOARD_PAGE_SIZE
+
+    tasks = board_filter.cards_queryset().filter(column_id=column_id)
+    cursor = parse_cursor(request.GET.get("after", ""))
+    if cursor:
+        tasks = after_cursor(tasks, cursor)
+
+    column, tasks = await gather_queries(
+        lambda: get_object_or_404(Column, id=column_id),
+        lambda: list(tasks[:page_size + 1]),
+    )
+    tasks, next_cursor = paginate_tasks(tasks, page_size)
+
+    return await arender(request, "core/partials/column_tasks.html", {
+        "column": column,
+        "tasks": tasks,
+        "next_cursor": next_cursor,
+        "filter_query": board_filter.as_query(),
+    })
+
+
+@async_login_required
+async def project_cards(request, slug):
+    """Карточки отдельных задач доски с учетом фильтров клиента (см. views.project_cards)"""
+    project = await aget_object_or_404(Project.objects.all(), slug=slug)
+    board_filter = BoardFilter(request.GET, request.user)
+    task_ids = [int(i) for i in request.GET.getlist("task") if i.isdigit()][:MAX_TASK_DELTAS]
+
+    queryset = board_filter.cards_queryset().filter(project=project, id__in=task_ids)
+    tasks, counts = await gather_queries(
+        lambda: list(queryset) if task_ids else [],
+        lambda: board_filter.column_counts(project),
+    )
+    response = await arender(request, "core/partials/column_tasks.html", {"tasks": tasks})
+    response["X-Column-Counts"] = json.dumps(counts)
+    return response
+
+
+@async_login_required
+async def task_detail(request, task_id):
+    task, checklist_items = await gather_queries(
+        lambda: get_object_or_404(Task, id=task_id),
+        lambda: list(ChecklistItem.objects.filter(task_id=task_id)),
+    )
+    return await arender(request, "core/partials/task_detail.html", {
+        "task": task,
+        "checklist_items": checklist_items,
+    })
+
+
+@async_login_required
+async def task_chat(request, task_id):
+    """Открытие модалки чата для задачи"""
+    task = await aget_object_or_404(Task.objects.all(), id=task_id)
+    return await arender(request, "core/partials/task_chat.html", {"task": task})
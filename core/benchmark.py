@@ -0,0 +1,140 @@
+"""
+Инструменты замеров: генерация данных (команды seed и bench) и перцентили.
+
+Данные создаются через bulk_create пачками по BATCH_SIZE задач вместе с их
+метками, пунктами чеклиста и сообщениями, денормализованные счетчики задач
+заполняются сразу. Так 100 000 задач создаются за десятки секунд, а память
+не растет вместе с объемом.
+"""
+import random
+import statistics
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ChecklistItem, Column, Label, Message, Project, Task
+from .ranking import ranks_between
+
+BATCH_SIZE = 2000
+
+COLUMN_COLORS = ['#64748b', '#f59e0b', '#3b82f6', '#10b981', '#ef4444', '#8b5cf6']
+
+
+def percentile(values, percent):
+    """Перцентиль percent (1-99) выборки values"""
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+def seed(tasks, projects=5, columns=4, labels=6, checklist=3, messages=2, users=3, random_seed=0):
+    """
+    Создает projects проектов и tasks задач, распределенных по ним поровну.
+
+    checklist и messages - число пунктов чеклиста и сообщений на задачу.
+    Пользователи seed-user-N создаются при необходимости. Возвращает число
+    созданных объектов по моделям.
+    """
+    rng = random.Random(random_seed)
+    created = dict.fromkeys(['projects', 'columns', 'labels', 'tasks', 'checklist_items', 'messages'], 0)
+    today = timezone.localdate()
+    now = timezone.now()
+
+    with transaction.atomic():
+        authors = _seed_users(users)
+
+        # Номера продолжают уже созданные проекты seed-N
+        slugs = Project.objects.filter(slug__regex=r'^seed-[0-9]+$').values_list('slug', flat=True)
+        first = max((int(slug[len('seed-'):]) for slug in slugs), default=0)
+        new_projects = Project.objects.bulk_create([
+            Project(
+                name=f'Проект {first + i + 1}',
+                slug=f'seed-{first + i + 1}',
+                icon=rng.choice(Project.ICON_CHOICES)[0],
+                color=rng.choice(Project.COLOR_CHOICES)[0],
+            )
+            for i in range(projects)
+        ])
+        created['projects'] = len(new_projects)
+
+        column_ranks = ranks_between(None, None, columns)
+        board_columns = Column.objects.bulk_create([
+            Column(project=project, name=f'Колонка {i + 1}', color=COLUMN_COLORS[i % len(COLUMN_COLORS)], rank=rank)
+            for project in new_projects
+            for i, rank in enumerate(column_ranks)
+        ])
+        created['columns'] = len(board_columns)
+
+        project_labels = Label.objects.bulk_create([
+            Label(project=project, name=f'Метка {i + 1}', color=Label.COLOR_CHOICES[i % len(Label.COLOR_CHOICES)][0])
+            for project in new_projects
+            for i in range(labels)
+        ])
+        created['labels'] = len(project_labels)
+        labels_by_project = {}
+        for label in project_labels:
+            labels_by_project.setdefault(label.project_id, []).append(label)
+
+        # Задачи по кругу раскладываются по колонкам, ранги в колонке растут
+        rows = -(-tasks // len(board_columns)) if board_columns else 0
+        row_ranks = ranks_between(None, None, rows)
+        item_ranks = ranks_between(None, None, checklist)
+        priorities = [value for value, _ in Task.Priority.choices]
+
+        for start in range(0, tasks if board_columns else 0, BATCH_SIZE):
+            batch = []
+            for index in range(start, min(start + BATCH_SIZE, tasks)):
+                column = board_columns[index % len(board_columns)]
+                completed = rng.randint(0, checklist)
+                batch.append(Task(
+                    project_id=column.project_id,
+                    column=column,
+                    title=f'Задача {index + 1}',
+                    description=f'Описание задачи {index + 1}',
+                    priority=rng.choice(priorities),
+                    due_date=rng.choice([None, today + timedelta(days=rng.randint(-30, 60))]),
+                    rank=row_ranks[index // len(board_columns)],
+                    created_by=rng.choice(authors),
+                    message_count=messages,
+                    completed_checklist_count=completed,
+                    total_checklist_count=checklist,
+                ))
+            batch = Task.objects.bulk_create(batch)
+            created['tasks'] += len(batch)
+
+            task_labels = []
+            items = []
+            chat = []
+            for task in batch:
+                choices = labels_by_project.get(task.project_id, [])
+                for label in rng.sample(choices, min(len(choices), rng.randint(0, 2))):
+                    task_labels.append(Task.labels.through(task_id=task.id, label_id=label.id))
+                for i, rank in enumerate(item_ranks):
+                    items.append(ChecklistItem(
+                        task=task, text=f'Пункт {i + 1}', rank=rank, is_completed=i < task.completed_checklist_count
+                    ))
+                for i in range(messages):
+                    chat.append(Message(
+                        task=task,
+                        user=rng.choice(authors),
+                        text=f'Сообщение {i + 1}',
+                        created_at=now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)),
+                    ))
+            Task.labels.through.objects.bulk_create(task_labels)
+            created['checklist_items'] += len(ChecklistItem.objects.bulk_create(items))
+            created['messages'] += len(Message.objects.bulk_create(chat))
+
+    return created
+
+
+def _seed_users(count):
+    User = get_user_model()
+    names = [f'seed-user-{i + 1}' for i in range(max(count, 1))]
+    existing = set(User.objects.filter(username__in=names).values_list('username', flat=True))
+    User.objects.bulk_create([
+        User(username=name, password='!')  # "!" - пароль, с которым нельзя войти
+        for name in names if name not in existing
+    ])
+    return list(User.objects.filter(username__in=names))
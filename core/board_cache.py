@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from .models import Project
+
+
+def bump_board_version(project_id):
+    """
+    Увеличивает версию доски проекта.
+
+    Вызывается каждым изменением, влияющим на доску. Версия хранится в БД,
+    поэтому инвалидация работает сразу для всех процессов.
+    """
+    Project.objects.filter(id=project_id).update(board_version=F('board_version') + 1)
+
+
+def board_cache_key(project, user, board_filter):
+    """
+    Ключ кэша отрендеренных колонок доски.
+
+    Карточки зависят от пользователя (кнопка удаления) и от текущей даты
+    (просроченные задачи), поэтому они тоже входят в ключ.
+    """
+    params = urlencode(sorted(board_filter.as_context().items()))
+    digest = hashlib.md5(params.encode()).hexdigest()
+    today = timezone.localdate().isoformat()
+    return f'board:{project.id}:v{project.board_version}:u{user.id}:{today}:{digest}'
+
+
+def get_board_html(key, render):
+    """Возвращает HTML колонок из кэша или рендерит и кэширует его"""
+    html = cache.get(key)
+    if html is None:
+        html = render()
+        cache.set(key, html, settings.BOARD_CACHE_TIMEOUT)
+    return html
+
+
+# Рендеры колонок, идущие сейчас в этом процессе: ключ кэша -> asyncio.Task
+_board_renders = {}
+
+
+async def aget_board_html(key, render):
+    """
+    get_board_html для async-представлений: render - корутина.
+
+    Одновременные промахи по одному ключу ждут один общий рендер, а не
+    рендерят колонки каждый сам (у синхронных представлений под ASGI этого
+    нет и так: они выполняются по очереди).
+    """
+    html = await cache.aget(key)
+    if html is not None:
+        return html
+    task = _board_renders.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_render_board_html(key, render))
+        _board_renders[key] = task
+        task.add_done_callback(lambda _: _board_renders.pop(key, None))
+    # Отмена одного запроса не должна прерывать рендер для остальных
+    return await asyncio.shield(task)
+
+
+async def _render_board_html(key, render):
+    html = await render()
+    await cache.aset(key, html, settings.BOARD_CACHE_TIMEOUT)
+    return html
+
+
+def _etag(request, *parts):
+    """
+    ETag страницы из версии данных и того, от чего еще зависит HTML.
+
+    Кроме пользователя и даты учитывается CSRF-cookie: после входа токен
+    меняется, и страница с формами со старым токеном не должна отдаваться
+    из кэша браузера.
+    """
+    parts += (
+        request.user.pk,
+        timezone.localdate().isoformat(),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    )
+    return hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def board_etag(request, slug):
+    """
+    ETag доски проекта - один запрос версии доски вместо рендера колонок.
+
+    Запросы HTMX получают только колонки, поэтому заголовок HX-Request
+    тоже входит в ETag (и в Vary ответа).
+    """
+    project = Project.objects.filter(slug=slug).only('id', 'board_version').first()
+    if project is None:
+        return None
+    return project_board_etag(request, project)
+
+
+def project_board_etag(request, project):
+    """ETag доски по уже загруженному проекту"""
+    params = urlencode(sorted(request.GET.lists()), doseq=True)
+    return _etag(request, 'board', project.id, project.board_version, params, bool(request.headers.get('HX-Request')))
+
+
+def projects_etag(request, *args, **kwargs):
+    """
+    ETag страниц со всеми проектами (главная, dashboard).
+
+    Любое изменение доски увеличивает ее версию, поэтому сумма версий
+    вместе с количеством и последним id проектов меняется при любых
+    правках задач, колонок, сообщений и при создании/удалении проектов.
+    """
+    return _projects_etag(request, Project.objects.aggregate(**_projects_state()))
+
+
+async def aprojects_etag(request):
+    return _projects_etag(request, await Project.objects.aaggregate(**_projects_state()))
+
+
+def _projects_state():
+    return {'versions': Sum('board_version'), 'count': Count('id'), 'last': Max('id')}
+
+
+def _projects_etag(request, state):
+    return _etag(request, request.resolver_match.url_name, state['versions'], state['count'], state['last'])
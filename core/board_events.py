@@ -0,0 +1,62 @@
+"""
+События доски для открытых у пользователей страниц проекта (BoardConsumer).
+
+Записи задач публикуют маленькие дельты: какие задачи изменились (id,
+колонка, ранг) и какие удалены. Клиент дозапрашивает только эти карточки
+с учетом своих фильтров и вставляет их на место, не перезагружая доску.
+Структурные изменения (колонки) публикуются событием "board" - тогда
+клиент перезагружает колонки целиком.
+
+События отправляются после коммита транзакции, чтобы клиент получил уже
+записанные данные.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from config.metrics import GROUP_SEND_DURATION
+
+# Больше изменений за раз дешевле показать перезагрузкой доски
+MAX_TASK_DELTAS = 100
+
+
+def board_group_name(project_id):
+    return f"board_{project_id}"
+
+
+def _send(project_id, event):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    with GROUP_SEND_DURATION.time(group="board"):
+        async_to_sync(channel_layer.group_send)(board_group_name(project_id), {"type": "board_event", "event": event})
+
+
+def _publish(project_id, event):
+    transaction.on_commit(lambda: _send(project_id, event))
+
+
+def _task_delta(task):
+    if isinstance(task, dict):
+        return {"id": task["id"], "column_id": task["column_id"], "rank": task["rank"]}
+    return {"id": task.id, "column_id": task.column_id, "rank": task.rank}
+
+
+def publish_tasks(project_id, changed=(), deleted=()):
+    """
+    Дельта задач: changed - задачи (модели или dict с id, column_id, rank),
+    появившиеся или изменившиеся, deleted - id удаленных задач.
+    """
+    changed = [_task_delta(task) for task in changed]
+    deleted = list(deleted)
+    if not changed and not deleted:
+        return
+    if len(changed) + len(deleted) > MAX_TASK_DELTAS:
+        publish_board(project_id)
+        return
+    _publish(project_id, {"type": "tasks", "changed": changed, "deleted": deleted})
+
+
+def publish_board(project_id):
+    """Структура доски изменилась - клиенты перезагружают колонки"""
+    _publish(project_id, {"type": "board"})
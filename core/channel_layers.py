@@ -0,0 +1,254 @@
+import asyncio
+import json
+import random
+import sqlite3
+import string
+import threading
+import time
+import uuid
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    """
+    Слой каналов поверх общего файла SQLite.
+
+    Позволяет нескольким процессам daphne на одной машине обмениваться
+    сообщениями (group_send доходит до сокетов во всех процессах) без
+    отдельного сервиса вроде Redis.
+
+    Сообщения лежат в таблице и забираются атомарным DELETE ... RETURNING.
+    Каналы процесса (с "!" в имени) читаются одним фоновым опросом на процесс,
+    а не отдельным опросом на каждое соединение. Интервал опроса адаптивный:
+    пока идут сообщения - минимальный, в тишине растет до poll_interval.
+    Блокировка записи берется, только если для процесса есть сообщения.
+
+    Очередь канала процесса живет, пока его кто-то читает: после отмены
+    receive() (consumer завершился) пустая очередь удаляется, а сообщения
+    каналам без очереди отбрасываются.
+    """
+
+    extensions = ["groups", "flush"]
+
+    def __init__(
+        self,
+        path="channels.sqlite3",
+        expiry=60,
+        group_expiry=86400,
+        capacity=100,
+        channel_capacity=None,
+        poll_interval=0.1,
+        min_poll_interval=0.005,
+    ):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.path = str(path)
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.min_poll_interval = min_poll_interval
+        # Префикс каналов этого процесса
+        self.client_prefix = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._db = None
+        # Каналы процесса, которые сейчас читаются: имя -> asyncio.Queue
+        self._queues = {}
+        self._prefixes = set()
+        self._poller = None
+        self._poller_loop = None
+
+    # Работа с БД (выполняется в отдельном потоке)
+
+    def _connection(self):
+        if self._db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS channel_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel TEXT NOT NULL,
+                    prefix TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    expires REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS channel_messages_prefix ON channel_messages (prefix, id);
+                CREATE TABLE IF NOT EXISTS channel_groups (
+                    group_name TEXT NOT NULL,
+                    channel TEXT NOT NULL,
+                    expires REAL NOT NULL,
+                    PRIMARY KEY (group_name, channel)
+                );
+            """)
+            self._db = db
+        return self._db
+
+    def _execute(self, func, *args):
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(db, *args)
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+            return result
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, self._execute, func, *args)
+
+    def _insert(self, db, channels, body, check_capacity):
+        now = time.time()
+        rows = []
+        for channel in channels:
+            if check_capacity:
+                queued = db.execute(
+                    "SELECT COUNT(*) FROM channel_messages WHERE channel = ? AND expires > ?", (channel, now)
+                ).fetchone()[0]
+                if queued >= self.get_capacity(channel):
+                    raise ChannelFull(channel)
+            rows.append((channel, self.non_local_name(channel), body, now + self.expiry))
+        db.executemany("INSERT INTO channel_messages (channel, prefix, body, expires) VALUES (?, ?, ?, ?)", rows)
+
+    def _take_pending(self, prefixes):
+        placeholders = ", ".join("?" * len(prefixes))
+        # Проверка без транзакции записи: в тишине опрос не блокирует БД
+        with self._lock:
+            pending = self._connection().execute(
+                f"SELECT 1 FROM channel_messages WHERE prefix IN ({placeholders}) LIMIT 1", prefixes
+            ).fetchone()
+        if pending is None:
+            return []
+        return self._execute(self._take, prefixes)
+
+    def _take(self, db, prefixes):
+        placeholders = ", ".join("?" * len(prefixes))
+        rows = db.execute(
+            f"DELETE FROM channel_messages WHERE prefix IN ({placeholders}) RETURNING id, channel, body, expires",
+            prefixes,
+        ).fetchall()
+        now = time.time()
+        return [(channel, body) for _, channel, body, expires in sorted(rows) if expires > now]
+
+    def _take_one(self, db, channel):
+        row = db.execute(
+            "SELECT id, body FROM channel_messages WHERE channel = ? AND expires > ? ORDER BY id LIMIT 1",
+            (channel, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        db.execute("DELETE FROM channel_messages WHERE id = ?", (row[0],))
+        return row[1]
+
+    def _group_channels(self, db, group):
+        return [row[0] for row in db.execute(
+            "SELECT channel FROM channel_groups WHERE group_name = ? AND expires > ?", (group, time.time())
+        )]
+
+    def _cleanup(self, db):
+        now = time.time()
+        db.execute("DELETE FROM channel_messages WHERE expires <= ?", (now,))
+        db.execute("DELETE FROM channel_groups WHERE expires <= ?", (now,))
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        await self._run(self._insert, [channel], json.dumps(message), True)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if "!" in channel:
+            # Канал процесса: сообщения раздает общий опрос
+            self._prefixes.add(self.non_local_name(channel))
+            self._ensure_poller()
+            queue = self._queues.setdefault(channel, asyncio.Queue())
+            try:
+                return await queue.get()
+            except asyncio.CancelledError:
+                # Consumer завершился - очередь больше никто не прочитает
+                if queue.empty() and self._queues.get(channel) is queue:
+                    del self._queues[channel]
+                raise
+
+        delay = self.min_poll_interval
+        while True:
+            body = await self._run(self._take_one, channel)
+            if body is not None:
+                return json.loads(body)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.poll_interval)
+
+    async def new_channel(self, prefix="specific"):
+        suffix = "".join(random.choice(string.ascii_letters) for _ in range(12))
+        return f"{prefix}.{self.client_prefix}!{suffix}"
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(lambda db: db.execute(
+            "INSERT OR REPLACE INTO channel_groups (group_name, channel, expires) VALUES (?, ?, ?)",
+            (group, channel, time.time() + self.group_expiry),
+        ))
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(lambda db: db.execute(
+            "DELETE FROM channel_groups WHERE group_name = ? AND channel = ?", (group, channel)
+        ))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_group_name(group)
+        body = json.dumps(message)
+
+        def send_to_group(db):
+            # Как и в других слоях, group_send не падает из-за переполненных каналов
+            self._insert(db, self._group_channels(db, group), body, False)
+
+        await self._run(send_to_group)
+
+    async def flush(self):
+        await self._run(lambda db: db.execute("DELETE FROM channel_messages"))
+        await self._run(lambda db: db.execute("DELETE FROM channel_groups"))
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+
+    # Фоновый опрос каналов процесса
+
+    def _ensure_poller(self):
+        loop = asyncio.get_running_loop()
+        if self._poller is not None and self._poller_loop is loop and not self._poller.done():
+            return
+        if self._poller_loop is not loop:
+            # Очереди привязаны к циклу событий
+            self._queues = {}
+        self._poller_loop = loop
+        self._poller = loop.create_task(self._poll())
+
+    async def _poll(self):
+        delay = self.min_poll_interval
+        last_cleanup = time.monotonic()
+        while True:
+            messages = await asyncio.get_running_loop().run_in_executor(
+                None, self._take_pending, list(self._prefixes)
+            )
+            for channel, body in messages:
+                queue = self._queues.get(channel)
+                # Канал уже никто не читает (соединение закрыто)
+                if queue is not None:
+                    queue.put_nowait(json.loads(body))
+
+            if time.monotonic() - last_cleanup > self.expiry:
+                await self._run(self._cleanup)
+                last_cleanup = time.monotonic()
+
+            delay = self.min_poll_interval if messages else min(delay * 2, self.poll_interval)
+            await asyncio.sleep(delay)
@@ -0,0 +1,152 @@
+"""
+Отложенная запись сообщений чата (write-behind).
+
+В этом режиме consumer не пишет сообщение в БД сам: сообщение получает
+uid и время на сервере, сразу рассылается участникам чата и попадает в
+буфер процесса. Фоновый поток сбрасывает буфер пачками (bulk_create) не
+реже раза в CHAT_FLUSH_INTERVAL секунд или сразу при накоплении
+CHAT_FLUSH_BATCH_SIZE сообщений - одна транзакция SQLite на пачку вместо
+одной на сообщение.
+
+При штатной остановке процесса (atexit) буфер сбрасывается полностью.
+Сообщения удаленных задач и сообщения, которые нарушают ограничения БД
+(например, автор удален), отбрасываются, а не блокируют очередь.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+
+from .board_cache import bump_board_version
+from .board_events import publish_tasks
+from .models import Message, Task
+
+logger = logging.getLogger(__name__)
+
+
+class MessageBuffer:
+    """Буфер несохраненных сообщений с фоновым сбросом в БД"""
+
+    def __init__(self, flush_interval, batch_size):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = []
+        # _lock защищает список, _flush_lock не дает двум сбросам идти одновременно
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def add(self, message):
+        """Ставит сообщение в очередь на запись"""
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError('message buffer is stopped')
+            self._pending.append(message)
+            full = len(self._pending) >= self.batch_size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chat-write-behind', daemon=True)
+                self._thread.start()
+        if full:
+            self._wakeup.set()
+
+    def pending_for(self, task_id):
+        """Еще не записанные сообщения задачи"""
+        with self._lock:
+            return [message for message in self._pending if message.task_id == task_id]
+
+    def flush(self):
+        """Записывает все накопленные сообщения, возвращает их количество"""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending[:self.batch_size * 10]
+            if not batch:
+                return 0
+
+            self._persist(batch)
+
+            # Сообщения убираются из очереди только после коммита, чтобы
+            # история чата не теряла их между записью и удалением из буфера
+            with self._lock:
+                del self._pending[:len(batch)]
+            return len(batch)
+
+    def stop(self):
+        """Останавливает фоновый поток и записывает остаток буфера"""
+        with self._lock:
+            self._stopped = True
+            thread = self._thread
+        self._wakeup.set()
+        if thread is not None:
+            thread.join(timeout=self.flush_interval * 10)
+        while self.flush():
+            pass
+
+    def _persist(self, batch):
+        try:
+            with transaction.atomic():
+                self._write(batch)
+        except IntegrityError:
+            # В пачке есть сообщение, которое записать нельзя (например, автор
+            # удален, пока оно ждало записи). Пачка пишется по одному сообщению,
+            # негодные отбрасываются - иначе она повторялась бы вечно и держала
+            # за собой весь буфер
+            for message in batch:
+                try:
+                    with transaction.atomic():
+                        self._write([message])
+                except IntegrityError:
+                    logger.exception('Dropped chat message %s of task %s', message.uid, message.task_id)
+
+    def _write(self, batch):
+        # Задача могла быть удалена, пока сообщение ждало записи
+        task_ids = {message.task_id for message in batch}
+        tasks = list(Task.objects.filter(id__in=task_ids).values('id', 'project_id', 'column_id', 'rank'))
+        existing = {task['id'] for task in tasks}
+        messages = [message for message in batch if message.task_id in existing]
+
+        Message.objects.bulk_create(messages)
+
+        for task_id, count in Counter(message.task_id for message in messages).items():
+            Task.objects.filter(id=task_id).update(message_count=F('message_count') + count)
+
+        # Счетчик сообщений на карточках - как при синхронной записи
+        by_project = defaultdict(list)
+        for task in tasks:
+            by_project[task['project_id']].append(task)
+        for project_id, changed in by_project.items():
+            bump_board_version(project_id)
+            publish_tasks(project_id, changed=changed)
+
+    def _run(self):
+        try:
+            while not self._stopped:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                try:
+                    while self.flush() >= self.batch_size:
+                        pass
+                except Exception:
+                    # Сообщения остаются в буфере и будут записаны при следующей попытке
+                    logger.exception('Failed to flush chat messages')
+        finally:
+            connections.close_all()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_message_buffer():
+    """Буфер сообщений текущего процесса"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = MessageBuffer(settings.CHAT_FLUSH_INTERVAL, settings.CHAT_FLUSH_BATCH_SIZE)
+            atexit.register(_buffer.stop)
+        return _buffer
@@ -1,9 +1,54 @@
 import json
 
-from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
 
-from .models import Message, Task
+from config.metrics import (
+    BOARD_CONNECTIONS,
+    CHAT_CONNECTIONS,
+    CHAT_CONNECTS,
+    CHAT_DISCONNECTS,
+    CHAT_MESSAGES,
+    GROUP_SEND_DURATION,
+    consumer_db_call,
+)
+
+from .board_cache import bump_board_version
+from .board_events import board_group_name, publish_tasks
+from .chat_buffer import get_message_buffer
+from .models import Message, Project, Task
+from .presence import get_presence_registry
+
+
+def message_cursor(message):
+    """Курсор сообщения вида "<created_at>|<id>" для догрузки более ранних"""
+    return f"{message.created_at.isoformat()}|{message.id}"
+
+
+def serialize_message(message):
+    """Сообщение в виде, который получает клиент чата"""
+    return {
+        'id': str(message.uid),
+        'user': message.user.username,
+        'user_id': message.user_id,
+        'text': message.text,
+        'created_at': message.created_at.strftime('%d.%m %H:%M'),
+    }
+
+
+def parse_message_cursor(value):
+    """Разбирает курсор сообщения, некорректный курсор - None"""
+    created_at, _, message_id = str(value).rpartition("|")
+    try:
+        created_at = parse_datetime(created_at)
+    except ValueError:
+        return None
+    if created_at is None or not message_id.isdigit():
+        return None
+    return created_at, int(message_id)
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -13,13 +58,23 @@ class ChatConsumer(AsyncWebsocketConsumer):
     Как это работает:
     1. connect() - пользователь открыл чат, подключаемся к группе задачи
     2. disconnect() - пользователь закрыл чат, отключаемся от группы
-    3. receive() - получили сообщение от пользователя, сохраняем и рассылаем всем
+    3. receive() - получили сообщение от пользователя, сохраняем и рассылаем всем,
+       запрос {"type": "load_older", "cursor": ...} на догрузку истории
+       или сигнал присутствия {"type": "heartbeat"} / {"type": "typing"}
     4. chat_message() - отправляем сообщение конкретному пользователю
+    5. presence_state() - состояние комнаты от реестра присутствия какого-то
+       процесса; клиенту уходит список участников, если он изменился
+
+    История отдается страницами от новых сообщений к старым: при подключении
+    только последняя страница, более ранние - по курсору (created_at, id).
+
+    С CHAT_WRITE_BEHIND сообщение рассылается сразу, а в БД записывается
+    пачкой из буфера процесса (см. chat_buffer).
     """
 
     async def connect(self):
         """Подключение к WebSocket"""
-        self.task_id = self.scope['url_route']['kwargs']['task_id']
+        self.task_id = int(self.scope['url_route']['kwargs']['task_id'])
         self.room_group_name = f'chat_task_{self.task_id}'
         self.user = self.scope['user']
 
@@ -41,16 +96,31 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
 
         await self.accept()
+        CHAT_CONNECTS.inc()
+        CHAT_CONNECTIONS.inc()
+        self.counted = True
 
-        # Отправляем историю сообщений при подключении
-        messages = await self.get_message_history()
+        presence = get_presence_registry()
+        presence.join(self.room_group_name, self.channel_name, self.user)
+        self.presence_sent = presence.snapshot(self.room_group_name)
+
+        # Отправляем последнюю страницу истории и участников при подключении
+        messages, next_cursor = await self.get_message_history()
         await self.send(text_data=json.dumps({
             'type': 'history',
-            'messages': messages
+            'messages': messages,
+            'next_cursor': next_cursor,
+            'presence': self.presence_sent,
+            'heartbeat': settings.PRESENCE_HEARTBEAT,
+            'typing_timeout': settings.TYPING_TIMEOUT,
         }))
 
     async def disconnect(self, close_code):
         """Отключение от WebSocket"""
+        if getattr(self, 'counted', False):
+            CHAT_DISCONNECTS.inc()
+            CHAT_CONNECTIONS.dec()
+        get_presence_registry().leave(self.room_group_name, self.channel_name)
         # Покидаем группу
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -61,25 +131,60 @@ class ChatConsumer(AsyncWebsocketConsumer):
         """Получение сообщения от клиента"""
         try:
             data = json.loads(text_data)
+
+            if data.get('type') == 'load_older':
+                await self.send_older(data.get('cursor'))
+                return
+
+            if data.get('type') == 'heartbeat':
+                get_presence_registry().touch(self.room_group_name, self.channel_name)
+                return
+
+            if data.get('type') == 'typing':
+                get_presence_registry().typing(self.room_group_name, self.channel_name)
+                return
+
             message_text = data.get('message', '').strip()
 
             if not message_text:
                 return
+            CHAT_MESSAGES.inc()
+
+            # Отправленное сообщение завершает набор
+            get_presence_registry().typing(self.room_group_name, self.channel_name, typing=False)
 
-            # Сохраняем сообщение в БД
-            message_data = await self.save_message(message_text)
+            if settings.CHAT_WRITE_BEHIND:
+                # Запись в БД - позже, пачкой
+                message_data = self.buffer_message(message_text)
+            else:
+                # Сохраняем сообщение в БД
+                message_data = await self.save_message(message_text)
 
             # Отправляем сообщение всем в группе
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'message': message_data
-                }
-            )
+            with GROUP_SEND_DURATION.time(group='chat'):
+                await self.channel_layer.group_send(
+                    self.room_group_name,
+                    {
+                        'type': 'chat_message',
+                        'message': message_data
+                    }
+                )
         except json.JSONDecodeError:
             pass
 
+    async def send_older(self, value):
+        """Отправка страницы сообщений, более ранних, чем курсор"""
+        cursor = parse_message_cursor(value)
+        if cursor is None:
+            return
+
+        messages, next_cursor = await self.get_message_history(cursor)
+        await self.send(text_data=json.dumps({
+            'type': 'older',
+            'messages': messages,
+            'next_cursor': next_cursor,
+        }))
+
     async def chat_message(self, event):
         """Отправка сообщения клиенту (вызывается group_send)"""
         message = event['message']
@@ -89,42 +194,116 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'message': message
         }))
 
-    @sync_to_async
+    async def presence_state(self, event):
+        """Состояние присутствия в комнате (вызывается group_send реестра)"""
+        presence = get_presence_registry()
+        presence.apply(self.room_group_name, event)
+        users = presence.snapshot(self.room_group_name)
+        if users != self.presence_sent:
+            self.presence_sent = users
+            await self.send(text_data=json.dumps({
+                'type': 'presence',
+                'users': users,
+            }))
+
+    @consumer_db_call
     def check_task_exists(self):
         """Проверяем существование задачи"""
         return Task.objects.filter(id=self.task_id).exists()
 
-    @sync_to_async
-    def get_message_history(self):
-        """Получаем историю сообщений"""
-        messages = Message.objects.filter(
-            task_id=self.task_id
-        ).select_related('user').order_by('created_at')[:100]
+    @consumer_db_call
+    def get_message_history(self, before=None):
+        """
+        Страница истории: сообщения до курсора before (или последние).
+
+        Возвращает (сообщения в хронологическом порядке, курсор более ранней
+        страницы или None). Запрос идет по (created_at, id) от новых к старым,
+        поэтому его стоимость не зависит от длины чата.
+        """
+        page_size = settings.CHAT_PAGE_SIZE
+        # Несохраненные сообщения читаются до запроса к БД: если буфер успеет
+        # записаться между ними, сообщение попадет в обе выборки, а не пропадет
+        pending = []
+        if before is None and settings.CHAT_WRITE_BEHIND:
+            pending = get_message_buffer().pending_for(self.task_id)
+
+        messages = Message.objects.filter(task_id=self.task_id)
+        if before is not None:
+            created_at, message_id = before
+            messages = messages.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id)
+            )
+        messages = list(messages.select_related('user').order_by('-created_at', '-id')[:page_size + 1])
+
+        next_cursor = None
+        if len(messages) > page_size:
+            messages = messages[:page_size]
+            next_cursor = message_cursor(messages[-1])
+
+        messages = messages[::-1]
+        saved = {message.uid for message in messages}
+        messages += [message for message in pending if message.uid not in saved]
 
         return [
-            {
-                'id': msg.id,
-                'user': msg.user.username,
-                'user_id': msg.user.id,
-                'text': msg.text,
-                'created_at': msg.created_at.strftime('%d.%m %H:%M'),
-                'is_own': msg.user_id == self.user.id
-            }
+            dict(serialize_message(msg), is_own=msg.user_id == self.user.id)
             for msg in messages
-        ]
+        ], next_cursor
 
-    @sync_to_async
+    @consumer_db_call
     def save_message(self, text):
         """Сохраняем сообщение в БД"""
-        message = Message.objects.create(
-            task_id=self.task_id,
-            user=self.user,
-            text=text
-        )
-        return {
-            'id': message.id,
-            'user': self.user.username,
-            'user_id': self.user.id,
-            'text': message.text,
-            'created_at': message.created_at.strftime('%d.%m %H:%M'),
-        }
\ No newline at end of file
+        with transaction.atomic():
+            message = Message.objects.create(
+                task_id=self.task_id,
+                user=self.user,
+                text=text
+            )
+            Task.objects.filter(id=self.task_id).update(message_count=F('message_count') + 1)
+            bump_board_version(message.task.project_id)
+            # Счетчик сообщений на карточке
+            publish_tasks(message.task.project_id, changed=[message.task])
+        return serialize_message(message)
+
+    def buffer_message(self, text):
+        """Ставим сообщение в очередь на запись (uid и время выдаются сейчас)"""
+        message = Message(task_id=self.task_id, user=self.user, text=text)
+        get_message_buffer().add(message)
+        return serialize_message(message)
+
+
+class BoardConsumer(AsyncWebsocketConsumer):
+    """
+    WebSocket Consumer доски проекта.
+
+    Только рассылает клиенту события доски (см. board_events): дельты задач
+    и сигнал о смене структуры колонок. От клиента ничего не принимает.
+    """
+
+    async def connect(self):
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        project_id = await self.get_project_id(self.scope['url_route']['kwargs']['slug'])
+        if project_id is None:
+            await self.close()
+            return
+
+        self.group_name = board_group_name(project_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        BOARD_CONNECTIONS.inc()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            BOARD_CONNECTIONS.dec()
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def board_event(self, event):
+        """Отправка события доски клиенту (вызывается group_send)"""
+        await self.send(text_data=json.dumps(event['event']))
+
+    @consumer_db_call
+    def get_project_id(self, slug):
+        return Project.objects.filter(slug=slug).values_list('id', flat=True).first()
@@ -0,0 +1,155 @@
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from .models import Task
+from .search import search_tasks
+
+
+class BoardFilter:
+    """
+    Фильтры доски проекта.
+
+    Превращает GET-параметры (search, priority, label, due, my) в условия
+    QuerySet, чтобы фильтрация выполнялась в БД, а не в Python по
+    заранее загруженным спискам.
+    """
+
+    DUE_CHOICES = ("overdue", "today", "week", "none")
+
+    def __init__(self, params, user):
+        self.user = user
+        self.search = params.get("search", "").strip()
+        self.priority = params.get("priority", "")
+        self.label = params.get("label", "")
+        self.due = params.get("due", "")  # overdue, today, week, none
+        self.my = params.get("my", "")  # "1" = только мои задачи
+
+    def filter_queryset(self, queryset):
+        """Применяет фильтры к QuerySet задач"""
+        if self.search:
+            queryset = search_tasks(queryset, self.search)
+
+        if self.priority in Task.Priority.values:
+            queryset = queryset.filter(priority=self.priority)
+
+        # Некорректный id метки просто игнорируем
+        if self.label.isdigit():
+            queryset = queryset.filter(labels__id=int(self.label))
+
+        if self.my:
+            queryset = queryset.filter(created_by=self.user)
+
+        if self.due in self.DUE_CHOICES:
+            today = timezone.now().date()
+            if self.due == "none":
+                queryset = queryset.filter(due_date__isnull=True)
+            elif self.due == "overdue":
+                queryset = queryset.filter(due_date__lt=today)
+            elif self.due == "today":
+                queryset = queryset.filter(due_date=today)
+            elif self.due == "week":
+                queryset = queryset.filter(due_date__range=(today, today + timedelta(days=7)))
+
+        return queryset
+
+    def cards_queryset(self):
+        """Отфильтрованные задачи со всем, что нужно для карточек, в порядке доски"""
+        return self.filter_queryset(Task.objects.all()).select_related(
+            "created_by"
+        ).prefetch_related("labels").order_by("rank", "id")
+
+    def first_pages(self, columns, size):
+        """
+        Условие "задача на первой странице своей колонки" - одно на все колонки.
+
+        Для каждой колонки это подзапрос ORDER BY rank, id LIMIT size по
+        индексу (column_id, rank, id): читается только начало колонки, а не
+        все ее задачи, как при нумерации оконной функцией. Подзапросы
+        независимы и объединены через OR, поэтому задачи всех колонок
+        загружаются одним запросом по первичному ключу.
+        """
+        condition = Q(pk__in=[])
+        for column in columns:
+            page = self.filter_queryset(Task.objects.filter(column=column)).order_by("rank", "id")
+            condition |= Q(id__in=page.values("id")[:size])
+        return condition
+
+    def load_columns(self, project, page_size):
+        """
+        Колонки доски с первой страницей отфильтрованных задач в каждой.
+
+        Берем на одну задачу больше страницы, чтобы понять, есть ли
+        продолжение. Запросов три при любом числе колонок и задач: колонки,
+        задачи и их метки.
+        """
+        columns = list(project.columns.all())
+        tasks = {column.id: [] for column in columns}
+        if columns:
+            cards = Task.objects.filter(self.first_pages(columns, page_size + 1)).select_related(
+                "created_by"
+            ).prefetch_related("labels").order_by("rank", "id")
+            for task in cards:
+                tasks[task.column_id].append(task)
+        for column in columns:
+            column.filtered_tasks, column.next_cursor = paginate_tasks(tasks[column.id], page_size)
+        return columns
+
+    def column_counts(self, project):
+        """Количество отфильтрованных задач по колонкам - один сгруппированный запрос"""
+        counts = self.filter_queryset(project.tasks.all()).order_by().values("column_id").annotate(
+            count=Count("id", distinct=True)
+        )
+        return {item["column_id"]: item["count"] for item in counts}
+
+    def as_query(self):
+        """Активные фильтры в виде query string для догрузки колонок"""
+        params = {
+            "search": self.search,
+            "priority": self.priority,
+            "label": self.label,
+            "due": self.due,
+            "my": self.my,
+        }
+        return urlencode({key: value for key, value in params.items() if value})
+
+    def as_context(self):
+        """Значения фильтров для шаблона доски"""
+        return {
+            "search": self.search,
+            "priority_filter": self.priority,
+            "label_filter": self.label,
+            "due_filter": self.due,
+            "my_tasks": self.my,
+        }
+
+
+def after_cursor(queryset, cursor):
+    """
+    Задачи строго после курсора (rank, id).
+
+    Keyset-пагинация: условие опирается на индекс и не зависит от того,
+    насколько далеко пролистана колонка, в отличие от OFFSET.
+    """
+    rank, task_id = cursor
+    return queryset.filter(Q(rank__gt=rank) | Q(rank=rank, id__gt=task_id))
+
+
+def parse_cursor(value):
+    """Разбирает курсор вида "<rank>.<id>", некорректный курсор - None"""
+    rank, _, task_id = value.rpartition(".")
+    if not (rank.isalnum() and rank.isascii() and task_id.isdigit()):
+        return None
+    return rank, int(task_id)
+
+
+def paginate_tasks(tasks, page_size):
+    """Отрезает страницу и возвращает (задачи, курсор следующей страницы)"""
+    tasks = list(tasks)
+    if len(tasks) <= page_size:
+        return tasks, None
+    tasks = tasks[:page_size]
+    last = tasks[-1]
+    return tasks, f"{last.rank}.{last.id}"
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.archive import archive_tasks
+from core.models import Project
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит в архив задачи, которые давно лежат в последней колонке проекта, "
+        "вместе с чеклистом и сообщениями (запускать по расписанию, например раз в сутки)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.ARCHIVE_AFTER_DAYS,
+            help="Сколько дней задача должна пролежать в последней колонке без изменений",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE, help="Задач в одной транзакции",
+        )
+        parser.add_argument("--project", action="append", help="slug проекта (можно несколько, по умолчанию - все)")
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать задачи")
+
+    def handle(self, *args, **options):
+        if options["days"] < 0 or options["batch_size"] < 1:
+            raise CommandError("--days не может быть отрицательным, --batch-size - меньше 1")
+
+        projects = Project.objects.order_by("id")
+        if options["project"]:
+            projects = projects.filter(slug__in=options["project"])
+            missing = set(options["project"]) - set(projects.values_list("slug", flat=True))
+            if missing:
+                raise CommandError(f"Проекты не найдены: {', '.join(sorted(missing))}")
+
+        archived = archive_tasks(
+            projects, days=options["days"], batch_size=options["batch_size"], dry_run=options["dry_run"]
+        )
+        verb = "к архивации" if options["dry_run"] else "в архиве"
+        for project, count in archived.items():
+            if count:
+                self.stdout.write(f"{project.slug}: {verb} {count}")
+        self.stdout.write(self.style.SUCCESS(f"Всего {verb}: {sum(archived.values())}"))
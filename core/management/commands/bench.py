@@ -0,0 +1,133 @@
+import json
+import platform
+import sqlite3
+import time
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from core.benchmark import percentile, seed
+from core.models import Project
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет p50/p95 времени ответа и число SQL-запросов страниц "
+        "на нескольких объемах данных (в отдельной тестовой БД)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tiers", default="1000,10000,100000", help="Объемы данных в задачах, через запятую")
+        parser.add_argument("--repeat", type=int, default=20, help="Замеров на страницу")
+        parser.add_argument("--projects", type=int, default=5, help="Проектов, между которыми делятся задачи")
+        parser.add_argument("--json", dest="json_path", help="Записать результаты в JSON-файл ('-' - в stdout)")
+
+    def handle(self, *args, **options):
+        try:
+            tiers = [int(tier) for tier in options["tiers"].split(",") if tier.strip()]
+        except ValueError:
+            raise CommandError("--tiers: ожидаются числа через запятую")
+        if not tiers or options["repeat"] < 1:
+            raise CommandError("Нужен хотя бы один объем данных и один замер")
+
+        # Таблица идет в stderr, если stdout занят JSON
+        out = self.stderr if options["json_path"] == "-" else self.stdout
+
+        setup_test_environment()
+        try:
+            results = []
+            for tasks in tiers:
+                result = self.run_tier(tasks, options)
+                results.append(result)
+                self.write_table(out, result)
+        finally:
+            teardown_test_environment()
+
+        if options["json_path"]:
+            report = json.dumps({
+                "created_at": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "repeat": options["repeat"],
+                "projects": options["projects"],
+                "tiers": results,
+            }, indent=2, ensure_ascii=False)
+            if options["json_path"] == "-":
+                self.stdout.write(report)
+            else:
+                with open(options["json_path"], "w", encoding="utf-8") as file:
+                    file.write(report + "\n")
+
+    def run_tier(self, tasks, options):
+        # Каждый объем - в чистой БД, чтобы доски росли вместе с ним
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            start = time.perf_counter()
+            seed(tasks=tasks, projects=options["projects"])
+            seed_seconds = time.perf_counter() - start
+            return {
+                "tasks": tasks,
+                "seed_seconds": round(seed_seconds, 2),
+                "views": self.measure(options["repeat"]),
+            }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def measure(self, repeat):
+        user = get_user_model().objects.filter(username__startswith="seed-user-").order_by("id").first()
+        project = Project.objects.order_by("id").first()
+        task = project.tasks.order_by("id").first()
+        board_url = reverse("project_board", args=[project.slug])
+        pages = {
+            "home": (reverse("home"), {}),
+            "dashboard": (reverse("dashboard"), {}),
+            "project_board": (board_url, {}),
+            "project_board_columns": (board_url, {"HTTP_HX_REQUEST": "true"}),
+            "task_detail": (reverse("task_detail", args=[task.id]), {}),
+        }
+
+        client = Client()
+        client.force_login(user)
+        results = {}
+        for name, (url, headers) in pages.items():
+            timings = []
+            queries = 0
+            # Первый запрос - прогрев, не учитывается
+            for i in range(repeat + 1):
+                # Замеряется рендер, а не кэш колонок доски
+                cache.clear()
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    response = client.get(url, **headers)
+                    elapsed = time.perf_counter() - start
+                if response.status_code != 200:
+                    raise CommandError(f"{url}: ответ {response.status_code}")
+                if i:
+                    timings.append(elapsed)
+                    queries = max(queries, len(context.captured_queries))
+            results[name] = {
+                "p50_ms": round(percentile(timings, 50) * 1000, 2),
+                "p95_ms": round(percentile(timings, 95) * 1000, 2),
+                "queries": queries,
+            }
+        return results
+
+    def write_table(self, out, result):
+        out.write(f"\nЗадач: {result['tasks']} (данные созданы за {result['seed_seconds']} с)")
+        out.write(f"{'страница':<24} {'p50, мс':>9} {'p95, мс':>9} {'запросов':>9}")
+        for name, view in result["views"].items():
+            out.write(f"{name:<24} {view['p50_ms']:>9.1f} {view['p95_ms']:>9.1f} {view['queries']:>9}")
@@ -0,0 +1,103 @@
+import asyncio
+import itertools
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from core import async_views, views
+from core.benchmark import percentile
+from core.models import Project
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность обычных и асинхронных представлений "
+        "страниц чтения при одновременных запросах"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--project", help="slug проекта (по умолчанию - первый)")
+        parser.add_argument("--user", help="имя пользователя (по умолчанию - первый)")
+        parser.add_argument("--concurrency", type=int, default=20, help="Одновременных запросов")
+        parser.add_argument("--requests", type=int, default=200, help="Запросов на страницу и режим")
+        parser.add_argument(
+            "--no-cache", action="store_true",
+            help="Только без кэша: кэш очищается перед каждым запросом (запросы к БД и рендер)",
+        )
+        parser.add_argument("--cache", action="store_true", help="Только с кэшем колонок доски")
+
+    def handle(self, *args, **options):
+        projects = Project.objects.order_by("id")
+        if options["project"]:
+            projects = projects.filter(slug=options["project"])
+        project = projects.first()
+        users = get_user_model().objects.order_by("id")
+        if options["user"]:
+            users = users.filter(username=options["user"])
+        user = users.first()
+        if project is None or user is None:
+            raise CommandError("Нужны проект и пользователь: создайте их или укажите --project/--user")
+
+        task = project.tasks.order_by("id").first()
+        pages = [
+            ("home", reverse("home"), {}),
+            ("dashboard", reverse("dashboard"), {}),
+            ("project_board", reverse("project_board", args=[project.slug]), {}),
+            ("project_board", reverse("project_board", args=[project.slug]), {"HTTP_HX_REQUEST": "true"}),
+        ]
+        if task is not None:
+            pages.append(("task_detail", reverse("task_detail", args=[task.id]), {}))
+
+        # С кэшем после первого запроса измеряются попадания в кэш колонок
+        # доски, без кэша - сами запросы к БД и рендер. По умолчанию оба
+        cache_modes = [("да", True), ("нет", False)]
+        if options["cache"] != options["no_cache"]:
+            cache_modes = [mode for mode in cache_modes if mode[1] == options["cache"]]
+
+        self.stdout.write(
+            f"{'страница':<28} {'режим':<6} {'кэш':<4} {'req/s':>8} {'p50, мс':>9} {'p95, мс':>9}"
+        )
+        for name, path, headers in pages:
+            label = path + (" (HX)" if headers else "")
+            # Под ASGI обычное представление выполняется в общем потоке для
+            # синхронного кода - так же, как здесь через sync_to_async
+            modes = [
+                ("sync", sync_to_async(getattr(views, name))),
+                ("async", getattr(async_views, name)),
+            ]
+            for (cache_label, cached), (mode, view) in itertools.product(cache_modes, modes):
+                cache.clear()
+                rps, latencies = asyncio.run(self.run(view, path, headers, user, cached, options))
+                self.stdout.write(
+                    f"{label:<28} {mode:<6} {cache_label:<4} {rps:>8.1f} "
+                    f"{percentile(latencies, 50) * 1000:>9.1f} {percentile(latencies, 95) * 1000:>9.1f}"
+                )
+
+    async def run(self, view, path, headers, user, cached, options):
+        factory = RequestFactory()
+        match = resolve(path)
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        latencies = []
+
+        async def request_once():
+            async with semaphore:
+                request = factory.get(path, **headers)
+                request.user = user
+                request.resolver_match = match
+                if not cached:
+                    await cache.aclear()
+                start = time.perf_counter()
+                response = await view(request, *match.args, **match.kwargs)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise CommandError(f"{path}: ответ {response.status_code}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(request_once() for _ in range(options["requests"])))
+        return options["requests"] / (time.perf_counter() - start), latencies
+
@@ -0,0 +1,348 @@
+import asyncio
+import base64
+import json
+import os
+import platform
+import struct
+import tempfile
+import time
+from itertools import count
+from pathlib import Path
+
+import django
+from channels.routing import get_default_application
+from daphne.testing import DaphneProcess
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.utils import timezone
+
+from core.benchmark import percentile, seed
+from core.models import Task
+
+HOST = "127.0.0.1"
+
+# Префикс текста нагрузочных сообщений: "load <номер> <время отправки>"
+MESSAGE_PREFIX = "load"
+
+
+class ChatClient:
+    """
+    Минимальный клиент WebSocket (RFC 6455) на потоках asyncio.
+
+    autobahn в этом процессе не подходит: daphne уже выбрал для txaio
+    Twisted. Клиенту хватает текстовых кадров, ping и close.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, port, path, cookie):
+        reader, writer = await asyncio.open_connection(HOST, port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write((
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {HOST}:{port}\r\n"
+            f"Origin: http://{HOST}:{port}\r\n"
+            f"Cookie: {cookie}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        head = await reader.readuntil(b"\r\n\r\n")
+        status = head.split(b"\r\n", 1)[0]
+        if b" 101 " not in status:
+            writer.close()
+            raise ConnectionError(status.decode(errors="replace"))
+        return cls(reader, writer)
+
+    def send(self, text):
+        self._send_frame(0x1, text.encode())
+
+    def _send_frame(self, opcode, payload):
+        # Кадры клиента обязательно маскируются
+        mask = os.urandom(4)
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, 0x80 | length)
+        elif length < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 0x80 | 127, length)
+        masked = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+        self.writer.write(header + mask + masked)
+
+    async def receive(self):
+        """Следующее текстовое сообщение, None - соединение закрыто"""
+        message = b""
+        while True:
+            first, second = await self.reader.readexactly(2)
+            length = second & 0x7F
+            if length == 126:
+                length, = struct.unpack("!H", await self.reader.readexactly(2))
+            elif length == 127:
+                length, = struct.unpack("!Q", await self.reader.readexactly(8))
+            payload = await self.reader.readexactly(length)
+            opcode = first & 0x0F
+            if opcode == 0x8:
+                return None
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+                continue
+            if opcode in (0x0, 0x1):
+                message += payload
+                if first & 0x80:
+                    return message.decode()
+
+    async def close(self):
+        try:
+            self._send_frame(0x8, struct.pack("!H", 1000))
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+        self.writer.close()
+
+
+class ChatLoad:
+    """Один прогон нагрузки против сервера на HOST:port"""
+
+    def __init__(self, port, rooms, sessions, options):
+        self.port = port
+        self.rooms = rooms
+        self.sessions = sessions
+        self.options = options
+        self.connect_times = []
+        self.connect_errors = 0
+        # комната -> подключенные клиенты
+        self.members = {room: set() for room in rooms}
+        # номер сообщения -> сколько клиентов в комнате должны его получить
+        self.expected = {}
+        self.latencies = []
+        self.unexpected = 0
+
+    async def connect(self, index, semaphore):
+        room = self.rooms[index % len(self.rooms)]
+        cookie = f"{settings.SESSION_COOKIE_NAME}={self.sessions[index % len(self.sessions)]}"
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                client = await asyncio.wait_for(
+                    self.handshake(room, cookie), self.options["connect_timeout"]
+                )
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                self.connect_errors += 1
+                return None
+            self.connect_times.append(time.perf_counter() - start)
+        self.members[room].add(client)
+        client.reading = asyncio.create_task(self.read(client, room))
+        return client
+
+    async def handshake(self, room, cookie):
+        """Подключение считается состоявшимся, когда пришла история чата"""
+        client = await ChatClient.connect(self.port, f"/ws/chat/task/{room}/", cookie)
+        try:
+            text = await client.receive()
+            if text is None or json.loads(text)["type"] != "history":
+                raise ConnectionError("сервер закрыл соединение")
+        except BaseException:
+            # В том числе отмена по connect_timeout
+            client.writer.close()
+            raise
+        return client
+
+    async def read(self, client, room):
+        try:
+            while (text := await client.receive()) is not None:
+                data = json.loads(text)
+                if data["type"] == "message":
+                    self.delivered(data["message"]["text"])
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.members[room].discard(client)
+
+    def delivered(self, text):
+        received = time.perf_counter()
+        prefix, _, rest = text.partition(" ")
+        number, _, sent = rest.partition(" ")
+        if prefix != MESSAGE_PREFIX or not number.isdigit() or int(number) not in self.expected:
+            self.unexpected += 1
+            return
+        self.latencies.append(received - float(sent))
+
+    async def send(self, clients):
+        """Отправляет сообщения с частотой rate, по кругу от всех клиентов"""
+        rate = self.options["rate"]
+        start = time.perf_counter()
+        deadline = start + self.options["duration"]
+        for number in count():
+            # Расписание не сдвигается, если сервер не успевает: отставание
+            # видно по фактической частоте отправки
+            delay = start + number / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if time.perf_counter() >= deadline:
+                return number, time.perf_counter() - start
+            client, room = clients[number % len(clients)]
+            self.expected[number] = len(self.members[room])
+            client.send(json.dumps({"message": f"{MESSAGE_PREFIX} {number} {time.perf_counter()!r}"}))
+            await client.writer.drain()
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.options["connect_concurrency"])
+        start = time.perf_counter()
+        clients = await asyncio.gather(*(self.connect(i, semaphore) for i in range(self.options["clients"])))
+        clients = [
+            (client, self.rooms[i % len(self.rooms)]) for i, client in enumerate(clients) if client is not None
+        ]
+        connect_seconds = time.perf_counter() - start
+        if not clients:
+            raise CommandError("Ни один клиент не подключился")
+
+        sent, send_seconds = await self.send(clients)
+        expected = sum(self.expected.values())
+        # Доставка оставшихся сообщений
+        drain_deadline = time.perf_counter() + self.options["drain"]
+        while len(self.latencies) < expected and time.perf_counter() < drain_deadline:
+            await asyncio.sleep(0.05)
+        total_seconds = time.perf_counter() - start - connect_seconds
+
+        await asyncio.gather(*(client.close() for client, _ in clients))
+        # Ответный close сервера; не дождавшихся - не ждем
+        _, pending = await asyncio.wait([client.reading for client, _ in clients], timeout=5)
+        for reading in pending:
+            reading.cancel()
+
+        return {
+            "clients": self.options["clients"],
+            "rooms": len(self.rooms),
+            "connected": len(clients),
+            "connect_errors": self.connect_errors,
+            "connect_seconds": round(connect_seconds, 2),
+            "connect_p50_ms": round(percentile(self.connect_times, 50) * 1000, 2),
+            "connect_p95_ms": round(percentile(self.connect_times, 95) * 1000, 2),
+            "connect_p99_ms": round(percentile(self.connect_times, 99) * 1000, 2),
+            "target_rate": self.options["rate"],
+            "sent": sent,
+            "sent_per_second": round(sent / send_seconds, 1) if send_seconds else 0.0,
+            "expected_deliveries": expected,
+            "delivered": len(self.latencies),
+            "undelivered": expected - len(self.latencies),
+            "unexpected": self.unexpected,
+            "deliveries_per_second": round(len(self.latencies) / total_seconds, 1) if total_seconds else 0.0,
+            "latency_p50_ms": round(percentile(self.latencies, 50) * 1000, 2),
+            "latency_p95_ms": round(percentile(self.latencies, 95) * 1000, 2),
+            "latency_p99_ms": round(percentile(self.latencies, 99) * 1000, 2),
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузка на чат задач: тысячи аутентифицированных WebSocket-клиентов "
+        "в нескольких комнатах против локального daphne с тестовой БД. "
+        "Считает время подключения, задержку доставки и сообщения в секунду"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=1000, help="Клиентов WebSocket")
+        parser.add_argument("--rooms", type=int, default=20, help="Комнат (задач), клиенты делятся поровну")
+        parser.add_argument("--users", type=int, default=50, help="Пользователей, от имени которых подключаются клиенты")
+        parser.add_argument("--rate", type=float, default=50, help="Отправляемых сообщений в секунду, всего")
+        parser.add_argument("--duration", type=float, default=10, help="Секунд отправки")
+        parser.add_argument("--connect-concurrency", type=int, default=100, help="Одновременных подключений")
+        parser.add_argument("--connect-timeout", type=float, default=30, help="Секунд на подключение клиента")
+        parser.add_argument("--drain", type=float, default=5, help="Секунд ожидания доставки после отправки")
+        parser.add_argument("--json", dest="json_path", help="Записать результат в JSON-файл ('-' - в stdout)")
+
+    def handle(self, *args, **options):
+        for name in ("clients", "rooms", "users", "connect_concurrency"):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')}: нужно положительное число")
+        if options["rate"] <= 0 or options["duration"] <= 0:
+            raise CommandError("--rate и --duration должны быть больше нуля")
+
+        out = self.stderr if options["json_path"] == "-" else self.stdout
+
+        setup_test_environment()
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                result = self.run_load(Path(directory) / "chat_load.sqlite3", options)
+        finally:
+            teardown_test_environment()
+        self.write_result(out, result)
+
+        if options["json_path"]:
+            report = json.dumps({
+                "created_at": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "channel_layer": settings.CHANNEL_LAYERS["default"]["BACKEND"],
+                "write_behind": settings.CHAT_WRITE_BEHIND,
+                **result,
+            }, indent=2, ensure_ascii=False)
+            if options["json_path"] == "-":
+                self.stdout.write(report)
+            else:
+                with open(options["json_path"], "w", encoding="utf-8") as file:
+                    file.write(report + "\n")
+
+    def run_load(self, path, options):
+        # Сервер - отдельный процесс, поэтому тестовая БД - файл, а не память
+        connections["default"].settings_dict.setdefault("TEST", {})["NAME"] = str(path)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            seed(tasks=options["rooms"], projects=1, checklist=0, messages=0, users=options["users"])
+            rooms = list(Task.objects.order_by("id").values_list("id", flat=True))
+            sessions = []
+            for user in get_user_model().objects.filter(username__startswith="seed-user-"):
+                client = Client()
+                client.force_login(user)
+                sessions.append(client.cookies[settings.SESSION_COOKIE_NAME].value)
+            # Процесс сервера не должен унаследовать открытые соединения
+            connections.close_all()
+
+            server = DaphneProcess(HOST, get_default_application)
+            server.start()
+            try:
+                while not server.ready.wait(timeout=1):
+                    if not server.is_alive():
+                        raise CommandError("Сервер daphne не запустился")
+                load = ChatLoad(server.port.value, rooms, sessions, options)
+                return asyncio.run(load.run())
+            finally:
+                server.terminate()
+                server.join()
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def write_result(self, out, result):
+        out.write(
+            f"Клиентов: {result['connected']} из {result['clients']} в {result['rooms']} комнатах, "
+            f"ошибок подключения: {result['connect_errors']} (за {result['connect_seconds']} с)"
+        )
+        out.write(
+            f"Подключение, мс: p50 {result['connect_p50_ms']:.1f}  "
+            f"p95 {result['connect_p95_ms']:.1f}  p99 {result['connect_p99_ms']:.1f}"
+        )
+        out.write(
+            f"Отправлено: {result['sent']} ({result['sent_per_second']:.1f}/с при цели {result['target_rate']:g}/с)"
+        )
+        out.write(
+            f"Доставлено: {result['delivered']} из {result['expected_deliveries']} "
+            f"({result['deliveries_per_second']:.1f}/с), не доставлено за --drain: {result['undelivered']}"
+        )
+        out.write(
+            f"Задержка доставки, мс: p50 {result['latency_p50_ms']:.1f}  "
+            f"p95 {result['latency_p95_ms']:.1f}  p99 {result['latency_p99_ms']:.1f}"
+        )
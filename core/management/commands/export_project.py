@@ -0,0 +1,29 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Project
+from core.transfer import TABLE_NAMES, export_csv, export_ndjson
+
+
+class Command(BaseCommand):
+    help = "Выгружает проект в NDJSON (или одну его таблицу в CSV) потоком"
+
+    def add_arguments(self, parser):
+        parser.add_argument("slug", help="slug проекта")
+        parser.add_argument("--output", "-o", help="Файл выгрузки (по умолчанию - stdout)")
+        parser.add_argument("--csv", choices=TABLE_NAMES, help="Выгрузить одну таблицу в CSV")
+
+    def handle(self, *args, **options):
+        project = Project.objects.filter(slug=options["slug"]).first()
+        if project is None:
+            raise CommandError(f"Проект {options['slug']} не найден")
+
+        chunks = export_csv(project, options["csv"]) if options["csv"] else export_ndjson(project)
+        if not options["output"]:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
+            return
+        with open(options["output"], "w", encoding="utf-8", newline="") as file:
+            for chunk in chunks:
+                file.write(chunk)
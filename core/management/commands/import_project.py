@@ -0,0 +1,36 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.transfer import import_ndjson
+
+
+class Command(BaseCommand):
+    help = "Создает проект из NDJSON-выгрузки (export_project или страницы экспорта)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл выгрузки")
+        parser.add_argument(
+            "--user", required=True,
+            help="Пользователь, которому достаются задачи и сообщения неизвестных авторов "
+                 "(известные авторы находятся по имени пользователя)",
+        )
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(username=options["user"]).first()
+        if user is None:
+            raise CommandError(f"Пользователь {options['user']} не найден")
+
+        start = time.perf_counter()
+        try:
+            with open(options["path"], encoding="utf-8") as file:
+                project, created = import_ndjson(file, user, match_authors=True)
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+
+        for name, count in created.items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Проект {project.slug} создан за {time.perf_counter() - start:.1f} с"
+        ))
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import Length
+
+from core.board_cache import bump_board_version
+from core.board_events import publish_board
+from core.models import ChecklistItem, Column, Task
+from core.ranking import rebalance
+
+
+class Command(BaseCommand):
+    help = "Перенумеровывает списки, в которых ключи сортировки стали слишком длинными"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Перенумеровать все списки, а не только длинные")
+
+    def handle(self, *args, **options):
+        lists = [
+            (Column, "project_id"),
+            (Task, "column_id"),
+            (ChecklistItem, "task_id"),
+        ]
+        for model, parent in lists:
+            parents = model.objects.order_by().values(parent).annotate(longest=Max(Length("rank")))
+            if not options["all"]:
+                parents = parents.filter(longest__gt=settings.RANK_REBALANCE_LENGTH)
+
+            count = 0
+            for row in parents:
+                items = model.objects.filter(**{parent: row[parent]})
+                with transaction.atomic():
+                    rebalance(items)
+                    # Ранги колонок и задач есть в кэшированном HTML доски
+                    if model is not ChecklistItem:
+                        project_id = items.values_list("project_id", flat=True).first()
+                        bump_board_version(project_id)
+                        publish_board(project_id)
+                count += 1
+            self.stdout.write(f"{model._meta.verbose_name_plural}: перенумеровано списков - {count}")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from core.models import Project, Task
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счетчики сообщений и пунктов чеклиста у задач"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--project", help="Slug проекта (по умолчанию - все проекты)")
+
+    def handle(self, *args, **options):
+        tasks = Task.objects.all()
+        if options["project"]:
+            tasks = tasks.filter(project__slug=options["project"])
+
+        updated = tasks.rebuild_counters()
+        # Счетчики видны на карточках - сбрасываем кэш затронутых досок
+        Project.objects.filter(id__in=tasks.values("project_id")).update(board_version=F("board_version") + 1)
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано задач: {updated}"))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from core.benchmark import seed
+
+
+class Command(BaseCommand):
+    help = "Создает тестовые проекты, задачи, метки, пункты чеклиста и сообщения (bulk_create)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tasks", type=int, default=1000, help="Всего задач")
+        parser.add_argument("--projects", type=int, default=5, help="Проектов (задачи делятся между ними поровну)")
+        parser.add_argument("--columns", type=int, default=4, help="Колонок в проекте")
+        parser.add_argument("--labels", type=int, default=6, help="Меток в проекте")
+        parser.add_argument("--checklist", type=int, default=3, help="Пунктов чеклиста на задачу")
+        parser.add_argument("--messages", type=int, default=2, help="Сообщений на задачу")
+        parser.add_argument("--users", type=int, default=3, help="Авторов задач и сообщений")
+        parser.add_argument("--seed", type=int, default=0, help="Зерно генератора случайных чисел")
+
+    def handle(self, *args, **options):
+        created = seed(
+            tasks=options["tasks"],
+            projects=options["projects"],
+            columns=options["columns"],
+            labels=options["labels"],
+            checklist=options["checklist"],
+            messages=options["messages"],
+            users=options["users"],
+            random_seed=options["seed"],
+        )
+        for name, count in created.items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(self.style.SUCCESS("Готово"))
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:31
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Task = apps.get_model('core', 'Task')
+    Message = apps.get_model('core', 'Message')
+    ChecklistItem = apps.get_model('core', 'ChecklistItem')
+
+    def count_of(model, condition=Q()):
+        subquery = model.objects.filter(condition, task=OuterRef('pk')).order_by().values('task').annotate(
+            count=Count('id')
+        ).values('count')
+        return Coalesce(Subquery(subquery), 0)
+
+    Task.objects.update(
+        message_count=count_of(Message),
+        completed_checklist_count=count_of(ChecklistItem, Q(is_completed=True)),
+        total_checklist_count=count_of(ChecklistItem),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='completed_checklist_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='total_checklist_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
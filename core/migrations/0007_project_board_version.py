@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_task_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='board_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from core.search import install_task_search, uninstall_task_search
+
+
+def install(apps, schema_editor):
+    install_task_search(schema_editor)
+
+
+def uninstall(apps, schema_editor):
+    uninstall_task_search(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_project_board_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,78 @@
+from itertools import groupby
+
+from django.db import migrations, models
+
+from core.ranking import ranks_between
+from core.search import install_task_search
+
+
+def assign_ranks(model, parent, ordering):
+    """Ранги по текущему порядку order внутри каждого родителя"""
+    items = list(model.objects.order_by(parent, *ordering).only('id', parent, 'rank'))
+    for _, group in groupby(items, key=lambda item: getattr(item, parent)):
+        group = list(group)
+        for item, rank in zip(group, ranks_between(None, None, len(group))):
+            item.rank = rank
+    model.objects.bulk_update(items, ['rank'], batch_size=500)
+
+
+def order_to_rank(apps, schema_editor):
+    assign_ranks(apps.get_model('core', 'Column'), 'project_id', ['order', 'id'])
+    assign_ranks(apps.get_model('core', 'Task'), 'column_id', ['order', '-updated_at', 'id'])
+    assign_ranks(apps.get_model('core', 'ChecklistItem'), 'task_id', ['order', 'id'])
+
+
+def reinstall_task_search(apps, schema_editor):
+    # Добавление поля пересоздает core_task в SQLite вместе с триггерами поиска
+    install_task_search(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_task_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checklistitem',
+            name='rank',
+            field=models.CharField(default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='column',
+            name='rank',
+            field=models.CharField(default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='rank',
+            field=models.CharField(default='', max_length=64),
+        ),
+        migrations.RunPython(order_to_rank, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='checklistitem',
+            options={'ordering': ['rank', 'id']},
+        ),
+        migrations.AlterModelOptions(
+            name='column',
+            options={'ordering': ['rank', 'id']},
+        ),
+        migrations.AlterModelOptions(
+            name='task',
+            options={'ordering': ['rank', 'id']},
+        ),
+        migrations.RemoveField(
+            model_name='checklistitem',
+            name='order',
+        ),
+        migrations.RemoveField(
+            model_name='column',
+            name='order',
+        ),
+        migrations.RemoveField(
+            model_name='task',
+            name='order',
+        ),
+        migrations.RunPython(reinstall_task_search, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,12 @@
+import uuid
+
 from django.conf import settings
 from django.db import models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .ranking import ranks_between
 
 
 class Project(models.Model):
@@ -34,6 +41,8 @@ class Project(models.Model):
     icon = models.CharField(max_length=20, choices=ICON_CHOICES, default='folder')
     color = models.CharField(max_length=20, choices=COLOR_CHOICES, default='purple')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Растет при каждом изменении доски, используется в ключах кэша
+    board_version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name
@@ -41,12 +50,13 @@ class Project(models.Model):
     def create_default_columns(self):
         """Создает стандартные колонки для нового проекта"""
         defaults = [
-            ('К выполнению', '#64748b', 0),
-            ('В работе', '#f59e0b', 1),
-            ('Готово', '#10b981', 2),
+            ('К выполнению', '#64748b'),
+            ('В работе', '#f59e0b'),
+            ('Готово', '#10b981'),
         ]
-        for name, color, order in defaults:
-            Column.objects.create(project=self, name=name, color=color, order=order)
+        ranks = ranks_between(None, None, len(defaults))
+        for (name, color), rank in zip(defaults, ranks):
+            Column.objects.create(project=self, name=name, color=color, rank=rank)
 
 
 class Column(models.Model):
@@ -54,10 +64,10 @@ class Column(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='columns')
     name = models.CharField(max_length=50)
     color = models.CharField(max_length=20, default='#64748b')  # HEX цвет
-    order = models.PositiveIntegerField(default=0)
+    rank = models.CharField(max_length=64, default='')  # ключ сортировки, см. core.ranking
 
     class Meta:
-        ordering = ['order', 'id']
+        ordering = ['rank', 'id']
 
     def __str__(self):
         return f"{self.project.name} - {self.name}"
@@ -84,6 +94,22 @@ class Label(models.Model):
         return self.name
 
 
+class TaskQuerySet(models.QuerySet):
+    def rebuild_counters(self):
+        """Пересчитывает счетчики сообщений и чеклиста по фактическим данным"""
+        def count_of(model, condition=Q()):
+            subquery = model.objects.filter(condition, task=OuterRef('pk')).order_by().values('task').annotate(
+                count=Count('id')
+            ).values('count')
+            return Coalesce(Subquery(subquery), 0)
+
+        return self.update(
+            message_count=count_of(Message),
+            completed_checklist_count=count_of(ChecklistItem, Q(is_completed=True)),
+            total_checklist_count=count_of(ChecklistItem),
+        )
+
+
 class Task(models.Model):
     class Priority(models.TextChoices):
         LOW = "low", "Низкий"
@@ -98,13 +124,32 @@ class Task(models.Model):
     priority = models.CharField(max_length=20, choices=Priority.choices, default=Priority.MEDIUM)
     due_date = models.DateField(null=True, blank=True)
     labels = models.ManyToManyField(Label, blank=True, related_name='tasks')
-    order = models.PositiveIntegerField(default=0)
+    rank = models.CharField(max_length=64, default='')  # ключ сортировки в колонке, см. core.ranking
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="created_tasks")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Денормализованные счетчики для карточек доски.
+    # Обновляются вместе с записью сообщения/пункта чеклиста,
+    # пересчитываются командой rebuild_task_counters.
+    message_count = models.PositiveIntegerField(default=0)
+    completed_checklist_count = models.PositiveIntegerField(default=0)
+    total_checklist_count = models.PositiveIntegerField(default=0)
+
+    objects = TaskQuerySet.as_manager()
+
     class Meta:
-        ordering = ['order', '-updated_at']
+        ordering = ['rank', 'id']
+        indexes = [
+            # Колонка доски и ее страницы (keyset по rank, id) - без сортировки
+            models.Index(fields=['column', 'rank', 'id'], name='core_task_column_rank_idx'),
+            # Счетчики колонок проекта (GROUP BY column_id)
+            models.Index(fields=['project', 'column'], name='core_task_project_column_idx'),
+            # Фильтры по сроку и статистика дашборда
+            models.Index(fields=['due_date'], name='core_task_due_date_idx'),
+            models.Index(fields=['created_at'], name='core_task_created_at_idx'),
+            models.Index(fields=['priority'], name='core_task_priority_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -116,24 +161,17 @@ class Task(models.Model):
             return self.due_date < timezone.now().date()
         return False
 
-    @property
-    def completed_checklist_count(self):
-        return self.checklist_items.filter(is_completed=True).count()
-
-    @property
-    def total_checklist_count(self):
-        return self.checklist_items.count()
-
 
 class ChecklistItem(models.Model):
     """Пункты чеклиста (подзадачи)"""
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='checklist_items')
     text = models.CharField(max_length=200)
     is_completed = models.BooleanField(default=False)
-    order = models.PositiveIntegerField(default=0)
+    rank = models.CharField(max_length=64, default='')  # ключ сортировки, см. core.ranking
 
     class Meta:
-        ordering = ['order', 'id']
+        ordering = ['rank', 'id']
+        indexes = [models.Index(fields=['task', 'rank', 'id'], name='core_checklist_task_rank_idx')]
 
     def __str__(self):
         return self.text
@@ -144,10 +182,85 @@ class Message(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='messages')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     text = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Идентификатор, который сервер выдает сообщению до записи в БД
+    # (в режиме отложенной записи сообщение рассылается раньше, чем сохраняется)
+    uid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    # Не auto_now_add: при отложенной записи время сообщения - момент отправки, а не записи
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # История чата задачи (по убыванию created_at, id)
+            models.Index(fields=['task', 'created_at', 'id'], name='core_message_task_created_idx'),
+            # Последние сообщения на дашборде
+            models.Index(fields=['created_at'], name='core_message_created_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.text[:50]}"
+
+class ArchivedTask(models.Model):
+    """
+    Задача в архиве: перенесена из Task командой archive_tasks (см. core/archive.py).
+
+    id совпадает с id исходной задачи - после восстановления ссылки на нее
+    снова работают. Колонка может быть удалена, ее название хранится отдельно.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='archived_tasks')
+    column = models.ForeignKey(Column, on_delete=models.SET_NULL, null=True, related_name='+')
+    column_name = models.CharField(max_length=50, blank=True)
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    priority = models.CharField(max_length=20, choices=Task.Priority.choices, default=Task.Priority.MEDIUM)
+    due_date = models.DateField(null=True, blank=True)
+    labels = models.ManyToManyField(Label, blank=True, related_name='archived_tasks')
+    rank = models.CharField(max_length=64, default='')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='+')
+    # Даты исходной задачи, не auto_now
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    message_count = models.PositiveIntegerField(default=0)
+    completed_checklist_count = models.PositiveIntegerField(default=0)
+    total_checklist_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-archived_at', '-id']
+        indexes = [models.Index(fields=['project', '-archived_at', '-id'], name='core_archived_project_idx')]
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedChecklistItem(models.Model):
+    """Пункт чеклиста задачи в архиве (id исходного пункта)"""
+    id = models.BigIntegerField(primary_key=True)
+    task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE, related_name='checklist_items')
+    text = models.CharField(max_length=200)
+    is_completed = models.BooleanField(default=False)
+    rank = models.CharField(max_length=64, default='')
+
+    class Meta:
+        ordering = ['rank', 'id']
+
+    def __str__(self):
+        return self.text
+
+
+class ArchivedMessage(models.Model):
+    """Сообщение чата задачи в архиве (id и uid исходного сообщения)"""
+    id = models.BigIntegerField(primary_key=True)
+    task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE, related_name='messages')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    text = models.TextField()
+    uid = models.UUIDField(unique=True, editable=False)
+    created_at = models.DateTimeField()
 
     class Meta:
         ordering = ['created_at']
 
     def __str__(self):
-        return f"{self.user.username}: {self.text[:50]}"
\ No newline at end of file
+        return f"{self.user.username}: {self.text[:50]}"
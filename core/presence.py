@@ -0,0 +1,202 @@
+"""
+Присутствие в чатах задач: кто открыл чат и кто сейчас печатает.
+
+Состояние живет в памяти процессов и расходится между ними через слой
+каналов, БД не используется:
+
+- процесс знает своих участников комнаты (открытые в нем WebSocket) и время
+  их последнего heartbeat; участник без heartbeat пропадает через
+  PRESENCE_TTL секунд;
+- изменения (вход, выход, начало и конец набора текста) не рассылаются по
+  одному: процесс отправляет в группу комнаты одно событие со всеми своими
+  участниками не чаще раза в PRESENCE_BROADCAST_INTERVAL секунд, поэтому
+  активная комната не превращается в поток событий;
+- участники других процессов известны из их событий и тоже живут
+  PRESENCE_TTL секунд: если процесс упал, его участники пропадут сами.
+  Пока у процесса есть участники, он повторяет событие раз в
+  PRESENCE_HEARTBEAT секунд.
+"""
+import asyncio
+import logging
+import time
+import uuid
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from config.metrics import GROUP_SEND_DURATION
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceRegistry:
+    """Участники комнат чата в этом процессе и известные участники других процессов"""
+
+    def __init__(self, ttl, heartbeat, interval, typing_timeout):
+        self.process_id = uuid.uuid4().hex
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.interval = interval
+        self.typing_timeout = typing_timeout
+        # комната -> {channel_name: {"user_id", "username", "seen", "typing_until"}}
+        self._local = {}
+        # комната -> {process_id: (участники, когда забыть)}
+        self._remote = {}
+        # комната -> (время, состояние) последней рассылки
+        self._announced = {}
+        # комната -> (цикл событий, время, asyncio.TimerHandle) следующей рассылки
+        self._scheduled = {}
+        # комнаты, состояние которых нужно разослать даже без изменений
+        self._forced = set()
+
+    def join(self, room, channel_name, user):
+        members = self._local.setdefault(room, {})
+        # Первый участник в процессе просит остальные процессы прислать
+        # своих участников, не дожидаясь их heartbeat
+        if not members:
+            self._forced.add(room)
+        members[channel_name] = {
+            "user_id": user.id,
+            "username": user.username,
+            "seen": time.monotonic(),
+            "typing_until": 0,
+        }
+        self._schedule(room)
+
+    def leave(self, room, channel_name):
+        if self._local.get(room, {}).pop(channel_name, None) is not None:
+            self._schedule(room)
+
+    def touch(self, room, channel_name):
+        """Heartbeat клиента"""
+        member = self._local.get(room, {}).get(channel_name)
+        if member is not None:
+            member["seen"] = time.monotonic()
+
+    def typing(self, room, channel_name, typing=True):
+        """
+        Участник печатает (или перестал - typing=False).
+
+        Повторные сигналы только продлевают набор на TYPING_TIMEOUT секунд:
+        рассылка нужна лишь при смене состояния.
+        """
+        member = self._local.get(room, {}).get(channel_name)
+        if member is None:
+            return
+        now = time.monotonic()
+        was_typing = member["typing_until"] > now
+        member["seen"] = now
+        member["typing_until"] = now + self.typing_timeout if typing else 0
+        if was_typing != typing:
+            self._schedule(room)
+
+    def apply(self, room, event):
+        """Учитывает событие presence_state, пришедшее в группу комнаты"""
+        if event["process"] == self.process_id:
+            return
+        remote = self._remote.setdefault(room, {})
+        if event["members"]:
+            remote[event["process"]] = (event["members"], time.monotonic() + self.ttl)
+        else:
+            remote.pop(event["process"], None)
+        if event["sync"] and self._local.get(room):
+            self._forced.add(room)
+            self._schedule(room)
+
+    def snapshot(self, room):
+        """Пользователи в комнате: [{"user_id", "username", "typing"}] по имени"""
+        now = time.monotonic()
+        entries = self._local_members(room, now)
+        remote = self._remote.get(room, {})
+        for process, (members, expires) in list(remote.items()):
+            if expires <= now:
+                del remote[process]
+            else:
+                entries += members
+        if not remote:
+            self._remote.pop(room, None)
+
+        # Несколько вкладок одного пользователя - одна запись
+        users = {}
+        for entry in entries:
+            user = users.setdefault(entry["user_id"], dict(entry, typing=False))
+            user["typing"] = user["typing"] or entry["typing"]
+        return sorted(users.values(), key=lambda user: (user["username"], user["user_id"]))
+
+    def _local_members(self, room, now):
+        members = self._local.get(room, {})
+        for channel_name, member in list(members.items()):
+            # Клиент пропал, не закрыв соединение
+            if member["seen"] + self.ttl <= now:
+                del members[channel_name]
+        return [
+            {"user_id": member["user_id"], "username": member["username"], "typing": member["typing_until"] > now}
+            for member in members.values()
+        ]
+
+    def _schedule(self, room, delay=None):
+        """Планирует рассылку комнаты: сразу или через delay, но не чаще interval"""
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        last = self._announced.get(room, (float("-inf"), None))[0]
+        when = max(now + (delay or 0), last + self.interval)
+
+        scheduled = self._scheduled.get(room)
+        if scheduled is not None:
+            scheduled_loop, scheduled_when, handle = scheduled
+            if scheduled_loop is loop and not scheduled_loop.is_closed() and scheduled_when <= when:
+                return
+            handle.cancel()
+        handle = loop.call_later(max(when - now, 0), lambda: asyncio.ensure_future(self._broadcast(room)))
+        self._scheduled[room] = (loop, when, handle)
+
+    async def _broadcast(self, room):
+        self._scheduled.pop(room, None)
+        now = time.monotonic()
+        members = self._local_members(room, now)
+        forced = room in self._forced
+        self._forced.discard(room)
+
+        last_time, last_members = self._announced.get(room, (float("-inf"), None))
+        # Heartbeat - с точностью до интервала рассылки
+        if forced or members != last_members or now - last_time >= self.heartbeat - self.interval:
+            self._announced[room] = (now, members)
+            try:
+                with GROUP_SEND_DURATION.time(group="presence"):
+                    await get_channel_layer().group_send(room, {
+                        "type": "presence_state",
+                        "process": self.process_id,
+                        "members": members,
+                        "sync": forced,
+                    })
+            except Exception:
+                # Состояние уйдет со следующей рассылкой
+                logger.exception("Failed to broadcast presence of %s", room)
+
+        # Пока шла рассылка, в комнату мог кто-то войти
+        local = self._local.get(room)
+        if not local:
+            self._local.pop(room, None)
+            self._announced.pop(room, None)
+            return
+
+        # Следующая рассылка: конец чьего-то набора текста или heartbeat
+        typing_ends = [member["typing_until"] for member in local.values() if member["typing_until"] > now]
+        wake = min(typing_ends + [self._announced[room][0] + self.heartbeat])
+        self._schedule(room, delay=wake - now)
+
+
+_registry = None
+
+
+def get_presence_registry():
+    """Реестр присутствия текущего процесса"""
+    global _registry
+    if _registry is None:
+        _registry = PresenceRegistry(
+            ttl=settings.PRESENCE_TTL,
+            heartbeat=settings.PRESENCE_HEARTBEAT,
+            interval=settings.PRESENCE_BROADCAST_INTERVAL,
+            typing_timeout=settings.TYPING_TIMEOUT,
+        )
+    return _registry
@@ -0,0 +1,227 @@
+"""
+Ранги (ключи сортировки) для задач, колонок и пунктов чеклиста.
+
+Ранг - строка, порядок которой совпадает с лексикографическим порядком
+строк. Между любыми двумя рангами всегда есть место для нового, поэтому
+перемещение элемента меняет только его собственную строку в БД.
+
+Формат ключа - "целая часть" переменной длины (первый символ кодирует ее
+длину) и необязательная "дробная часть". Добавление в конец увеличивает
+целую часть и почти не удлиняет ключ, вставка между соседями удлиняет
+дробную часть. Когда ключи становятся слишком длинными, список
+перенумеровывается (см. rebalance).
+"""
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+ZERO = DIGITS[0]
+SMALLEST_INTEGER = 'A' + ZERO * 26
+
+
+def _midpoint(a, b):
+    """Дробная часть строго между a и b (b=None - без верхней границы)"""
+    if b is not None and a >= b:
+        raise ValueError(f'{a!r} >= {b!r}')
+    if a[-1:] == ZERO or (b and b[-1:] == ZERO):
+        raise ValueError('trailing zero')
+    if b:
+        # Общий префикс переносим как есть
+        n = 0
+        while (a[n] if n < len(a) else ZERO) == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if digit_b - digit_a > 1:
+        return DIGITS[round(0.5 * (digit_a + digit_b))]
+    if b and len(b) > 1:
+        return b[:1]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def _integer_length(head):
+    if 'a' <= head <= 'z':
+        return ord(head) - ord('a') + 2
+    if 'A' <= head <= 'Z':
+        return ord('Z') - ord(head) + 2
+    raise ValueError(f'invalid rank head: {head!r}')
+
+
+def _split(key):
+    """Делит ключ на целую и дробную части с проверкой формата"""
+    if not key or key == SMALLEST_INTEGER:
+        raise ValueError(f'invalid rank: {key!r}')
+    integer = key[:_integer_length(key[0])]
+    if len(integer) != _integer_length(key[0]):
+        raise ValueError(f'invalid rank: {key!r}')
+    fraction = key[len(integer):]
+    if fraction[-1:] == ZERO:
+        raise ValueError(f'invalid rank: {key!r}')
+    return integer, fraction
+
+
+def _increment_integer(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) + 1
+        if d < len(DIGITS):
+            digits[i] = DIGITS[d]
+            return head + ''.join(digits)
+        digits[i] = ZERO
+    if head == 'Z':
+        return 'a' + ZERO
+    if head == 'z':
+        return None
+    head = chr(ord(head) + 1)
+    if head > 'a':
+        digits.append(ZERO)
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def _decrement_integer(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) - 1
+        if d >= 0:
+            digits[i] = DIGITS[d]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[-1]
+    if head == 'a':
+        return 'Z' + DIGITS[-1]
+    if head == 'A':
+        return None
+    head = chr(ord(head) - 1)
+    if head < 'Z':
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def rank_between(before=None, after=None):
+    """
+    Новый ранг строго между before и after.
+
+    None означает начало (before) или конец (after) списка.
+    """
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f'{before!r} >= {after!r}')
+
+    if before is None:
+        if after is None:
+            return 'a' + ZERO
+        integer, fraction = _split(after)
+        if integer == SMALLEST_INTEGER:
+            return integer + _midpoint('', fraction)
+        if integer < after:
+            return integer
+        result = _decrement_integer(integer)
+        if result is None:
+            raise ValueError('cannot decrement any more')
+        return result
+
+    integer, fraction = _split(before)
+    if after is None:
+        result = _increment_integer(integer)
+        return integer + _midpoint(fraction, None) if result is None else result
+
+    after_integer, after_fraction = _split(after)
+    if integer == after_integer:
+        return integer + _midpoint(fraction, after_fraction)
+    result = _increment_integer(integer)
+    if result is None:
+        raise ValueError('cannot increment any more')
+    if result < after:
+        return result
+    return integer + _midpoint(fraction, None)
+
+
+def ranks_between(before, after, count):
+    """count возрастающих рангов между before и after"""
+    if count == 0:
+        return []
+    if count == 1:
+        return [rank_between(before, after)]
+    if after is None:
+        ranks = [rank_between(before, None)]
+        for _ in range(count - 1):
+            ranks.append(rank_between(ranks[-1], None))
+        return ranks
+    if before is None:
+        ranks = [rank_between(None, after)]
+        for _ in range(count - 1):
+            ranks.append(rank_between(None, ranks[-1]))
+        return ranks[::-1]
+    middle = count // 2
+    rank = rank_between(before, after)
+    return ranks_between(before, rank, middle) + [rank] + ranks_between(rank, after, count - middle - 1)
+
+
+def next_rank(queryset):
+    """Ранг для нового элемента в конце списка"""
+    last = queryset.order_by('-rank').values_list('rank', flat=True).first()
+    return rank_between(last or None, None)
+
+
+def rebalance(queryset):
+    """
+    Перенумеровывает элементы короткими ключами, сохраняя их порядок.
+
+    Пишет все строки списка, поэтому вызывается только когда ключи
+    стали слишком длинными.
+    """
+    with transaction.atomic():
+        items = list(queryset.select_for_update().order_by('rank', 'id').only('id', 'rank'))
+        for item, rank in zip(items, ranks_between(None, None, len(items))):
+            item.rank = rank
+        queryset.model.objects.bulk_update(items, ['rank'], batch_size=500)
+    return len(items)
+
+
+def needs_rebalance(rank):
+    return len(rank) > settings.RANK_REBALANCE_LENGTH
+
+
+# Ключи списков, перенумерация которых запущена, но еще не начала читать ранги
+_pending_rebalances = set()
+_pending_lock = threading.Lock()
+
+
+def rebalance_later(queryset, done=None, key=None):
+    """
+    Фоновая перенумерация списка после коммита текущей транзакции.
+
+    Ранги перечитываются в транзакции перенумерации, поэтому перемещения,
+    записанные до нее, не теряются. done() вызывается в той же транзакции -
+    например, чтобы сбросить кэш доски со старыми рангами.
+
+    key - ключ списка: пока его перенумерация ждет своей очереди, новая не
+    запускается (серия перетаскиваний в одну колонку дает один поток).
+    """
+    def run():
+        if key is not None:
+            with _pending_lock:
+                _pending_rebalances.discard(key)
+        try:
+            with transaction.atomic():
+                rebalance(queryset)
+                if done is not None:
+                    done()
+        finally:
+            connections.close_all()
+
+    def start():
+        if key is not None:
+            with _pending_lock:
+                if key in _pending_rebalances:
+                    return
+                _pending_rebalances.add(key)
+        threading.Thread(target=run, daemon=True).start()
+
+    transaction.on_commit(start)
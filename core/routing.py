@@ -4,4 +4,5 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/chat/task/(?P<task_id>\d+)/$', consumers.ChatConsumer.as_asgi()),
+    re_path(r'ws/board/(?P<slug>[-\w]+)/$', consumers.BoardConsumer.as_asgi()),
 ]
\ No newline at end of file
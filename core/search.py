@@ -0,0 +1,119 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+# Полнотекстовый индекс задач (SQLite FTS5).
+# Таблица хранит только индекс: текст берется из core_task (external content),
+# синхронизация - триггерами на вставку, изменение и удаление задач.
+TASK_SEARCH_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS core_task_fts USING fts5(
+        title, description,
+        content='core_task', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_task_fts_insert AFTER INSERT ON core_task BEGIN
+        INSERT INTO core_task_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_task_fts_delete AFTER DELETE ON core_task BEGIN
+        INSERT INTO core_task_fts(core_task_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_task_fts_update AFTER UPDATE OF title, description ON core_task BEGIN
+        INSERT INTO core_task_fts(core_task_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO core_task_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+DROP_TASK_SEARCH_SQL = [
+    "DROP TRIGGER IF EXISTS core_task_fts_insert",
+    "DROP TRIGGER IF EXISTS core_task_fts_delete",
+    "DROP TRIGGER IF EXISTS core_task_fts_update",
+    "DROP TABLE IF EXISTS core_task_fts",
+]
+
+
+def install_task_search(schema_editor):
+    """
+    Создает индекс и триггеры и заново индексирует задачи.
+
+    SQLite удаляет триггеры при пересоздании таблицы, поэтому миграции,
+    которые пересоздают core_task, должны вызывать эту функцию повторно.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in TASK_SEARCH_SQL:
+        schema_editor.execute(sql)
+    schema_editor.execute("INSERT INTO core_task_fts(core_task_fts) VALUES ('rebuild')")
+
+
+def uninstall_task_search(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_TASK_SEARCH_SQL:
+        schema_editor.execute(sql)
+
+
+def fts_query(text):
+    """
+    Превращает пользовательский ввод в FTS5-запрос с поиском по префиксу.
+
+    Каждое слово ищется как начало слова в тексте: "зад" находит "задача",
+    но "дача" - нет. Поиск по подстроке (как было с icontains) индекс не
+    поддерживает.
+    """
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_condition(text):
+    """
+    Условие поиска задач по названию и описанию.
+
+    На SQLite - по индексу FTS5 (слова ищутся по началу, см. fts_query),
+    на других СУБД - через icontains по подстроке.
+    """
+    if connection.vendor != 'sqlite':
+        return Q(title__icontains=text) | Q(description__icontains=text)
+
+    match = fts_query(text)
+    if not match:
+        return Q(pk__in=[])
+    return Q(id__in=RawSQL("SELECT rowid FROM core_task_fts WHERE core_task_fts MATCH %s", [match]))
+
+
+def search_rank(text):
+    """Релевантность задачи (bm25, меньше - релевантнее), None без совпадения"""
+    match = fts_query(text)
+    if connection.vendor != 'sqlite' or not match:
+        return Value(None, output_field=FloatField())
+    return RawSQL(
+        "SELECT bm25(core_task_fts) FROM core_task_fts "
+        "WHERE core_task_fts MATCH %s AND rowid = core_task.id",
+        [match],
+        output_field=FloatField(),
+    )
+
+
+def search_tasks(queryset, text, rank=False):
+    """
+    Фильтрует задачи по поисковой строке.
+
+    С rank=True добавляет аннотацию search_rank для сортировки по релевантности.
+    """
+    queryset = queryset.filter(search_condition(text))
+    if rank:
+        queryset = queryset.annotate(search_rank=search_rank(text))
+    return queryset
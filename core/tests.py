@@ -1,3 +1,1946 @@
-from django.test import TestCase
+import asyncio
+import contextvars
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.utils import OperationalError, load_backend
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from config.metrics import collect
+from config.routers import ReplicaPinMiddleware, ReplicaRouter, pin_to_primary
+
+from . import async_views, ranking, views
+from .archive import archive_batch, archive_tasks
+from .channel_layers import SQLiteChannelLayer
+from .chat_buffer import MessageBuffer
+from .consumers import BoardConsumer, ChatConsumer
+from .filters import BoardFilter, after_cursor
+from .benchmark import seed
+from .board_cache import board_cache_key
+from .models import ArchivedTask, ChecklistItem, Column, Label, Message, Project, Task
+from .presence import PresenceRegistry
+from .ranking import next_rank, rank_between, ranks_between
+from .search import search_tasks
+
+
+class DashboardQueryCountTests(TestCase):
+    """Число запросов dashboard не должно расти вместе с данными"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        self.client.force_login(self.user)
+
+    def add_project(self, index, extra_columns=0):
+        project = Project.objects.create(name=f'Project {index}', slug=f'project-{index}')
+        project.create_default_columns()
+        for i in range(extra_columns):
+            project.columns.create(name=f'Extra {i}', rank=next_rank(project.columns.all()))
+        for column in project.columns.all():
+            Task.objects.create(project=project, column=column, title='Task', created_by=self.user)
+        return project
+
+    def count_dashboard_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_constant(self):
+        self.add_project(0)
+        baseline = self.count_dashboard_queries()
+
+        for index in range(1, 6):
+            self.add_project(index, extra_columns=index)
+
+        self.assertEqual(self.count_dashboard_queries(), baseline)
+
+    def test_column_counts(self):
+        project = self.add_project(0)
+        column = project.columns.first()
+        Task.objects.create(project=project, column=column, title='Another', created_by=self.user)
+
+        response = self.client.get(reverse('dashboard'))
+        stats = response.context['projects'][0].columns_stats
+        self.assertEqual([c['count'] for c in stats], [2, 1, 1])
+        self.assertEqual(response.context['total_tasks'], 4)
+        self.assertEqual(response.context['tasks_by_day'][-1]['count'], 4)
+
+
+class SeedTests(TestCase):
+    """Сгенерированные данные согласованы: счетчики задач совпадают с фактом"""
+
+    def test_seed(self):
+        created = seed(tasks=50, projects=2, columns=3, labels=4, checklist=2, messages=3)
+
+        self.assertEqual(created['tasks'], 50)
+        self.assertEqual(Task.objects.count(), 50)
+        self.assertEqual(Message.objects.count(), 150)
+        self.assertEqual(ChecklistItem.objects.count(), 100)
+        counters = list(Task.objects.order_by('id').values_list(
+            'message_count', 'completed_checklist_count', 'total_checklist_count'
+        ))
+        Task.objects.rebuild_counters()
+        self.assertEqual(counters, list(Task.objects.order_by('id').values_list(
+            'message_count', 'completed_checklist_count', 'total_checklist_count'
+        )))
+
+        # Ранги задач в колонке уникальны, повторный запуск добавляет проекты
+        for column in Column.objects.all():
+            ranks = list(column.tasks.values_list('rank', flat=True))
+            self.assertEqual(len(ranks), len(set(ranks)))
+        seed(tasks=10, projects=1)
+        self.assertEqual(list(Project.objects.order_by('id').values_list('slug', flat=True)), ['seed-1', 'seed-2', 'seed-3'])
+
+
+class RankingTests(SimpleTestCase):
+    """Ключи сортировки: всегда есть место между соседями, порядок строк сохраняется"""
+
+    def assertIncreasing(self, ranks, before=None, after=None):
+        bounded = [before] * (before is not None) + list(ranks) + [after] * (after is not None)
+        self.assertEqual(bounded, sorted(set(bounded)))
+
+    def test_bounds(self):
+        first = rank_between(None, None)
+        self.assertEqual(first, 'a0')
+        self.assertIncreasing([rank_between(None, first), first, rank_between(first, None)])
+        self.assertIncreasing([rank_between(None, 'A' + '0' * 25 + '1')])
+
+    def test_adjacent(self):
+        for before, after in [('a0', 'a1'), ('a0', 'a0V'), ('a0V', 'a1'), ('Zz', 'a0'), ('a0', 'a01')]:
+            with self.subTest(before=before, after=after):
+                self.assertIncreasing([rank_between(before, after)], before, after)
+
+    def test_repeated_inserts(self):
+        # Вставка раз за разом сразу после одного и того же элемента
+        before, after = 'a0', 'a1'
+        inserted = []
+        for _ in range(200):
+            after = rank_between(before, after)
+            inserted.insert(0, after)
+        self.assertIncreasing(inserted, 'a0', 'a1')
+        self.assertLess(len(inserted[0]), 50)
+
+        # В начало и в конец ключ почти не растет
+        head = tail = 'a0'
+        for _ in range(1000):
+            head = rank_between(None, head)
+            tail = rank_between(tail, None)
+        self.assertLessEqual(max(len(head), len(tail)), 3)
+
+    def test_ranks_between(self):
+        self.assertEqual(ranks_between(None, None, 0), [])
+        for before, after in [(None, None), ('a0', None), (None, 'a0'), ('a0', 'a1')]:
+            with self.subTest(before=before, after=after):
+                ranks = ranks_between(before, after, 50)
+                self.assertEqual(len(ranks), 50)
+                self.assertIncreasing(ranks, before, after)
+
+    def test_invalid(self):
+        for before, after in [('a1', 'a0'), ('a0', 'a0'), ('', None), ('a', None), ('a00', None), (None, '!0')]:
+            with self.subTest(before=before, after=after):
+                with self.assertRaises(ValueError):
+                    rank_between(before, after)
+
+
+class ChecklistCounterTests(TestCase):
+    """Счетчики чеклиста на задаче совпадают с пересчетом при любом порядке запросов"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        self.client.force_login(self.user)
+        project = Project.objects.create(name='Project', slug='project')
+        project.create_default_columns()
+        self.task = Task.objects.create(
+            project=project, column=project.columns.first(), title='Task', created_by=self.user
+        )
+        for text in ['One', 'Two']:
+            self.client.post(reverse('checklist_add', args=[self.task.id]), {'text': text})
+        self.first, self.second = self.task.checklist_items.order_by('id')
+
+    def counters(self):
+        return Task.objects.filter(id=self.task.id).values_list(
+            'completed_checklist_count', 'total_checklist_count'
+        ).get()
+
+    def assertCounters(self, expected):
+        self.assertEqual(self.counters(), expected)
+        Task.objects.filter(id=self.task.id).rebuild_counters()
+        self.assertEqual(self.counters(), expected)
+
+    def test_toggle_and_delete(self):
+        self.assertCounters((0, 2))
+        for _ in range(3):
+            self.client.post(reverse('checklist_toggle', args=[self.first.id]))
+        self.assertCounters((1, 2))
+
+        self.client.post(reverse('checklist_delete', args=[self.first.id]))
+        self.assertCounters((0, 1))
+
+    def test_concurrent_toggles(self):
+        # Оба запроса прочитали пункт до того, как любой из них его изменил
+        stale = [ChecklistItem.objects.select_related('task').get(id=self.first.id) for _ in range(2)]
+        real = views.get_object_or_404
+
+        def get_item(queryset, **kwargs):
+            return stale.pop() if stale else real(queryset, **kwargs)
+
+        with mock.patch('core.views.get_object_or_404', get_item):
+            for _ in range(2):
+                response = self.client.post(reverse('checklist_toggle', args=[self.first.id]))
+                self.assertContains(response, 'bi-check-circle-fill')
+        self.assertCounters((1, 2))
+
+    def test_double_delete(self):
+        self.client.post(reverse('checklist_toggle', args=[self.second.id]))
+        response = self.client.post(reverse('checklist_delete', args=[self.second.id]))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse('checklist_delete', args=[self.second.id]))
+        self.assertEqual(response.status_code, 404)
+        self.assertCounters((0, 1))
+
+
+class TransferTests(TestCase):
+    """Выгрузка проекта и загрузка ее в новый проект"""
+
+    def setUp(self):
+        seed(tasks=30, projects=1, labels=3, checklist=2, messages=2)
+        self.project = Project.objects.get()
+        self.user = User.objects.create_user('alice', password='secret')
+        self.client.force_login(self.user)
+
+    def export(self, **params):
+        response = self.client.get(reverse('project_export', args=[self.project.slug]), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def snapshot(self, project):
+        tasks = sorted(
+            (
+                task.title, task.column.name, task.rank, task.created_by.username, task.created_at,
+                task.message_count, task.completed_checklist_count,
+                tuple(sorted(label.name for label in task.labels.all())),
+                tuple(task.checklist_items.values_list('text', 'is_completed', 'rank')),
+                tuple(task.messages.values_list('user__username', 'text', 'created_at')),
+            )
+            for task in project.tasks.all()
+        )
+        return {
+            'columns': list(project.columns.values_list('name', 'color', 'rank')),
+            'labels': sorted(project.labels.values_list('name', 'color')),
+            'tasks': tasks,
+        }
+
+    def import_command(self, data):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'project.ndjson'
+            path.write_bytes(data)
+            call_command('import_project', str(path), user='alice', stdout=StringIO())
+        return Project.objects.exclude(id=self.project.id).get()
+
+    def test_round_trip(self):
+        data = self.export()
+        self.assertEqual(json.loads(data.splitlines()[0])['type'], 'project')
+
+        imported = self.import_command(data)
+        self.assertNotEqual(imported.slug, self.project.slug)
+        self.assertEqual(self.snapshot(imported), self.snapshot(self.project))
+
+    def test_unknown_author_becomes_importer(self):
+        lines = self.export().decode().splitlines()
+        lines = [line.replace('"seed-user-1"', '"gone-user"') for line in lines]
+        imported = self.import_command('\n'.join(lines).encode())
+        authors = set(imported.tasks.values_list('created_by__username', flat=True))
+        self.assertIn('alice', authors)
+        self.assertNotIn('seed-user-1', authors)
+        self.assertIn('seed-user-2', authors)
+
+    def test_upload_authors_are_uploader(self):
+        # Через страницу нельзя создать задачи и сообщения от имени других пользователей
+        upload = SimpleUploadedFile('project.ndjson', self.export(), content_type='application/x-ndjson')
+        response = self.client.post(reverse('project_import'), {'file': upload})
+        imported = Project.objects.exclude(id=self.project.id).get()
+        self.assertEqual(response['HX-Redirect'], f'/p/{imported.slug}/')
+        self.assertEqual(imported.tasks.count(), 30)
+        self.assertEqual(set(imported.tasks.values_list('created_by__username', flat=True)), {'alice'})
+        self.assertEqual(set(Message.objects.filter(task__project=imported).values_list('user__username', flat=True)), {'alice'})
+
+    @override_settings(IMPORT_MAX_UPLOAD_SIZE=1024)
+    def test_large_upload_is_rejected(self):
+        upload = SimpleUploadedFile('project.ndjson', self.export())
+        response = self.client.post(reverse('project_import'), {'file': upload})
+        self.assertContains(response, 'import_project')
+        self.assertEqual(Project.objects.count(), 1)
+
+    def test_invalid_file_creates_nothing(self):
+        lines = self.export().decode().splitlines()
+        lines.insert(5, '{"type": "task", "column": 999999, "title": "Broken"}')
+        upload = SimpleUploadedFile('project.ndjson', '\n'.join(lines).encode())
+        response = self.client.post(reverse('project_import'), {'file': upload})
+        self.assertContains(response, 'Строка 6')
+        self.assertEqual(Project.objects.count(), 1)
+        self.assertEqual(Label.objects.count(), 3)
+
+        upload = SimpleUploadedFile('project.csv', b'id,name\n1,x\n')
+        response = self.client.post(reverse('project_import'), {'file': upload})
+        self.assertContains(response, 'некорректный JSON')
+
+    def test_csv(self):
+        rows = self.export(format='csv', table='tasks').decode().splitlines()
+        self.assertEqual(rows[0].split(',')[:3], ['id', 'column', 'title'])
+        self.assertEqual(len(rows), 31)
+
+        response = self.client.get(reverse('project_export', args=[self.project.slug]), {'format': 'csv', 'table': 'users'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ArchiveTests(TestCase):
+    """Давно выполненные задачи уходят в архив и возвращаются из него"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(name='Project', slug='project')
+        self.project.create_default_columns()
+        self.todo, _, self.done = self.project.columns.all()
+        self.label = Label.objects.create(project=self.project, name='bug')
+
+        self.old = self.create_task('Old done', self.done, days_ago=40)
+        self.old.labels.add(self.label)
+        ChecklistItem.objects.create(task=self.old, text='Step', is_completed=True, rank='a0')
+        Message.objects.create(task=self.old, user=self.user, text='Hello')
+        Task.objects.filter(id=self.old.id).rebuild_counters()
+        self.recent = self.create_task('Recent done', self.done, days_ago=1)
+        self.stale_todo = self.create_task('Old todo', self.todo, days_ago=40)
+
+    def create_task(self, title, column, days_ago):
+        task = Task.objects.create(project=self.project, column=column, title=title, created_by=self.user)
+        moment = timezone.now() - timedelta(days=days_ago)
+        Task.objects.filter(id=task.id).update(created_at=moment, updated_at=moment)
+        return Task.objects.get(id=task.id)
+
+    def test_archive_and_restore(self):
+        version = Project.objects.get(id=self.project.id).board_version
+        call_command('archive_tasks', days=30, stdout=StringIO())
+
+        self.assertEqual(set(Task.objects.values_list('title', flat=True)), {'Recent done', 'Old todo'})
+        archived = ArchivedTask.objects.get(id=self.old.id)
+        self.assertEqual(archived.column_name, self.done.name)
+        self.assertEqual(archived.created_at, self.old.created_at)
+        self.assertEqual(list(archived.labels.all()), [self.label])
+        self.assertEqual(archived.checklist_items.count(), 1)
+        self.assertEqual(archived.messages.count(), 1)
+        self.assertFalse(Message.objects.exists())
+        self.assertGreater(Project.objects.get(id=self.project.id).board_version, version)
+
+        board = self.client.get(reverse('project_board', args=['project']))
+        self.assertNotContains(board, 'Old done')
+        self.assertContains(self.client.get(reverse('project_archive', args=['project'])), 'Old done')
+
+        response = self.client.post(reverse('task_restore', args=[self.old.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(ArchivedTask.objects.exists())
+        task = Task.objects.get(id=self.old.id)
+        self.assertEqual(task.column, self.done)
+        self.assertEqual(task.created_at, self.old.created_at)
+        self.assertEqual(list(task.labels.all()), [self.label])
+        self.assertEqual(list(task.checklist_items.values_list('text', 'is_completed')), [('Step', True)])
+        self.assertEqual(task.messages.get().text, 'Hello')
+        self.assertEqual((task.message_count, task.completed_checklist_count), (1, 1))
+        self.assertContains(self.client.get(reverse('project_board', args=['project'])), 'Old done')
+
+        # Восстановленная задача не уходит обратно в архив сразу
+        self.assertEqual(archive_tasks(days=30), {self.project: 0})
+
+    def test_dry_run_and_batches(self):
+        for i in range(4):
+            self.create_task(f'Done {i}', self.done, days_ago=31)
+
+        self.assertEqual(archive_tasks(days=30, dry_run=True), {self.project: 5})
+        self.assertFalse(ArchivedTask.objects.exists())
+        self.assertEqual(archive_tasks(days=30, batch_size=2), {self.project: 5})
+        self.assertEqual(ArchivedTask.objects.count(), 5)
+
+    def test_moved_task_is_not_archived(self):
+        cutoff = timezone.now() - timedelta(days=30)
+        self.old.column = self.todo
+        self.old.save()
+        self.assertEqual(archive_batch(self.project, [self.old.id], cutoff), 0)
+        self.assertTrue(Task.objects.filter(id=self.old.id).exists())
+
+
+class SQLiteChannelLayerTests(SimpleTestCase):
+    """Два экземпляра слоя с общим файлом ведут себя как два процесса daphne"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = Path(self.tmpdir.name) / 'channels.sqlite3'
+        self.first = SQLiteChannelLayer(path=path, capacity=2)
+        self.second = SQLiteChannelLayer(path=path, capacity=2)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    async def receive(self, layer, channel):
+        return await asyncio.wait_for(layer.receive(channel), timeout=2)
+
+    async def test_group_send_reaches_other_process(self):
+        local = await self.first.new_channel()
+        remote = await self.second.new_channel()
+        await self.first.group_add('chat_1', local)
+        await self.second.group_add('chat_1', remote)
+
+        await self.first.group_send('chat_1', {'type': 'chat.message', 'text': 'Привет'})
+
+        self.assertEqual((await self.receive(self.first, local))['text'], 'Привет')
+        self.assertEqual((await self.receive(self.second, remote))['text'], 'Привет')
+        await self.first.close()
+        await self.second.close()
+
+    async def test_group_discard(self):
+        channel = await self.second.new_channel()
+        await self.second.group_add('chat_1', channel)
+        await self.first.group_discard('chat_1', channel)
+        await self.first.group_send('chat_1', {'type': 'chat.message'})
+        await self.second.send(channel, {'type': 'marker'})
+
+        self.assertEqual((await self.receive(self.second, channel))['type'], 'marker')
+        await self.second.close()
+
+    async def test_send_to_named_channel(self):
+        await self.first.send('worker', {'type': 'job', 'n': 1})
+        await self.first.send('worker', {'type': 'job', 'n': 2})
+
+        self.assertEqual((await self.receive(self.second, 'worker'))['n'], 1)
+        self.assertEqual((await self.receive(self.second, 'worker'))['n'], 2)
+
+    async def test_closed_channel_is_forgotten(self):
+        channel = await self.first.new_channel()
+        receiving = asyncio.create_task(self.first.receive(channel))
+        await asyncio.sleep(0.05)
+        self.assertIn(channel, self.first._queues)
+
+        receiving.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await receiving
+        self.assertNotIn(channel, self.first._queues)
+
+        # Сообщение закрытому каналу отбрасывается, очередь не появляется
+        await self.second.send(channel, {'type': 'late'})
+        await asyncio.sleep(0.3)
+        self.assertEqual(self.first._queues, {})
+        await self.first.close()
+
+    async def test_idle_poll_does_not_lock(self):
+        channel = await self.first.new_channel()
+        with mock.patch.object(self.first, '_take', wraps=self.first._take) as take:
+            receiving = asyncio.create_task(self.first.receive(channel))
+            await asyncio.sleep(0.3)
+            take.assert_not_called()
+
+            await self.second.send(channel, {'type': 'marker'})
+            self.assertEqual((await asyncio.wait_for(receiving, timeout=2))['type'], 'marker')
+            take.assert_called()
+        await self.first.close()
+
+    async def test_capacity(self):
+        await self.first.send('worker', {'type': 'job'})
+        await self.first.send('worker', {'type': 'job'})
+        with self.assertRaises(ChannelFull):
+            await self.second.send('worker', {'type': 'job'})
+
+
+class ChatTestMixin:
+    def create_task(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        project = Project.objects.create(name='Project', slug='project')
+        project.create_default_columns()
+        self.task = Task.objects.create(
+            project=project, column=project.columns.first(), title='Task', created_by=self.user
+        )
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/task/{self.task.id}/')
+        communicator.scope['user'] = self.user
+        communicator.scope['url_route'] = {'kwargs': {'task_id': self.task.id}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+
+@override_settings(CHAT_PAGE_SIZE=3)
+class ChatHistoryTests(ChatTestMixin, TestCase):
+    """История чата отдается страницами от новых сообщений к старым"""
+
+    def setUp(self):
+        self.create_task()
+        for i in range(7):
+            Message.objects.create(task=self.task, user=self.user, text=f'm{i}')
+
+    async def test_pages_backwards(self):
+        communicator = await self.connect()
+
+        history = await communicator.receive_json_from()
+        self.assertEqual(history['type'], 'history')
+        self.assertEqual([m['text'] for m in history['messages']], ['m4', 'm5', 'm6'])
+
+        texts, cursor = [], history['next_cursor']
+        while cursor:
+            await communicator.send_json_to({'type': 'load_older', 'cursor': cursor})
+            page = await communicator.receive_json_from()
+            self.assertEqual(page['type'], 'older')
+            texts = [m['text'] for m in page['messages']] + texts
+            cursor = page['next_cursor']
+
+        self.assertEqual(texts, ['m0', 'm1', 'm2', 'm3'])
+        await communicator.disconnect()
+
+    async def test_same_timestamp_uses_id(self):
+        await sync_to_async(Message.objects.update)(created_at=self.task.created_at)
+        communicator = await self.connect()
+
+        history = await communicator.receive_json_from()
+        await communicator.send_json_to({'type': 'load_older', 'cursor': history['next_cursor']})
+        page = await communicator.receive_json_from()
+
+        self.assertEqual([m['text'] for m in history['messages']], ['m4', 'm5', 'm6'])
+        self.assertEqual([m['text'] for m in page['messages']], ['m1', 'm2', 'm3'])
+        await communicator.disconnect()
+
+    async def test_invalid_cursor_is_ignored(self):
+        communicator = await self.connect()
+        await communicator.receive_json_from()
+
+        await communicator.send_json_to({'type': 'load_older', 'cursor': 'garbage'})
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+
+@override_settings(CHAT_WRITE_BEHIND=True)
+class ChatWriteBehindTests(ChatTestMixin, TransactionTestCase):
+    """Отложенная запись: рассылка сразу, запись пачкой, ничего не теряется"""
+    # С DB_REPLICAS чтение идет через алиасы реплик (в тестах - зеркала default)
+    databases = '__all__'
+
+    def setUp(self):
+        self.create_task()
+        # Большой интервал: сброс происходит только явно, тест не зависит от таймингов
+        self.buffer = MessageBuffer(flush_interval=3600, batch_size=100)
+        patcher = mock.patch('core.consumers.get_message_buffer', return_value=self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.buffer.stop)
+
+    async def test_broadcast_before_write(self):
+        communicator = await self.connect()
+        await communicator.receive_json_from()
+
+        await communicator.send_json_to({'message': 'Привет'})
+        broadcast = await communicator.receive_json_from()
+        self.assertEqual(broadcast['message']['text'], 'Привет')
+        self.assertEqual(await sync_to_async(Message.objects.count)(), 0)
+
+        # Несохраненное сообщение уже видно в истории новых подключений
+        other = await self.connect()
+        history = await other.receive_json_from()
+        self.assertEqual([m['id'] for m in history['messages']], [broadcast['message']['id']])
+
+        self.assertEqual(await sync_to_async(self.buffer.flush)(), 1)
+        message = await sync_to_async(Message.objects.get)()
+        self.assertEqual(str(message.uid), broadcast['message']['id'])
+        await sync_to_async(self.task.refresh_from_db)()
+        self.assertEqual(self.task.message_count, 1)
+
+        await communicator.disconnect()
+        await other.disconnect()
+
+    def test_stop_writes_everything(self):
+        for i in range(250):
+            self.buffer.add(Message(task=self.task, user=self.user, text=f'm{i}'))
+        self.buffer.stop()
+
+        self.assertEqual(Message.objects.count(), 250)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.message_count, 250)
+        with self.assertRaises(RuntimeError):
+            self.buffer.add(Message(task=self.task, user=self.user, text='late'))
+
+    def test_deleted_task_does_not_block_flush(self):
+        self.buffer.add(Message(task=self.task, user=self.user, text='lost'))
+        other = Task.objects.create(
+            project=self.task.project, column=self.task.column, title='Other', created_by=self.user
+        )
+        self.buffer.add(Message(task=other, user=self.user, text='kept'))
+        self.task.delete()
+
+        self.buffer.flush()
+        self.assertEqual(list(Message.objects.values_list('text', flat=True)), ['kept'])
+
+    def test_deleted_author_does_not_block_flush(self):
+        bob = User.objects.create_user('bob', password='secret')
+        self.buffer.add(Message(task=self.task, user=self.user, text='before'))
+        self.buffer.add(Message(task=self.task, user=bob, text='lost'))
+        self.buffer.add(Message(task=self.task, user=self.user, text='after'))
+        User.objects.filter(id=bob.id).delete()
+
+        with self.assertLogs('core.chat_buffer', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(list(Message.objects.order_by('id').values_list('text', flat=True)), ['before', 'after'])
+        self.assertEqual(self.buffer.pending_for(self.task.id), [])
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.message_count, 2)
+
+    async def test_flush_publishes_card_counters(self):
+        other = await Task.objects.acreate(
+            project_id=self.task.project_id, column_id=self.task.column_id, title='Other', created_by=self.user
+        )
+        for task in [self.task, other, self.task]:
+            self.buffer.add(Message(task=task, user=self.user, text='Привет'))
+
+        board = WebsocketCommunicator(BoardConsumer.as_asgi(), '/ws/board/project/')
+        board.scope['user'] = self.user
+        board.scope['url_route'] = {'kwargs': {'slug': 'project'}}
+        connected, _ = await board.connect()
+        self.assertTrue(connected)
+
+        await sync_to_async(self.buffer.flush)()
+        event = await board.receive_json_from()
+        self.assertEqual(event['type'], 'tasks')
+        self.assertEqual({task['id'] for task in event['changed']}, {self.task.id, other.id})
+        await board.disconnect()
+
+
+class PresenceRegistryTests(SimpleTestCase):
+    """Присутствие расходится между процессами пачками, без БД"""
+
+    room = 'chat_task_1'
+
+    def setUp(self):
+        self.alice = User(id=1, username='alice')
+        self.bob = User(id=2, username='bob')
+
+    def registry(self, **kwargs):
+        options = dict(ttl=5, heartbeat=60, interval=0.05, typing_timeout=0.2)
+        options.update(kwargs)
+        return PresenceRegistry(**options)
+
+    async def listen(self):
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.group_add(self.room, channel)
+        return layer, channel
+
+    async def events(self, layer, channel, wait=0.15):
+        events = []
+        try:
+            while True:
+                events.append(await asyncio.wait_for(layer.receive(channel), wait))
+        except asyncio.TimeoutError:
+            return events
+
+    async def test_processes_see_each_other(self):
+        layer, channel = await self.listen()
+        first, second = self.registry(), self.registry()
+        first.join(self.room, 'a', self.alice)
+        second.join(self.room, 'b', self.bob)
+
+        for event in await self.events(layer, channel):
+            first.apply(self.room, event)
+            second.apply(self.room, event)
+        self.assertEqual([user['username'] for user in first.snapshot(self.room)], ['alice', 'bob'])
+        self.assertEqual(first.snapshot(self.room), second.snapshot(self.room))
+
+        second.leave(self.room, 'b')
+        for event in await self.events(layer, channel):
+            first.apply(self.room, event)
+        self.assertEqual([user['username'] for user in first.snapshot(self.room)], ['alice'])
+
+    async def test_changes_are_coalesced(self):
+        layer, channel = await self.listen()
+        registry = self.registry(interval=0.1)
+        registry.join(self.room, 'a', self.alice)
+        for i in range(20):
+            registry.join(self.room, f'b{i}', self.bob)
+            registry.typing(self.room, f'b{i}')
+            registry.leave(self.room, f'b{i}')
+
+        events = await self.events(layer, channel)
+        # Вход - сразу, все остальное - одной рассылкой в конце интервала
+        self.assertLessEqual(len(events), 2)
+        self.assertEqual(events[-1]['members'], [{'user_id': 1, 'username': 'alice', 'typing': False}])
+
+    async def test_typing_is_throttled_and_expires(self):
+        layer, channel = await self.listen()
+        registry = self.registry()
+        registry.join(self.room, 'a', self.alice)
+        await self.events(layer, channel)
+
+        for i in range(10):
+            registry.typing(self.room, 'a')
+            await asyncio.sleep(0.01)
+        events = await self.events(layer, channel, wait=0.1)
+        self.assertEqual([event['members'][0]['typing'] for event in events], [True])
+
+        # Без новых сигналов набор гаснет сам
+        events = await self.events(layer, channel, wait=0.3)
+        self.assertEqual([event['members'][0]['typing'] for event in events], [False])
+
+    async def test_silent_members_expire(self):
+        layer, channel = await self.listen()
+        first, second = self.registry(ttl=0.2), self.registry(ttl=0.2)
+        first.join(self.room, 'a', self.alice)
+        for event in await self.events(layer, channel):
+            second.apply(self.room, event)
+        self.assertEqual(len(second.snapshot(self.room)), 1)
+
+        # Процесс first "упал": его участник пропадает по TTL
+        await asyncio.sleep(0.25)
+        self.assertEqual(second.snapshot(self.room), [])
+
+
+class ChatPresenceTests(ChatTestMixin, TestCase):
+    """Клиент чата получает участников и набор текста"""
+
+    def setUp(self):
+        self.create_task()
+        self.bob = User.objects.create_user('bob', password='secret')
+        registry = PresenceRegistry(ttl=5, heartbeat=60, interval=0.05, typing_timeout=1)
+        patcher = mock.patch('core.consumers.get_presence_registry', return_value=registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_presence_and_typing(self):
+        alice = await self.connect()
+        history = await alice.receive_json_from()
+        self.assertEqual([user['username'] for user in history['presence']], ['alice'])
+
+        self.user = self.bob
+        bob = await self.connect()
+        await bob.receive_json_from()
+        presence = await alice.receive_json_from()
+        self.assertEqual(presence['type'], 'presence')
+        self.assertEqual([user['username'] for user in presence['users']], ['alice', 'bob'])
+
+        for i in range(5):
+            await bob.send_json_to({'type': 'typing'})
+        presence = await alice.receive_json_from()
+        self.assertEqual([user['typing'] for user in presence['users']], [False, True])
+        self.assertTrue(await alice.receive_nothing(0.2))
+
+        await bob.disconnect()
+        presence = await alice.receive_json_from()
+        self.assertEqual([user['username'] for user in presence['users']], ['alice'])
+        await alice.disconnect()
+
+
+class BoardEventsTests(TransactionTestCase):
+    """Записи задач рассылают дельты открытым доскам проекта"""
+    # С DB_REPLICAS чтение идет через алиасы реплик (в тестах - зеркала default)
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(name='Project', slug='project')
+        self.project.create_default_columns()
+        self.todo, self.done = list(self.project.columns.all())[:2]
+        self.task = Task.objects.create(
+            project=self.project, column=self.todo, title='Task', created_by=self.user, rank='a0'
+        )
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(BoardConsumer.as_asgi(), '/ws/board/project/')
+        communicator.scope['user'] = self.user
+        communicator.scope['url_route'] = {'kwargs': {'slug': 'project'}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_move_publishes_delta(self):
+        communicator = await self.connect()
+        await sync_to_async(self.client.post)(
+            reverse('task_move', args=[self.task.id]), {'column_id': self.done.id}
+        )
+
+        event = await communicator.receive_json_from()
+        self.assertEqual(event['type'], 'tasks')
+        self.assertEqual(event['changed'][0]['id'], self.task.id)
+        self.assertEqual(event['changed'][0]['column_id'], self.done.id)
+        self.assertEqual(event['deleted'], [])
+        await communicator.disconnect()
+
+    async def test_delete_and_column_change(self):
+        communicator = await self.connect()
+        await sync_to_async(self.client.post)(reverse('task_delete', args=[self.task.id]))
+        event = await communicator.receive_json_from()
+        self.assertEqual(event['deleted'], [self.task.id])
+
+        await sync_to_async(self.client.post)(reverse('column_delete', args=[self.done.id]))
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'board'})
+        await communicator.disconnect()
+
+    def test_cards_respect_filters(self):
+        other = Task.objects.create(
+            project=self.project, column=self.done, title='Other', priority='high', created_by=self.user
+        )
+        url = reverse('project_cards', args=['project'])
+
+        response = self.client.get(url, {'task': [self.task.id, other.id], 'priority': 'high'})
+        self.assertNotContains(response, f'data-task-id="{self.task.id}"')
+        self.assertContains(response, f'data-task-id="{other.id}"')
+        self.assertEqual(json.loads(response['X-Column-Counts']), {str(self.done.id): 1})
+
+
+class CardUpdateTests(TestCase):
+    """После правки задачи отдается только ее карточка и счетчики колонок"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(name='Project', slug='project')
+        self.project.create_default_columns()
+        self.column = self.project.columns.first()
+        self.task = Task.objects.create(
+            project=self.project, column=self.column, title='Task', created_by=self.user, rank='a0'
+        )
+
+    def edit(self, priority, filters=''):
+        return self.client.post(
+            reverse('task_edit', args=[self.task.id]),
+            {'title': 'Renamed', 'priority': priority},
+            HTTP_X_BOARD_FILTERS=filters,
+        )
+
+    def test_edit_returns_card(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.edit('high')
+        self.assertContains(response, f'id="task-{self.task.id}"')
+        self.assertContains(response, 'hx-swap-oob="true"', count=4)
+        self.assertContains(response, 'Renamed')
+        self.assertContains(response, f'<span class="column-count" id="column-count-{self.column.id}" hx-swap-oob="true">1</span>', html=True)
+        self.assertEqual(response['HX-Trigger-After-Settle'], 'cardChanged')
+        self.assertNotIn('board-column', response.content.decode())
+        self.assertLess(len(ctx.captured_queries), 15)
+
+    def test_edit_out_of_filter_removes_card(self):
+        response = self.edit('low', filters='priority=high')
+        self.assertContains(response, f'<div id="task-{self.task.id}" hx-swap-oob="delete"></div>', html=True)
+        self.assertContains(response, f'<span class="column-count" id="column-count-{self.column.id}" hx-swap-oob="true">0</span>', html=True)
+
+    def test_create_appends_to_loaded_column(self):
+        response = self.client.post(
+            reverse('task_create', args=['project']) + f'?column={self.column.id}',
+            {'title': 'New', 'priority': 'medium'},
+        )
+        self.assertContains(response, f'hx-swap-oob="beforeend:#column-tasks-{self.column.id}:not(:has(.tasks-more))"')
+        self.assertContains(response, 'New')
+
+    def test_checklist_toggle_updates_card(self):
+        item = self.task.checklist_items.create(text='Step', rank='a0')
+        Task.objects.filter(id=self.task.id).update(total_checklist_count=1)
+
+        response = self.client.post(reverse('checklist_toggle', args=[item.id]))
+        self.assertContains(response, f'id="checklist-item-{item.id}"')
+        self.assertContains(response, '1/1')
+
+
+class BoardFilterTests(TestCase):
+    """Фильтры доски выполняются в БД, число запросов доски не зависит от данных"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        self.bob = User.objects.create_user('bob', password='secret')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(name='Project', slug='project')
+        self.project.create_default_columns()
+        self.column = self.project.columns.first()
+        self.label = self.project.labels.create(name='Bug', color='red')
+        today = timezone.now().date()
+        self.overdue = self.add_task('Overdue', priority='high', due_date=today - timedelta(days=1))
+        self.today = self.add_task('Today', priority='low', due_date=today)
+        self.week = self.add_task('Week', due_date=today + timedelta(days=5), created_by=self.bob)
+        self.later = self.add_task('Later', due_date=today + timedelta(days=30), created_by=self.bob)
+        self.undated = self.add_task('Undated')
+        self.today.labels.add(self.label)
+        self.week.labels.add(self.label)
+
+    def add_task(self, title, **fields):
+        fields.setdefault('created_by', self.user)
+        return Task.objects.create(project=self.project, column=self.column, title=title, **fields)
+
+    def filtered(self, **params):
+        board_filter = BoardFilter(params, self.user)
+        return set(board_filter.filter_queryset(self.project.tasks.all()))
+
+    def test_search(self):
+        self.assertEqual(self.filtered(search=' undat '), {self.undated})
+
+    def test_priority(self):
+        self.assertEqual(self.filtered(priority='high'), {self.overdue})
+        self.assertEqual(self.filtered(priority='medium'), {self.week, self.later, self.undated})
+
+    def test_invalid_priority_is_ignored(self):
+        # Раньше неизвестный приоритет давал пустую доску, теперь фильтр не применяется
+        self.assertEqual(self.filtered(priority='extreme'), self.filtered())
+        self.assertEqual(len(self.filtered()), 5)
+
+    def test_label(self):
+        self.assertEqual(self.filtered(label=str(self.label.id)), {self.today, self.week})
+        self.assertEqual(len(self.filtered(label='bug')), 5)
+
+    def test_due(self):
+        self.assertEqual(self.filtered(due='overdue'), {self.overdue})
+        self.assertEqual(self.filtered(due='today'), {self.today})
+        self.assertEqual(self.filtered(due='week'), {self.today, self.week})
+        self.assertEqual(self.filtered(due='none'), {self.undated})
+        self.assertEqual(len(self.filtered(due='someday')), 5)
+
+    def test_my(self):
+        self.assertEqual(self.filtered(my='1'), {self.overdue, self.today, self.undated})
+
+    def test_combined(self):
+        self.assertEqual(self.filtered(label=str(self.label.id), my='1'), {self.today})
+
+    def count_board_queries(self, **params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('project_board', args=['project']), params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_constant(self):
+        params = {'label': self.label.id, 'due': 'week'}
+        baseline = self.count_board_queries(**params)
+
+        for index in range(3):
+            column = self.project.columns.create(name=f'Extra {index}', rank=next_rank(self.project.columns.all()))
+            label = self.project.labels.create(name=f'Label {index}', color='blue')
+            for _ in range(3):
+                task = Task.objects.create(
+                    project=self.project, column=column, title='Task', created_by=self.bob,
+                    due_date=timezone.now().date(),
+                )
+                task.labels.add(self.label, label)
+
+        self.assertEqual(self.count_board_queries(**params), baseline)
+
+
+@override_settings(BOARD_PAGE_SIZE=2)
+class ColumnPagingTests(TestCase):
+    """Догрузка колонки по курсору (rank, id), в том числе при равных рангах"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='secret')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(name='Project', slug='project')
+        self.project.create_default_columns()
+        self.column = self.project.columns.first()
+        # Ранги совпадают, например после импорта: порядок задает id
+        self.tasks = [
+            Task.objects.create(project=self.project, column=self.column, title=f'Task {i}', rank='a0', created_by=self.user)
+            for i in range(5)
+        ]
+
+    def page(self, after=None, **params):
+        if after:
+            params['after'] = after
+        response = self.client.get(reverse('column_tasks', args=[self.column.id]), params)
+        self.assertEqual(response.status_code, 200)
+        context = response.context
+        return [task.id for task in context['tasks']], context['next_cursor']
+
+    def test_pages_cover_column_once(self):
+        # Первая страница рендерится с доской, курсор - последняя ее задача
+        cursor = f'a0.{self.tasks[1].id}'
+        response = self.client.get(reverse('project_board', args=['project']), HTTP_HX_REQUEST='true')
+        self.assertContains(response, f'?after={cursor}')
+        seen = [self.tasks[0].id, self.tasks[1].id]
+
+        ids, cursor = self.page(cursor)
+        self.assertEqual(cursor, f'a0.{self.tasks[3].id}')
+        seen += ids
+
+        # Последняя страница: остаток без курсора следующей
+        ids, cursor = self.page(cursor)
+        self.assertIsNone(cursor)
+        seen += ids
+        self.assertEqual(seen, [task.id for task in self.tasks])
+
+    def test_exact_last_page(self):
+        self.tasks[-1].delete()
+        ids, cursor = self.page(f'a0.{self.tasks[1].id}')
+        self.assertEqual(ids, [self.tasks[2].id, self.tasks[3].id])
+        self.assertIsNone(cursor)
+        response = self.client.get(reverse('column_tasks', args=[self.column.id]), {'after': f'a0.{self.tasks[1].id}'})
+        self.assertNotContains(response, 'tasks-more')
+
+    def test_cursor_keeps_filters(self):
+        Task.objects.filter(id__in=[self.tasks[2].id, self.tasks[3].id]).update(priority='high')
+        ids, cursor = self.page(f'a0.{self.tasks[0].id}', priority='high')
+        self.assertEqual((ids, cursor), ([self.tasks[2].id, self.tasks[3].id], None))
+
+    def count_vm_steps(self):
+        # Число шагов виртуальной машины SQLite - детерминированная мера того,
+        # сколько строк прочитал запрос
+        steps = [0]
+
+        def progress():
+            steps[0] += 1
+
+        connection.ensure_connection()
+        connection.connection.set_progress_handler(progress, 1)
+        try:
+            columns = BoardFilter({}, self.user).load_columns(self.project, 2)
+        finally:
+            connection.connection.set_progress_handler(None, 1)
+        self.assertEqual(len(columns[0].filtered_tasks), 2)
+        return steps[0]
+
+    def test_first_page_cost_does_not_grow_with_column(self):
+        small = self.count_vm_steps()
+        Task.objects.bulk_create([
+            Task(project=self.project, column=self.column, title='More', rank='b0', created_by=self.user)
+            for _ in range(500)
+        ])
+        self.assertLess(self.count_vm_steps(), small * 1.2)
+
+    def test_first_pages_use_column_index(self):
+        condition = BoardFilter({}, self.user).first_pages(self.project.columns.all(), 3)
+        sql, params = Task.objects.filter(condition).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[3] for row in cursor.fetchall()]
+        column_pages = [line for line in plan if 'core_task_column_rank_idx (column_id=?)' in line]
+        self.assertEqual(len(column_pages), self.project.columns.count())
+        # Сами задачи читаются по первичному ключу, сортируются только страницы
+        self.assertEqual(plan.count('SEARCH core_task USING INTEGER PRIMARY KEY (rowid=?)'), len(column_pages))
+        self.assertFalse([line for line in plan if line.startswith('SCAN')])
+
+    def test_invalid_cursor_starts_over(self):
+        ids, cursor = self.page('a0.x')
+        self.assertEqual(ids, [self.tasks[0].id, self.tasks[1].id])
+        self.assertEqual(cursor, f'a0.{self.tasks[1].id}')
+
+
+class TaskSearchTests(TestCase):
+    """Полнотекстовый индекс задач следует за таблицей, поиск доски и админки"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser('alice', password='secret')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(name='Project', slug='project')
+        self.project.create_default_columns()
+        self.column = self.project.columns.first()
+        self.cache_task = self.add_task('Почистить кэш', 'Старые ключи доски')
+        self.deploy_task = self.add_task('Выкатить релиз', 'Собрать образ')
+
+    def add_task(self, title, description=''):
+        return Task.objects.create(
+            project=self.project, column=self.column, title=title, description=description, created_by=self.user
+        )
+
+    def found(self, text):
+        return set(search_tasks(Task.objects.all(), text))
+
+    def test_insert(self):
+        self.assertEqual(self.found('кэш'), {self.cache_task})
+        self.assertEqual(self.found('образ'), {self.deploy_task})
+
+    def test_update(self):
+        self.cache_task.title = 'Обновить зависимости'
+        self.cache_task.save()
+        self.assertEqual(self.found('кэш'), set())
+        self.assertEqual(self.found('зависимости'), {self.cache_task})
+
+        Task.objects.filter(id=self.deploy_task.id).update(description='Прогнать миграции')
+        self.assertEqual(self.found('образ'), set())
+        self.assertEqual(self.found('миграции'), {self.deploy_task})
+
+    def test_delete(self):
+        self.cache_task.delete()
+        self.assertEqual(self.found('кэш'), set())
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rowid FROM core_task_fts")
+            self.assertEqual([row[0] for row in cursor.fetchall()], [self.deploy_task.id])
+
+    def test_prefix_only(self):
+        # Слова ищутся по началу, а не по подстроке
+        self.assertEqual(self.found('почист ключ'), {self.cache_task})
+        self.assertEqual(self.found('чистить'), set())
+
+    def test_board_search(self):
+        response = self.client.get(
+            reverse('project_board', args=['project']), {'search': 'релиз'}, HTTP_HX_REQUEST='true'
+        )
+        self.assertContains(response, f'id="task-{self.deploy_task.id}"')
+        self.assertNotContains(response, f'id="task-{self.cache_task.id}"')
+
+    def test_admin_search(self):
+        url = reverse('admin:core_task_changelist')
+        response = self.client.get(url, {'q': 'кэш'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.cache_task])
+
+        # По названию проекта по-прежнему ищется подстрока
+        response = self.client.get(url, {'q': 'roject'})
+        self.assertEqual(set(response.context['cl'].result_list), {self.cache_task, self.deploy_task})
+
+    def test_admin_blank_search(self):
+        response = self.client.get(reverse('admin:core_task_changelist'), {'q': '   '})
+        self.assertEqual(set(response.context['cl'].result_list), {self.cache_task, self.deploy_task})
+
+
+class TaskBulkTests(TestCase):
+    """Массовые операции над задачами доски"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        self.bob = User.objects.create_user('bob', password='secret')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(name='Project', slug='project')
+        self.project.create_default_columns()
+        self.todo, self.doing, self.done = self.project.columns.order_by('rank', 'id')
+        self.label = self.project.labels.create(name='Bug', color='red')
+        self.tasks = [
+            Task.objects.create(
+                project=self.project, column=self.todo, title=f'Task {i}', rank=f'a{i}',
+                created_by=self.user if i < 2 else self.bob,
+            )
+            for i in range(3)
+        ]
+        self.done_task = Task.objects.create(
+            project=self.project, column=self.done, title='Done', rank='a0', created_by=self.user
+        )
+        self.other = Project.objects.create(name='Other', slug='other')
+        self.other.create_default_columns()
+        self.other_task = Task.objects.create(
+            project=self.other, column=self.other.columns.first(), title='Other', created_by=self.user
+        )
+
+    def bulk(self, action, tasks, **data):
+        return self.client.post(
+            reverse('task_bulk', args=['project']),
+            {'action': action, 'task_ids': [task.id for task in tasks], **data},
+        )
+
+    def test_move(self):
+        response = self.bulk('move', self.tasks[:2], column_id=self.done.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['HX-Trigger'], 'taskChanged')
+        titles = list(self.done.tasks.order_by('rank', 'id').values_list('title', flat=True))
+        self.assertEqual(titles, ['Done', 'Task 0', 'Task 1'])
+
+    def test_priority(self):
+        self.bulk('priority', self.tasks, priority='urgent')
+        self.assertEqual(set(self.project.tasks.filter(column=self.todo).values_list('priority', flat=True)), {'urgent'})
+        self.assertEqual(self.bulk('priority', self.tasks, priority='extreme').status_code, 400)
+
+    def test_labels(self):
+        self.bulk('add_label', self.tasks[:2], label_id=self.label.id)
+        self.bulk('add_label', self.tasks, label_id=self.label.id)
+        self.assertEqual(self.label.tasks.count(), 3)
+        self.bulk('remove_label', self.tasks[1:], label_id=self.label.id)
+        self.assertEqual(list(self.label.tasks.all()), [self.tasks[0]])
+
+    def test_delete_only_own(self):
+        self.bulk('delete', self.tasks)
+        self.assertEqual(list(self.project.tasks.filter(column=self.todo)), [self.tasks[2]])
+
+    def test_invalid_ids(self):
+        self.assertEqual(self.bulk('move', self.tasks, column_id='abc').status_code, 400)
+        self.assertEqual(self.bulk('move', self.tasks).status_code, 400)
+        self.assertEqual(self.bulk('add_label', self.tasks, label_id='1; drop').status_code, 400)
+        self.assertEqual(self.bulk('archive', self.tasks).status_code, 400)
+
+    def test_other_project(self):
+        other_column = self.other.columns.last()
+        other_label = self.other.labels.create(name='Bug', color='red')
+        self.assertEqual(self.bulk('move', self.tasks, column_id=other_column.id).status_code, 404)
+        self.assertEqual(self.bulk('add_label', self.tasks, label_id=other_label.id).status_code, 404)
+        self.assertEqual(self.project.tasks.filter(column=self.todo).count(), 3)
+
+        # Задачи чужого проекта не затрагиваются, даже если их id переданы
+        self.bulk('priority', [self.other_task], priority='urgent')
+        self.bulk('delete', [self.other_task])
+        self.other_task.refresh_from_db()
+        self.assertEqual(self.other_task.priority, Task.Priority.MEDIUM)
+
+
+class TaskMoveTests(TestCase):
+    """Перемещение задачи пишет только ее ранг, некорректная позиция - ошибка"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(name='Project', slug='project')
+        self.project.create_default_columns()
+        self.todo, self.done = self.project.columns.order_by('rank', 'id')[::2]
+        self.task = Task.objects.create(project=self.project, column=self.todo, title='Task', rank='a0', created_by=self.user)
+        self.first, self.second = [
+            Task.objects.create(project=self.project, column=self.done, title=title, rank=rank, created_by=self.user)
+            for title, rank in [('First', 'a0'), ('Second', 'a1')]
+        ]
+
+    def move(self, **data):
+        return self.client.post(reverse('task_move', args=[self.task.id]), data)
+
+    def test_move_between(self):
+        self.assertEqual(self.move(column_id=self.done.id, after_id=self.first.id).status_code, 200)
+        titles = list(self.done.tasks.order_by('rank', 'id').values_list('title', flat=True))
+        self.assertEqual(titles, ['First', 'Task', 'Second'])
+
+    def test_invalid_position(self):
+        self.assertEqual(self.move(column_id='x').status_code, 400)
+        self.assertEqual(self.move(column_id=self.done.id, after_id='x').status_code, 400)
+
+        # Ключ соседа испорчен: задача не переезжает молча в конец колонки
+        Task.objects.filter(id=self.first.id).update(rank='a')
+        self.assertEqual(self.move(column_id=self.done.id, after_id=self.first.id).status_code, 400)
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.column, self.task.rank), (self.todo, 'a0'))
+
+    def test_unknown_neighbour(self):
+        # Соседа нет в целевой колонке - задача не встает молча в ее начало
+        other = Task.objects.create(project=self.project, column=self.todo, title='Other', rank='a1', created_by=self.user)
+        for after_id in [999999, other.id, self.task.id]:
+            self.assertEqual(self.move(column_id=self.done.id, after_id=after_id).status_code, 400)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.column, self.todo)
+
+    def test_move_between_equal_ranks(self):
+        Task.objects.filter(column=self.done).update(rank='a0')
+        third = Task.objects.create(project=self.project, column=self.done, title='Third', rank='a0', created_by=self.user)
+
+        self.assertEqual(self.move(column_id=self.done.id, after_id=self.first.id).status_code, 200)
+        titles = list(self.done.tasks.order_by('rank', 'id').values_list('title', flat=True))
+        self.assertEqual(titles, ['First', 'Task', 'Second', 'Third'])
+        self.assertEqual(len(set(self.done.tasks.values_list('rank', flat=True))), 4)
+
+    @override_settings(RANK_REBALANCE_LENGTH=2)
+    def test_one_pending_rebalance_per_column(self):
+        self.addCleanup(ranking._pending_rebalances.clear)
+        tasks = [
+            Task.objects.create(project=self.project, column=self.todo, title=f'Moved {i}', created_by=self.user)
+            for i in range(3)
+        ]
+        threading_mock = mock.Mock()
+        with mock.patch('core.ranking.threading', threading_mock):
+            for task in tasks:
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post(reverse('task_move', args=[task.id]), {'column_id': self.done.id, 'after_id': self.first.id})
+
+        # Поток еще не начал работу - остальные перемещения нового не запускают
+        self.assertEqual(threading_mock.Thread.call_count, 1)
+
+
+class ColumnDeleteTests(TestCase):
+    """Задачи удаляемой колонки переезжают в первую в одной транзакции с удалением"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(name='Project', slug='project')
+        self.project.create_default_columns()
+        self.todo, self.done = self.project.columns.order_by('rank', 'id')[::2]
+        Task.objects.create(project=self.project, column=self.todo, title='Todo', rank='a0', created_by=self.user)
+        self.tasks = [
+            Task.objects.create(project=self.project, column=self.done, title=f'Done {i}', rank=f'a{i}', created_by=self.user)
+            for i in range(2)
+        ]
+
+    def delete_done(self):
+        return self.client.post(reverse('column_delete', args=[self.done.id]))
+
+    def test_tasks_move_to_first_column(self):
+        updated_at = Task.objects.get(id=self.tasks[0].id).updated_at
+        self.assertEqual(self.delete_done().status_code, 200)
+        titles = list(self.todo.tasks.order_by('rank', 'id').values_list('title', flat=True))
+        self.assertEqual(titles, ['Todo', 'Done 0', 'Done 1'])
+        self.assertGreater(Task.objects.get(id=self.tasks[0].id).updated_at, updated_at)
+
+    def test_failure_keeps_tasks(self):
+        with mock.patch('core.views.bump_board_version', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                self.delete_done()
+        self.assertTrue(Column.objects.filter(id=self.done.id).exists())
+        self.assertEqual(self.done.tasks.count(), 2)
+
+
+class SynchronousThread(threading.Thread):
+    """Поток, который start() дожидается: фоновая работа идет по очереди с тестом"""
+
+    def start(self):
+        super().start()
+        self.join()
+
+
+@override_settings(RANK_REBALANCE_LENGTH=2)
+class RebalanceTests(TransactionTestCase):
+    """Фоновая перенумерация колонки после перемещения сбрасывает кэш доски"""
+
+    def test_rebalance_after_move(self):
+        user = User.objects.create_user('alice', password='secret')
+        self.client.force_login(user)
+        project = Project.objects.create(name='Project', slug='project')
+        project.create_default_columns()
+        column = project.columns.first()
+        first, second = [
+            Task.objects.create(project=project, column=column, title=title, rank=rank, created_by=user)
+            for title, rank in [('First', 'a0'), ('Second', 'a1')]
+        ]
+        moved = [
+            Task.objects.create(project=project, column=project.columns.last(), title=f'Moved {i}', created_by=user)
+            for i in range(3)
+        ]
+
+        version = Project.objects.get(id=project.id).board_version
+        with mock.patch('core.ranking.threading', mock.Mock(Thread=SynchronousThread)):
+            for task in moved:
+                self.client.post(reverse('task_move', args=[task.id]), {'column_id': column.id, 'after_id': first.id})
+
+        # Ключ между соседями длиннее двух символов: после каждого перемещения
+        # колонка перенумеровывается, и версия доски растет еще раз
+        self.assertEqual(Project.objects.get(id=project.id).board_version, version + 2 * len(moved))
+        self.assertLessEqual(max(len(rank) for rank in column.tasks.values_list('rank', flat=True)), 2)
+        titles = list(column.tasks.order_by('rank', 'id').values_list('title', flat=True))
+        self.assertEqual(titles, ['First', 'Moved 2', 'Moved 1', 'Moved 0', 'Second'])
+
+    def test_command_bumps_board_version(self):
+        user = User.objects.create_user('alice', password='secret')
+        project = Project.objects.create(name='Project', slug='project')
+        project.create_default_columns()
+        column = project.columns.first()
+        for rank in ['a0V', 'a0VV']:
+            Task.objects.create(project=project, column=column, title=rank, rank=rank, created_by=user)
+
+        call_command('rebalance_ranks', stdout=StringIO())
+        self.assertEqual(list(column.tasks.values_list('title', 'rank')), [('a0V', 'a0'), ('a0VV', 'a1')])
+        self.assertEqual(Project.objects.get(id=project.id).board_version, project.board_version + 1)
+
+
+class ConditionalGetTests(TestCase):
+    """Неизменившиеся страницы отдаются как 304 без рендера"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(name='Project', slug='project')
+        self.project.create_default_columns()
+        self.task = Task.objects.create(
+            project=self.project, column=self.project.columns.first(), title='Task', created_by=self.user
+        )
+
+    def assertRevalidates(self, url, **headers):
+        # Первый ответ выставляет CSRF-cookie, от которой зависит ETag
+        self.client.get(url, **headers)
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with self.assertNumQueries(3):  # сессия, пользователь, версия
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **headers)
+        self.assertEqual(response.status_code, 304)
+
+        self.client.post(reverse('task_edit', args=[self.task.id]), {'title': 'Changed', 'priority': 'low'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_board(self):
+        self.assertRevalidates(reverse('project_board', args=['project']))
+
+    def test_board_partial(self):
+        url = reverse('project_board', args=['project'])
+        self.assertRevalidates(url, HTTP_HX_REQUEST='true')
+
+        full = self.client.get(url)
+        self.assertIn('HX-Request', full['Vary'])
+        partial = self.client.get(url, HTTP_HX_REQUEST='true', HTTP_IF_NONE_MATCH=full['ETag'])
+        self.assertEqual(partial.status_code, 200)
+
+    def test_filters_change_etag(self):
+        url = reverse('project_board', args=['project'])
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(self.client.get(url, {'priority': 'high'})['ETag'], etag)
+
+    def test_dashboard_and_home(self):
+        self.assertRevalidates(reverse('dashboard'))
+        self.assertRevalidates(reverse('home'))
+
+
+class BoardCacheTests(TestCase):
+    """Каждое изменение доски увеличивает ее версию, и кэш колонок не отдается"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='secret')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(name='Project', slug='project')
+        self.project.create_default_columns()
+        self.todo, self.done = self.project.columns.order_by('rank', 'id')[::2]
+        self.label = self.project.labels.create(name='Bug', color='red')
+        self.task = Task.objects.create(
+            project=self.project, column=self.todo, title='Task', rank='a0', created_by=self.user
+        )
+        self.task.labels.add(self.label)
+        self.item = self.task.checklist_items.create(text='Step', rank='a0')
+        Task.objects.filter(id=self.task.id).update(total_checklist_count=1)
+
+    def board(self):
+        response = self.client.get(reverse('project_board', args=['project']), HTTP_HX_REQUEST='true')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def cache_key(self):
+        self.project.refresh_from_db()
+        return board_cache_key(self.project, self.user, BoardFilter({}, self.user))
+
+    def assertInvalidates(self, url, data=None):
+        before = self.board()
+        key = self.cache_key()
+        self.assertEqual(cache.get(key), before)
+        version = self.project.board_version
+
+        response = self.client.post(url, data or {})
+        self.assertLess(response.status_code, 400)
+
+        new_key = self.cache_key()
+        self.assertGreater(self.project.board_version, version)
+        self.assertIsNone(cache.get(new_key))
+        return before, self.board()
+
+    def test_create(self):
+        _, after = self.assertInvalidates(
+            reverse('task_create', args=['project']) + f'?column={self.todo.id}',
+            {'title': 'Created', 'priority': 'medium'},
+        )
+        self.assertIn('Created', after)
+
+    def test_edit(self):
+        _, after = self.assertInvalidates(
+            reverse('task_edit', args=[self.task.id]), {'title': 'Renamed', 'priority': 'high'}
+        )
+        self.assertIn('Renamed', after)
+
+    def test_move(self):
+        before, after = self.assertInvalidates(reverse('task_move', args=[self.task.id]), {'column_id': self.done.id})
+        self.assertIn(f'<span class="column-count" id="column-count-{self.done.id}">0</span>', before)
+        self.assertIn(f'<span class="column-count" id="column-count-{self.done.id}">1</span>', after)
+
+    def test_delete(self):
+        _, after = self.assertInvalidates(reverse('task_delete', args=[self.task.id]))
+        self.assertNotIn(f'id="task-{self.task.id}"', after)
+
+    def test_checklist(self):
+        _, after = self.assertInvalidates(reverse('checklist_add', args=[self.task.id]), {'text': 'Next'})
+        self.assertIn('0/2', after)
+        _, after = self.assertInvalidates(reverse('checklist_toggle', args=[self.item.id]))
+        self.assertIn('1/2', after)
+        _, after = self.assertInvalidates(reverse('checklist_delete', args=[self.item.id]))
+        self.assertIn('0/1', after)
+
+    def test_label(self):
+        self.assertInvalidates(reverse('label_create', args=['project']), {'name': 'Feature', 'color': 'blue'})
+        before, after = self.assertInvalidates(reverse('label_delete', args=[self.label.id]))
+        self.assertIn('Bug', before)
+        self.assertNotIn('Bug', after)
+
+
+@override_settings(
+    REQUEST_TIMING=True,
+    TEMPLATES=[dict(settings.TEMPLATES[0], BACKEND='config.timing.TimedDjangoTemplates')],
+)
+class RequestTimingTests(TestCase):
+    """Замеры запроса: Server-Timing и журнал медленных запросов"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        self.client.force_login(self.user)
+        Project.objects.create(name='Project', slug='project').create_default_columns()
+
+    def test_server_timing(self):
+        User.objects.filter(id=self.user.id).update(is_staff=True)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('project_board', args=['project']))
+        timing = response['Server-Timing']
+        self.assertIn(f'desc="{len(queries)} SQL"', timing)
+        self.assertRegex(timing, r'db;dur=[0-9.]+.*tpl;dur=[0-9.]+.*total;dur=[0-9.]+')
+
+    def test_server_timing_is_hidden(self):
+        # Обычным пользователям и анонимам замеры не показываются
+        self.assertNotIn('Server-Timing', self.client.get(reverse('home')))
+        self.client.logout()
+        self.assertNotIn('Server-Timing', self.client.get(reverse('login')))
+
+        with override_settings(DEBUG=True):
+            self.assertIn('Server-Timing', self.client.get(reverse('login')))
+
+    async def test_server_timing_async(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(reverse('home'))
+        self.assertNotIn('Server-Timing', response)
+
+        await User.objects.filter(id=self.user.id).aupdate(is_staff=True)
+        response = await self.async_client.get(reverse('home'))
+        self.assertIn('Server-Timing', response)
+
+    @override_settings(SLOW_REQUEST_MS=0, SLOW_QUERIES_LOGGED=2)
+    def test_slow_request_is_logged(self):
+        with self.assertLogs('config.timing', 'WARNING') as logs:
+            self.client.get(reverse('dashboard'))
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['path'], '/dashboard/')
+        self.assertEqual(entry['status'], 200)
+        self.assertGreater(entry['queries'], 2)
+        self.assertGreater(entry['template_ms'], 0)
+        self.assertEqual(len(entry['slowest_queries']), 2)
+        self.assertGreaterEqual(entry['slowest_queries'][0]['ms'], entry['slowest_queries'][1]['ms'])
+
+    def test_fast_request_is_not_logged(self):
+        with self.assertNoLogs('config.timing', 'WARNING'):
+            self.client.get(reverse('home'))
+
+    @override_settings(REQUEST_TIMING=False)
+    def test_disabled(self):
+        response = self.client.get(reverse('home'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class MetricsTests(ChatTestMixin, TestCase):
+    """Метрики Prometheus: HTTP, чат и сложение снимков нескольких процессов"""
+
+    def setUp(self):
+        self.create_task()
+        self.client.force_login(self.user)
+
+    def value(self, name, *labels):
+        return collect()[name].get(tuple(labels), 0)
+
+    def test_http_metrics(self):
+        before = self.value('http_requests_total', 'home', 'GET', '200')
+        self.client.get(reverse('home'))
+        self.assertEqual(self.value('http_requests_total', 'home', 'GET', '200'), before + 1)
+
+        text = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        count = re.search(r'^http_request_duration_seconds_count\{view="home",method="GET"\} (\d+)$', text, re.M)
+        inf = re.search(r'^http_request_duration_seconds_bucket\{view="home",method="GET",le="\+Inf"\} (\d+)$', text, re.M)
+        self.assertEqual(count.group(1), inf.group(1))
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret', REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(response.status_code, 200)
+
+    def test_local_only_without_token(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='::1').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.5').status_code, 403)
+
+    async def test_chat_metrics(self):
+        open_before = await sync_to_async(self.value)('chat_connections_open')
+        received_before = await sync_to_async(self.value)('chat_messages_received_total')
+
+        communicator = await self.connect()
+        await communicator.receive_json_from()
+        self.assertEqual(await sync_to_async(self.value)('chat_connections_open'), open_before + 1)
+
+        await communicator.send_json_to({'message': 'Привет'})
+        await communicator.receive_json_from()
+        self.assertEqual(await sync_to_async(self.value)('chat_messages_received_total'), received_before + 1)
+        self.assertTrue(await sync_to_async(self.value)('group_send_duration_seconds', 'chat'))
+        self.assertTrue(await sync_to_async(self.value)('consumer_db_duration_seconds', 'save_message'))
+
+        await communicator.disconnect()
+        self.assertEqual(await sync_to_async(self.value)('chat_connections_open'), open_before)
+
+    def test_processes_are_merged(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        local = collect()
+        processes = {
+            # Живой процесс и завершившийся (такого pid не бывает)
+            os.getppid(): 5,
+            2 ** 30: 7,
+        }
+        for pid, value in processes.items():
+            Path(directory, f'metrics-{pid}.json').write_text(json.dumps({'pid': pid, 'metrics': {
+                'chat_connects_total': [[[], value]],
+                'chat_connections_open': [[[], value]],
+            }}))
+
+        merged = collect(directory)
+        self.assertEqual(merged['chat_connects_total'][()], local['chat_connects_total'].get((), 0) + 12)
+        # Gauge завершившегося процесса не учитывается
+        self.assertEqual(merged['chat_connections_open'][()], local['chat_connections_open'].get((), 0) + 5)
+
+
+class AsyncViewsTests(TransactionTestCase):
+    """Асинхронные представления отдают то же, что и обычные"""
+
+    # Запросы gather_queries идут из потоков пула отдельными соединениями
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='secret')
+        self.project = Project.objects.create(name='Project', slug='project')
+        self.project.create_default_columns()
+        self.task = Task.objects.create(
+            project=self.project, column=self.project.columns.first(), title='Task', created_by=self.user
+        )
+
+    def get(self, view, url, **headers):
+        request = RequestFactory().get(url, **headers)
+        request.user = self.user
+        request.resolver_match = resolve(request.path)
+        if asyncio.iscoroutinefunction(view):
+            return async_to_sync(view)(request, **request.resolver_match.kwargs)
+        return view(request, **request.resolver_match.kwargs)
+
+    def assertSameResponse(self, name, url, **headers):
+        expected = self.get(getattr(views, name), url, **headers)
+        response = self.get(getattr(async_views, name), url, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, expected.content)
+        for header in ('ETag', 'Cache-Control', 'Vary'):
+            self.assertEqual(response.get(header), expected.get(header))
+        return response
+
+    def test_board(self):
+        url = reverse('project_board', args=['project'])
+        response = self.assertSameResponse('project_board', url, HTTP_HX_REQUEST='true')
+        self.assertContains(response, 'Task')
+
+        full = self.get(async_views.project_board, url)
+        self.assertContains(full, 'board-project-count')
+
+        not_modified = self.get(async_views.project_board, url, HTTP_IF_NONE_MATCH=full['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], full['ETag'])
+
+    def test_dashboard(self):
+        response = self.assertSameResponse('dashboard', reverse('dashboard'))
+        not_modified = self.get(async_views.dashboard, reverse('dashboard'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_partials(self):
+        column = self.project.columns.first()
+        self.assertSameResponse('column_tasks', reverse('column_tasks', args=[column.id]))
+        self.assertSameResponse('project_cards', reverse('project_cards', args=['project']) + f'?task={self.task.id}')
+        self.assertSameResponse('task_chat', reverse('task_chat', args=[self.task.id]))
+        with self.assertRaises(Http404):
+            self.get(async_views.task_detail, reverse('task_detail', args=[self.task.id + 1]))
+
+    def test_login_required(self):
+        self.user = AnonymousUser()
+        response = self.get(async_views.dashboard, reverse('dashboard'))
+        self.assertEqual(response.status_code, 302)
+
+
+class SQLiteProfileStressTests(SimpleTestCase):
+    """
+    Конкурентные транзакции "прочитать, затем записать" из нескольких потоков.
+
+    Со стандартным профилем SQLite такие транзакции падают с "database is
+    locked": отложенный BEGIN берет блокировку записи только при первой
+    записи, и переход от чтения к записи не ждет busy timeout. Профиль
+    production (BEGIN IMMEDIATE, WAL, timeout) выстраивает их в очередь.
+
+    Сколько транзакций упадет под общей нагрузкой, зависит от скорости
+    машины, поэтому профили сравниваются на двух транзакциях с заданным
+    порядком шагов, а нагрузка проверяет только отсутствие ошибок.
+    """
+    THREADS = 8
+    TRANSACTIONS = 15
+    PROFILES = {
+        'default': ('django.db.backends.sqlite3', {}),
+        'production': ('config.sqlite', {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': 'PRAGMA journal_mode = WAL; PRAGMA synchronous = NORMAL',
+        }),
+    }
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def count_lock_errors(self, profile, work, threads):
+        """Запускает work(index, errors) в потоках на новой БД профиля"""
+        engine, options = self.PROFILES[profile]
+        settings_dict = dict(
+            connections['default'].settings_dict,
+            ENGINE=engine,
+            NAME=str(Path(self.tmpdir.name) / f'{profile}-{work.__name__}.sqlite3'),
+            OPTIONS=options,
+        )
+        backend = load_backend(engine)
+
+        setup = backend.DatabaseWrapper(settings_dict, 'stress')
+        with setup.cursor() as cursor:
+            cursor.execute('CREATE TABLE stress (id INTEGER PRIMARY KEY, value INTEGER)')
+        setup.close()
+
+        errors = []
+
+        def run(index):
+            connections['stress'] = backend.DatabaseWrapper(settings_dict, 'stress')
+            try:
+                work(index, errors)
+            finally:
+                connections['stress'].close()
+
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len(errors)
+
+    def read_then_write(self, errors, after_read=None):
+        try:
+            with transaction.atomic(using='stress'):
+                with connections['stress'].cursor() as cursor:
+                    cursor.execute('SELECT COUNT(*) FROM stress')
+                    if after_read is not None:
+                        after_read()
+                    cursor.execute('INSERT INTO stress (value) VALUES (1)')
+        except OperationalError:
+            errors.append(1)
+
+    def test_init_command(self):
+        settings_dict = dict(
+            connections['default'].settings_dict,
+            ENGINE='config.sqlite',
+            NAME=str(Path(self.tmpdir.name) / 'init.sqlite3'),
+            OPTIONS={'init_command': 'PRAGMA journal_mode = WAL; PRAGMA cache_size = -1000;'},
+        )
+        wrapper = load_backend('config.sqlite').DatabaseWrapper(settings_dict, 'init')
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA journal_mode').fetchone(), ('wal',))
+            self.assertEqual(cursor.execute('PRAGMA cache_size').fetchone(), (-1000,))
+
+    def test_read_then_write_race(self):
+        # Первая транзакция пишет, только когда вторая тоже успела прочитать.
+        # Со стандартным профилем обе держат блокировку чтения, и одна из них
+        # падает сразу. С BEGIN IMMEDIATE вторая ждет в BEGIN, пока первая
+        # не закончит, поэтому первая перестает ее ждать по таймауту
+        def make_race():
+            first_read, second_read = threading.Event(), threading.Event()
+
+            def race(index, errors):
+                if index == 0:
+                    self.read_then_write(errors, after_read=lambda: (first_read.set(), second_read.wait(1)))
+                else:
+                    first_read.wait()
+                    self.read_then_write(errors, after_read=second_read.set)
+            return race
+
+        default_errors = self.count_lock_errors('default', make_race(), threads=2)
+        production_errors = self.count_lock_errors('production', make_race(), threads=2)
+
+        self.assertEqual((default_errors, production_errors), (1, 0))
+
+    def test_production_profile_has_no_lock_errors(self):
+        start = threading.Barrier(self.THREADS)
+
+        def stress(index, errors):
+            start.wait()
+            for _ in range(self.TRANSACTIONS):
+                self.read_then_write(errors, after_read=lambda: time.sleep(0.002))
+
+        self.assertEqual(self.count_lock_errors('production', stress, threads=self.THREADS), 0)
+
+
+@override_settings(READ_REPLICAS=['replica1', 'replica2'], REPLICA_PIN_SECONDS=5)
+class ReplicaRouterTests(SimpleTestCase):
+    """Чтение core идет на реплики, после записи - в основную БД"""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def in_new_context(self, func):
+        # Пустой контекст: без закрепления от записей других тестов
+        return contextvars.Context().run(func)
+
+    def test_reads_go_to_replicas(self):
+        self.assertIn(self.in_new_context(lambda: self.router.db_for_read(Task)), ['replica1', 'replica2'])
+        self.assertIsNone(self.router.db_for_read(User))
+        self.assertFalse(self.router.allow_migrate('replica1', 'core'))
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
+
+    def test_write_pins_reads_to_primary(self):
+        def write_then_read():
+            self.assertEqual(self.router.db_for_write(Task), 'default')
+            return self.router.db_for_read(Task)
+
+        self.assertEqual(self.in_new_context(write_then_read), 'default')
+
+    def test_transaction_reads_primary(self):
+        with mock.patch.object(connections['default'], 'in_atomic_block', True):
+            self.assertEqual(self.in_new_context(lambda: self.router.db_for_read(Task)), 'default')
+
+    @override_settings(READ_REPLICAS=[])
+    def test_no_replicas(self):
+        self.assertIsNone(self.router.db_for_read(Task))
+
+    def test_session_stickiness(self):
+        middleware = ReplicaPinMiddleware(lambda request: (pin_to_primary(), HttpResponse())[1])
+        request = RequestFactory().get('/')
+        request.session = {}
+        self.in_new_context(lambda: middleware(request))
+        self.assertIn('_db_pinned_until', request.session)
+
+        # Следующий запрос той же сессии читает из основной БД
+        reads = []
+        middleware = ReplicaPinMiddleware(lambda r: (reads.append(self.router.db_for_read(Task)), HttpResponse())[1])
+        next_request = RequestFactory().get('/')
+        next_request.session = dict(request.session)
+        self.in_new_context(lambda: middleware(next_request))
+
+        expired = RequestFactory().get('/')
+        expired.session = {'_db_pinned_until': 0}
+        self.in_new_context(lambda: middleware(expired))
+
+        self.assertEqual(reads[0], 'default')
+        self.assertIn(reads[1], ['replica1', 'replica2'])
+
+
+class QueryPlanTests(ChatTestMixin, TestCase):
+    """
+    Горячие запросы представлений и чата идут по индексам.
+
+    Каждый запрос прогоняется через EXPLAIN QUERY PLAN: полный просмотр
+    таблиц задач, сообщений и чеклистов (SCAN без индекса) - ошибка.
+    План SQLite зависит от схемы, а не от объема данных, поэтому хватает
+    нескольких строк.
+    """
+
+    HOT_TABLES = {'core_task', 'core_message', 'core_checklistitem', 'core_task_labels'}
+
+    def setUp(self):
+        self.create_task()
+        self.client.force_login(self.user)
+        self.project = self.task.project
+        self.column = self.task.column
+        self.label = Label.objects.create(project=self.project, name='Bug', color='red')
+        self.task.labels.add(self.label)
+        self.task.checklist_items.create(text='Item', rank='a')
+        for i in range(3):
+            Task.objects.create(project=self.project, column=self.column, title=f'Task {i}', created_by=self.user)
+            Message.objects.create(task=self.task, user=self.user, text=f'm{i}')
+
+    def capture(self):
+        queries = []
+
+        def wrapper(execute, sql, params, many, context):
+            if not many:
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        return queries, connection.execute_wrapper(wrapper)
+
+    def plan(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[3] for row in cursor.fetchall()]
+
+    def full_scans(self, queries):
+        """(sql, строка плана) для полных просмотров горячих таблиц"""
+        scans = []
+        for sql, params in queries:
+            if not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'WITH')):
+                continue
+            for line in self.plan(sql, params):
+                match = re.match(r'SCAN (?:TABLE )?(\w+)', line)
+                if match and match.group(1) in self.HOT_TABLES and 'INDEX' not in line:
+                    scans.append((sql, line))
+        return scans
+
+    def assertUsesIndexes(self, queries):
+        self.assertTrue(queries)
+        self.assertEqual(self.full_scans(queries), [])
+
+    def test_detects_full_scan(self):
+        queries, wrapper = self.capture()
+        with wrapper:
+            list(Task.objects.filter(title='Task'))
+        self.assertEqual(len(self.full_scans(queries)), 1)
+
+    def test_views(self):
+        board = reverse('project_board', args=[self.project.slug])
+        first = self.column.tasks.order_by('rank', 'id').first()
+        requests = [
+            (reverse('home'), {}),
+            (reverse('dashboard'), {}),
+            (board, {}),
+            (board, {'due': 'overdue'}),
+            (board, {'due': 'week', 'priority': 'high'}),
+            (board, {'my': '1', 'label': self.label.id}),
+            (board, {'search': 'Task'}),
+            (reverse('column_tasks', args=[self.column.id]), {'after': f'{first.rank}.{first.id}'}),
+            (reverse('project_cards', args=[self.project.slug]), {'task': self.task.id}),
+            (reverse('task_detail', args=[self.task.id]), {}),
+            (reverse('task_chat', args=[self.task.id]), {}),
+        ]
+        for url, params in requests:
+            with self.subTest(url=url, params=params):
+                cache.clear()
+                queries, wrapper = self.capture()
+                with wrapper:
+                    response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertUsesIndexes(queries)
+
+    def test_ordered_pages_do_not_sort(self):
+        # Страница колонки и история чата читаются прямо в порядке индекса
+        first = self.column.tasks.order_by('rank', 'id').first()
+        column_page = Task.objects.filter(column=self.column).order_by('rank', 'id')
+        column_page = after_cursor(column_page, (first.rank, first.id))[:51]
+        history = Message.objects.filter(task=self.task).order_by('-created_at', '-id')[:51]
+        for queryset in [column_page, history]:
+            sql, params = queryset.query.sql_with_params()
+            plan = self.plan(sql, params)
+            self.assertFalse([line for line in plan if 'TEMP B-TREE' in line], plan)
+
+    def test_chat(self):
+        async def chat():
+            communicator = await self.connect()
+            history = await communicator.receive_json_from()
+            await communicator.send_json_to({'type': 'load_older', 'cursor': history['next_cursor']})
+            await communicator.receive_json_from()
+            await communicator.send_json_to({'message': 'Привет'})
+            await communicator.receive_json_from()
+            await communicator.disconnect()
+
+        queries, wrapper = self.capture()
+        with override_settings(CHAT_PAGE_SIZE=2), wrapper:
+            async_to_sync(chat)()
+        self.assertUsesIndexes(queries)
@@ -0,0 +1,324 @@
+"""
+Выгрузка и загрузка проекта целиком.
+
+Формат выгрузки - NDJSON: первая строка - сам проект, дальше по строке на
+колонку, метку, задачу, привязку метки к задаче, пункт чеклиста и сообщение
+(в таком порядке: родительские записи идут раньше ссылающихся на них).
+Записи хранят свои исходные id, при загрузке они заменяются на новые.
+Любую таблицу можно выгрузить и отдельно в CSV - для таблиц и отчетов,
+загружается только NDJSON.
+
+Выгрузка читает БД через .iterator() и отдается кусками по CHUNK_SIZE
+записей, загрузка пишет через bulk_create пачками по BATCH_SIZE - память не
+растет с размером проекта.
+"""
+import csv
+import datetime
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .forms import ProjectForm
+from .models import ChecklistItem, Column, Label, Message, Task
+
+EXPORT_FORMAT = 1
+
+# Записей в одном куске выгрузки и в одной выборке .iterator()
+CHUNK_SIZE = 2000
+
+# Записей в одном bulk_create при загрузке
+BATCH_SIZE = 2000
+
+# Таблицы выгрузки в порядке загрузки:
+# (таблица, тип записи, [(поле записи, поле выборки), ...])
+TABLES = [
+    ("columns", "column", [
+        ("id", "id"), ("name", "name"), ("color", "color"), ("rank", "rank"),
+    ]),
+    ("labels", "label", [
+        ("id", "id"), ("name", "name"), ("color", "color"),
+    ]),
+    ("tasks", "task", [
+        ("id", "id"), ("column", "column_id"), ("title", "title"), ("description", "description"),
+        ("priority", "priority"), ("due_date", "due_date"), ("rank", "rank"),
+        ("created_by", "created_by__username"), ("created_at", "created_at"), ("updated_at", "updated_at"),
+    ]),
+    ("task_labels", "task_label", [
+        ("task", "task_id"), ("label", "label_id"),
+    ]),
+    ("checklist_items", "checklist_item", [
+        ("task", "task_id"), ("text", "text"), ("is_completed", "is_completed"), ("rank", "rank"),
+    ]),
+    ("messages", "message", [
+        ("task", "task_id"), ("user", "user__username"), ("text", "text"), ("created_at", "created_at"),
+    ]),
+]
+
+TABLE_NAMES = [table for table, _, _ in TABLES]
+
+
+def _queryset(table, project):
+    querysets = {
+        "columns": lambda: Column.objects.filter(project=project),
+        "labels": lambda: Label.objects.filter(project=project),
+        "tasks": lambda: Task.objects.filter(project=project),
+        "task_labels": lambda: Task.labels.through.objects.filter(task__project=project),
+        "checklist_items": lambda: ChecklistItem.objects.filter(task__project=project),
+        "messages": lambda: Message.objects.filter(task__project=project),
+    }
+    # Без ORDER BY: загрузке порядок внутри таблицы не важен, а сортировка
+    # сотен тысяч строк - лишняя работа для БД
+    return querysets[table]().order_by()
+
+
+def _rows(table, project, fields):
+    lookups = [lookup for _, lookup in fields]
+    return _queryset(table, project).values_list(*lookups).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _chunks(lines):
+    """Склеивает строки в куски по CHUNK_SIZE"""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def _json_default(value):
+    # Даты целиком: DjangoJSONEncoder обрезает время до миллисекунд
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def _dumps(record):
+    return json.dumps(record, default=_json_default, ensure_ascii=False) + "\n"
+
+
+def export_ndjson(project):
+    """Выгрузка проекта в NDJSON, кусками текста"""
+    def lines():
+        yield _dumps({
+            "type": "project",
+            "format": EXPORT_FORMAT,
+            "name": project.name,
+            "icon": project.icon,
+            "color": project.color,
+        })
+        for table, record_type, fields in TABLES:
+            keys = [key for key, _ in fields]
+            for row in _rows(table, project, fields):
+                yield _dumps({"type": record_type, **dict(zip(keys, row))})
+
+    return _chunks(lines())
+
+
+class _Echo:
+    """Файл для csv.writer, который возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(project, table):
+    """Выгрузка одной таблицы проекта (из TABLE_NAMES) в CSV, кусками текста"""
+    fields = next(fields for name, _, fields in TABLES if name == table)
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow([key for key, _ in fields])
+        for row in _rows(table, project, fields):
+            yield writer.writerow(row)
+
+    return _chunks(lines())
+
+
+def import_ndjson(lines, user, match_authors=False):
+    """
+    Создает новый проект из NDJSON-выгрузки.
+
+    lines - строки выгрузки (str или bytes, например загруженный файл).
+    Автор всех задач и сообщений - user. С match_authors (только команда
+    import_project, ее запускает администратор) авторы ищутся по имени
+    пользователя, ненайденные заменяются на user: иначе любой пользователь
+    мог бы загрузить файл с задачами и сообщениями от чужого имени.
+    Все выполняется в одной транзакции: при ошибке в данных (ValueError с
+    номером строки) проект не создается.
+    Возвращает (проект, {тип записи: сколько создано}).
+    """
+    lines = iter(lines)
+    header = _parse(next(lines, ""), 1)
+    if header.get("type") != "project" or header.get("format") != EXPORT_FORMAT:
+        raise ValueError("Это не выгрузка проекта или она в неизвестном формате")
+
+    with transaction.atomic():
+        form = ProjectForm({
+            "name": header.get("name") or "Импорт",
+            "icon": header.get("icon") or "folder",
+            "color": header.get("color") or "purple",
+        })
+        if not form.is_valid():
+            raise ValueError("Строка 1: некорректные данные проекта")
+        project = form.save(commit=False)
+        project.save()
+
+        importer = _Importer(project, user, match_authors)
+        for number, line in enumerate(lines, start=2):
+            if line.strip():
+                importer.add(_parse(line, number), number)
+        importer.flush()
+        Task.objects.filter(project=project).rebuild_counters()
+    return project, importer.created
+
+
+def _parse(line, number):
+    try:
+        record = json.loads(line)
+    except ValueError:
+        raise ValueError(f"Строка {number}: некорректный JSON")
+    if not isinstance(record, dict):
+        raise ValueError(f"Строка {number}: ожидается объект")
+    return record
+
+
+class _Importer:
+    """Копит записи одного типа и пишет их пачками, запоминая новые id"""
+
+    def __init__(self, project, user, match_authors):
+        self.project = project
+        self.user = user
+        self.match_authors = match_authors
+        # исходный id -> новый
+        self.ids = {"column": {}, "label": {}, "task": {}}
+        self.user_ids = {}
+        self.created = {record_type: 0 for _, record_type, _ in TABLES}
+        self.pending_type = None
+        # [(исходный id, объект, запись)]
+        self.pending = []
+
+    def add(self, record, number):
+        record_type = record.get("type")
+        known = isinstance(record_type, str) and record_type in self.created
+        build = getattr(self, f"build_{record_type}") if known else None
+        if build is None:
+            raise ValueError(f"Строка {number}: неизвестный тип записи {record_type!r}")
+        # Ссылки идут только на записи предыдущих типов: их надо записать,
+        # чтобы узнать новые id
+        if record_type != self.pending_type:
+            self.flush()
+            self.pending_type = record_type
+        try:
+            obj = build(record)
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError(f"Строка {number}: некорректная запись {record_type} ({error})")
+        self.pending.append((record.get("id"), obj, record))
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        record_type = self.pending_type
+        objs = [obj for _, obj, _ in self.pending]
+        type(objs[0]).objects.bulk_create(objs)
+        if record_type in self.ids:
+            for old_id, obj, _ in self.pending:
+                self.ids[record_type][old_id] = obj.id
+        if record_type == "task":
+            self.restore_task_dates()
+        self.created[record_type] += len(objs)
+        self.pending = []
+
+    def restore_task_dates(self):
+        # bulk_create проставляет auto_now_add/auto_now текущим временем,
+        # исходные даты задач (график дашборда по дням) возвращаются UPDATE
+        operations = connection.ops
+        params = [
+            (
+                operations.adapt_datetimefield_value(obj.created_at),
+                operations.adapt_datetimefield_value(obj.updated_at),
+                obj.id,
+            )
+            for _, obj, record in self.pending
+            if self.restore_dates(obj, record)
+        ]
+        if params:
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"UPDATE {Task._meta.db_table} SET created_at = %s, updated_at = %s WHERE id = %s", params
+                )
+
+    @staticmethod
+    def restore_dates(task, record):
+        created_at = parse_datetime(record.get("created_at") or "")
+        updated_at = parse_datetime(record.get("updated_at") or "")
+        if created_at is None:
+            return False
+        task.created_at = created_at
+        task.updated_at = updated_at or created_at
+        return True
+
+    def reference(self, record_type, old_id):
+        try:
+            return self.ids[record_type][old_id]
+        except KeyError:
+            raise ValueError(f"ссылка на отсутствующую запись {record_type} {old_id}")
+
+    def user_id(self, username):
+        if not self.match_authors:
+            return self.user.id
+        if username not in self.user_ids:
+            self.user_ids[username] = get_user_model().objects.filter(
+                username=username
+            ).values_list("id", flat=True).first() or self.user.id
+        return self.user_ids[username]
+
+    def build_column(self, record):
+        return Column(project=self.project, name=record["name"], color=record["color"], rank=record["rank"])
+
+    def build_label(self, record):
+        return Label(project=self.project, name=record["name"], color=record["color"])
+
+    def build_task(self, record):
+        column = record.get("column")
+        return Task(
+            project=self.project,
+            column_id=self.reference("column", column) if column is not None else None,
+            title=record["title"],
+            description=record.get("description", ""),
+            priority=record.get("priority") or Task.Priority.MEDIUM,
+            due_date=parse_date(record.get("due_date") or ""),
+            rank=record.get("rank", ""),
+            created_by_id=self.user_id(record.get("created_by")),
+        )
+
+    def build_task_label(self, record):
+        return Task.labels.through(
+            task_id=self.reference("task", record["task"]),
+            label_id=self.reference("label", record["label"]),
+        )
+
+    def build_checklist_item(self, record):
+        return ChecklistItem(
+            task_id=self.reference("task", record["task"]),
+            text=record["text"],
+            is_completed=bool(record.get("is_completed")),
+            rank=record.get("rank", ""),
+        )
+
+    def build_message(self, record):
+        message = Message(
+            task_id=self.reference("task", record["task"]),
+            user_id=self.user_id(record.get("user")),
+            text=record["text"],
+        )
+        created_at = parse_datetime(record.get("created_at") or "")
+        if created_at is not None:
+            message.created_at = created_at
+        return message
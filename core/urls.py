@@ -1,29 +1,40 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
+
+# Страницы чтения под ASGI можно обслуживать асинхронными представлениями
+read_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path("", views.home, name="home"),
-    path("dashboard/", views.dashboard, name="dashboard"),
+    path("", read_views.home, name="home"),
+    path("dashboard/", read_views.dashboard, name="dashboard"),
     path("login/", views.login_view, name="login"),
     path("logout/", views.logout_view, name="logout"),
 
     # Projects
     path("project/new/", views.project_create, name="project_create"),
-    path("p/<slug:slug>/", views.project_board, name="project_board"),
+    path("project/import/", views.project_import, name="project_import"),
+    path("p/<slug:slug>/", read_views.project_board, name="project_board"),
+    path("p/<slug:slug>/export/", views.project_export, name="project_export"),
+    path("p/<slug:slug>/archive/", views.project_archive, name="project_archive"),
 
     # Columns
     path("p/<slug:slug>/column/new/", views.column_create, name="column_create"),
     path("column/<int:column_id>/edit/", views.column_edit, name="column_edit"),
     path("column/<int:column_id>/delete/", views.column_delete, name="column_delete"),
+    path("column/<int:column_id>/tasks/", read_views.column_tasks, name="column_tasks"),
 
     # Tasks
     path("p/<slug:slug>/task/new/", views.task_create, name="task_create"),
-    path("task/<int:task_id>/", views.task_detail, name="task_detail"),
+    path("p/<slug:slug>/tasks/bulk/", views.task_bulk, name="task_bulk"),
+    path("p/<slug:slug>/cards/", read_views.project_cards, name="project_cards"),
+    path("task/<int:task_id>/", read_views.task_detail, name="task_detail"),
     path("task/<int:task_id>/edit/", views.task_edit, name="task_edit"),
     path("task/<int:task_id>/delete/", views.task_delete, name="task_delete"),
     path("task/<int:task_id>/move/", views.task_move, name="task_move"),
-    path("task/<int:task_id>/chat/", views.task_chat, name="task_chat"),
+    path("task/<int:task_id>/chat/", read_views.task_chat, name="task_chat"),
+    path("task/<int:task_id>/restore/", views.task_restore, name="task_restore"),
 
     # Checklist
     path("task/<int:task_id>/checklist/add/", views.checklist_add, name="checklist_add"),
@@ -1,15 +1,30 @@
-from datetime import timedelta
+import json
 
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Count
-from django.http import HttpResponse
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import F, Q
+from django.http import HttpResponse, HttpResponseBadRequest, QueryDict, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.utils import timezone
-from django.views.decorators.http import require_POST, require_http_methods
-
+from django.utils.safestring import mark_safe
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST, require_http_methods
+from django.views.decorators.vary import vary_on_headers
+
+from .archive import restore_task
+from .async_utils import streaming_content
+from .board_cache import board_cache_key, board_etag, bump_board_version, get_board_html, projects_etag
+from .board_events import MAX_TASK_DELTAS, publish_board, publish_tasks
+from .filters import BoardFilter, after_cursor, paginate_tasks, parse_cursor
 from .forms import TaskForm, ProjectForm, LabelForm, ColumnForm
-from .models import Project, Task, Label, ChecklistItem, Column, Message
+from .models import ArchivedTask, Project, Task, Label, ChecklistItem, Column
+from .ranking import needs_rebalance, next_rank, rank_between, ranks_between, rebalance, rebalance_later
+from .stats import dashboard_stats
+from .transfer import TABLE_NAMES, export_csv, export_ndjson, import_ndjson
 
 
 def login_view(request):
@@ -32,70 +47,22 @@ def logout_view(request):
     return redirect("login")
 
 
+# Условные GET: если данные не менялись, браузер получает 304 без запросов
+# к задачам и рендера шаблона. no-cache - браузер всегда переспрашивает сервер.
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=projects_etag)
 def home(request):
     projects = Project.objects.order_by("-created_at")
     return render(request, "core/home.html", {"projects": projects})
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=projects_etag)
 def dashboard(request):
     """Dashboard со статистикой"""
-    today = timezone.now().date()
-    week_ago = today - timedelta(days=7)
-
-    # Общая статистика
-    total_tasks = Task.objects.count()
-    my_tasks = Task.objects.filter(created_by=request.user).count()
-    overdue_tasks = Task.objects.filter(due_date__lt=today).count()
-
-    # Задачи по приоритетам
-    tasks_by_priority = Task.objects.values('priority').annotate(
-        count=Count('id')
-    ).order_by('priority')
-
-    priority_data = {item['priority']: item['count'] for item in tasks_by_priority}
-
-    # Проекты со статистикой
-    projects = Project.objects.annotate(
-        task_count=Count('tasks'),
-    ).order_by('-created_at')
-
-    # Добавляем статистику по колонкам для каждого проекта
-    for project in projects:
-        project.columns_stats = []
-        for column in project.columns.all():
-            project.columns_stats.append({
-                'name': column.name,
-                'color': column.color,
-                'count': column.tasks.count()
-            })
-
-    # Последние сообщения в чатах
-    recent_messages = Message.objects.select_related(
-        'user', 'task', 'task__project'
-    ).order_by('-created_at')[:10]
-
-    # Статистика по дням (последние 7 дней) - созданные задачи
-    tasks_by_day = []
-    for i in range(6, -1, -1):
-        day = today - timedelta(days=i)
-        count = Task.objects.filter(created_at__date=day).count()
-        tasks_by_day.append({
-            'date': day.strftime('%d.%m'),
-            'count': count
-        })
-
-    context = {
-        'total_tasks': total_tasks,
-        'my_tasks': my_tasks,
-        'overdue_tasks': overdue_tasks,
-        'priority_data': priority_data,
-        'projects': projects,
-        'recent_messages': recent_messages,
-        'tasks_by_day': tasks_by_day,
-    }
-
+    context = dashboard_stats(request.user)
     return render(request, "core/dashboard.html", context)
 
 
@@ -115,70 +82,184 @@ def project_create(request):
 
 
 @login_required
-def project_board(request, slug):
+def project_export(request, slug):
+    """
+    Выгрузка проекта потоком: целиком в NDJSON (для загрузки в project_import)
+    или одна таблица в CSV (?format=csv&table=tasks).
+    """
     project = get_object_or_404(Project, slug=slug)
-    columns = project.columns.prefetch_related('tasks__created_by', 'tasks__labels', 'tasks__checklist_items', 'tasks__messages')
+    if request.GET.get("format") == "csv":
+        table = request.GET.get("table", "tasks")
+        if table not in TABLE_NAMES:
+            return HttpResponseBadRequest(f"Неизвестная таблица, доступны: {', '.join(TABLE_NAMES)}")
+        chunks = export_csv(project, table)
+        content_type, filename = "text/csv; charset=utf-8", f"{project.slug}-{table}.csv"
+    else:
+        chunks = export_ndjson(project)
+        content_type, filename = "application/x-ndjson; charset=utf-8", f"{project.slug}.ndjson"
 
-    # Filters
-    search = request.GET.get("search", "")
-    priority = request.GET.get("priority", "")
-    label_filter = request.GET.get("label", "")
-    due_filter = request.GET.get("due", "")  # overdue, today, week, none
-    my_tasks = request.GET.get("my", "")  # "1" = только мои задачи
+    response = StreamingHttpResponse(streaming_content(request, chunks), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
 
-    # Apply filters to each column's tasks
-    today = timezone.now().date()
-    week_end = today + timedelta(days=7)
 
-    for column in columns:
-        tasks = list(column.tasks.all())
+@login_required
+def project_import(request):
+    """Новый проект из NDJSON-выгрузки project_export"""
+    error = None
+    if request.method == "POST":
+        upload = request.FILES.get("file")
+        if upload is None:
+            error = "Выберите файл выгрузки"
+        elif upload.size > settings.IMPORT_MAX_UPLOAD_SIZE:
+            error = "Файл слишком большой: такие выгрузки загружаются командой import_project"
+        else:
+            try:
+                project, _ = import_ndjson(upload, request.user)
+            except ValueError as exc:
+                error = str(exc)
+            else:
+                response = HttpResponse()
+                response["HX-Redirect"] = f"/p/{project.slug}/"
+                return response
+
+    return render(request, "core/partials/project_import.html", {
+        "error": error,
+        "max_size_mb": settings.IMPORT_MAX_UPLOAD_SIZE // (1024 * 1024),
+    })
 
-        # Search filter
-        if search:
-            tasks = [t for t in tasks if search.lower() in t.title.lower()]
 
-        # Priority filter
-        if priority:
-            tasks = [t for t in tasks if t.priority == priority]
+@login_required
+@vary_on_headers("HX-Request")
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=board_etag)
+def project_board(request, slug):
+    project = get_object_or_404(Project, slug=slug)
 
-        # Label filter
-        if label_filter:
-            label_id = int(label_filter)
-            tasks = [t for t in tasks if any(lbl.id == label_id for lbl in t.labels.all())]
+    board_filter = BoardFilter(request.GET, request.user)
 
-        # My tasks filter
-        if my_tasks:
-            tasks = [t for t in tasks if t.created_by == request.user]
+    def render_columns():
+        # Фильтры применяются в БД: один отфильтрованный Prefetch на все колонки,
+        # в каждой колонке рендерится только первая страница задач
+        columns = board_filter.load_columns(project, settings.BOARD_PAGE_SIZE)
+        counts = board_filter.column_counts(project)
+        return render_board_columns(request, project, board_filter, columns, counts)
 
-        # Due date filter
-        if due_filter == "none":
-            tasks = [t for t in tasks if t.due_date is None]
-        elif due_filter == "overdue":
-            tasks = [t for t in tasks if t.due_date and t.due_date < today]
-        elif due_filter == "today":
-            tasks = [t for t in tasks if t.due_date == today]
-        elif due_filter == "week":
-            tasks = [t for t in tasks if t.due_date and today <= t.due_date <= week_end]
+    # Колонки берутся из кэша, пока версия доски не изменилась
+    cache_key = board_cache_key(project, request.user, board_filter)
+    board_html = mark_safe(get_board_html(cache_key, render_columns))
 
-        column.filtered_tasks = tasks
+    # For HTMX partial updates
+    if request.headers.get("HX-Request") and not request.GET.get("full"):
+        return HttpResponse(board_html)
 
     context = {
         "project": project,
-        "columns": columns,
-        "search": search,
-        "priority_filter": priority,
-        "label_filter": label_filter,
-        "due_filter": due_filter,
-        "my_tasks": my_tasks,
+        "board_html": board_html,
+        "columns": project.columns.all(),
+        "task_count": project.tasks.count(),
         "priorities": Task.Priority.choices,
         "labels": project.labels.all(),
+        **board_filter.as_context(),
     }
+    return render(request, "core/board.html", context)
 
-    # For HTMX partial updates
-    if request.headers.get("HX-Request") and not request.GET.get("full"):
-        return render(request, "core/partials/board_columns.html", context)
 
-    return render(request, "core/board.html", context)
+def render_board_columns(request, project, board_filter, columns, counts):
+    for column in columns:
+        column.task_count = counts.get(column.id, 0)
+    return render_to_string("core/partials/board_columns.html", {
+        "project": project,
+        "columns": columns,
+        "filter_query": board_filter.as_query(),
+    }, request=request)
+
+
+@login_required
+def project_archive(request, slug):
+    """Архив проекта: задачи, убранные с доски командой archive_tasks"""
+    project = get_object_or_404(Project, slug=slug)
+    tasks = project.archived_tasks.order_by("-archived_at", "-id")
+    page = Paginator(tasks, settings.BOARD_PAGE_SIZE).get_page(request.GET.get("page"))
+    return render(request, "core/archive.html", {
+        "project": project,
+        "page": page,
+    })
+
+
+@login_required
+@require_POST
+def task_restore(request, task_id):
+    """Возвращает задачу из архива на доску"""
+    archived = get_object_or_404(ArchivedTask, id=task_id)
+    restore_task(archived)
+    # Строка архива убирается на месте (hx-swap="outerHTML")
+    return HttpResponse("")
+
+
+@login_required
+def column_tasks(request, column_id):
+    """Следующая страница задач колонки (догрузка при прокрутке)"""
+    column = get_object_or_404(Column, id=column_id)
+    board_filter = BoardFilter(request.GET, request.user)
+    page_size = settings.BOARD_PAGE_SIZE
+
+    tasks = board_filter.cards_queryset().filter(column=column)
+    cursor = parse_cursor(request.GET.get("after", ""))
+    if cursor:
+        tasks = after_cursor(tasks, cursor)
+    tasks, next_cursor = paginate_tasks(tasks[:page_size + 1], page_size)
+
+    return render(request, "core/partials/column_tasks.html", {
+        "column": column,
+        "tasks": tasks,
+        "next_cursor": next_cursor,
+        "filter_query": board_filter.as_query(),
+    })
+
+
+@login_required
+def project_cards(request, slug):
+    """
+    Карточки отдельных задач доски с учетом фильтров клиента.
+
+    Клиент запрашивает их по событию доски (BoardConsumer): в ответе только
+    те из задач task=..., что проходят фильтры, и актуальные счетчики
+    колонок в заголовке X-Column-Counts.
+    """
+    project = get_object_or_404(Project, slug=slug)
+    board_filter = BoardFilter(request.GET, request.user)
+    task_ids = [int(i) for i in request.GET.getlist("task") if i.isdigit()][:MAX_TASK_DELTAS]
+
+    tasks = board_filter.cards_queryset().filter(project=project, id__in=task_ids) if task_ids else []
+    response = render(request, "core/partials/column_tasks.html", {"tasks": tasks})
+    response["X-Column-Counts"] = json.dumps(board_filter.column_counts(project))
+    return response
+
+
+def render_card_update(request, project, task_id, created=False):
+    """
+    Out-of-band фрагменты для одной изменившейся задачи вместо перерисовки доски.
+
+    Карточка рендерится с фильтрами доски клиента (заголовок X-Board-Filters):
+    если задача удалена или больше не проходит фильтры, карточка убирается.
+    Счетчики колонок - одним сгруппированным запросом.
+    """
+    board_filter = BoardFilter(QueryDict(request.headers.get("X-Board-Filters", "")), request.user)
+    task = board_filter.cards_queryset().filter(project=project, id=task_id).first()
+    counts = board_filter.column_counts(project)
+    return render_to_string("core/partials/card_update.html", {
+        "task": task,
+        "task_id": task_id,
+        "created": created,
+        "counts": [(column_id, counts.get(column_id, 0)) for column_id in project.columns.values_list("id", flat=True)],
+    }, request=request)
+
+
+def card_update_response(request, project, task_id, created=False):
+    response = HttpResponse(render_card_update(request, project, task_id, created))
+    response["HX-Trigger-After-Settle"] = "cardChanged"
+    return response
 
 
 @login_required
@@ -194,12 +275,11 @@ def task_create(request, slug):
             task.project = project
             task.column = column
             task.created_by = request.user
-            task.order = column.tasks.count()
+            task.rank = next_rank(column.tasks.all())
             task.save()
-
-            response = HttpResponse()
-            response["HX-Trigger"] = "taskChanged"
-            return response
+            bump_board_version(project.id)
+            publish_tasks(project.id, changed=[task])
+            return card_update_response(request, project, task.id, created=True)
 
     form = TaskForm()
     return render(request, "core/partials/task_form.html", {
@@ -217,9 +297,9 @@ def task_edit(request, task_id):
         form = TaskForm(request.POST, instance=task)
         if form.is_valid():
             form.save()
-            response = HttpResponse()
-            response["HX-Trigger"] = "taskChanged"
-            return response
+            bump_board_version(task.project_id)
+            publish_tasks(task.project_id, changed=[task])
+            return card_update_response(request, task.project, task.id)
 
     form = TaskForm(instance=task)
     return render(request, "core/partials/task_form.html", {
@@ -257,9 +337,9 @@ def task_delete(request, task_id):
         return HttpResponse("Forbidden", status=403)
 
     task.delete()
-    response = HttpResponse()
-    response["HX-Trigger"] = "taskChanged"
-    return response
+    bump_board_version(task.project_id)
+    publish_tasks(task.project_id, deleted=[task_id])
+    return card_update_response(request, task.project, task_id)
 
 
 @login_required
@@ -267,18 +347,145 @@ def task_delete(request, task_id):
 def task_move(request, task_id):
     """Перемещение задачи в другую колонку"""
     task = get_object_or_404(Task, id=task_id)
-    column_id = request.POST.get("column_id")
-    new_order = request.POST.get("order", 0)
+    column_id = request.POST.get("column_id", "")
+    after_id = request.POST.get("after_id", "")  # карточка, после которой бросили задачу
+    if not column_id:
+        return HttpResponse("OK")
+    if not column_id.isdigit() or (after_id and not after_id.isdigit()):
+        return HttpResponse("Invalid position", status=400)
+
+    column = get_object_or_404(Column, id=int(column_id), project=task.project)
+    with transaction.atomic():
+        # Новый ранг между соседями - пишется только перемещаемая задача.
+        # Следующего соседа берем из БД: в DOM могут быть не все задачи колонки.
+        # Соседи читаются в той же транзакции, что и запись, чтобы ранг не
+        # оказался посчитан от ключей, которые успела заменить перенумерация.
+        siblings = column.tasks.select_for_update().exclude(id=task.id).order_by("rank", "id")
+        try:
+            before, after = move_neighbours(siblings, after_id)
+            if before is not None and before == after:
+                # Равные ранги (старые данные): между соседями нет места,
+                # перенумеровываем колонку с сохранением порядка (rank, id)
+                rebalance(column.tasks.all())
+                before, after = move_neighbours(siblings, after_id)
+                tied = True
+            else:
+                tied = False
+            rank = rank_between(before, after)
+        except ValueError:
+            # Соседа нет в колонке или ранги некорректны - не ставим задачу
+            # молча в другое место
+            return HttpResponse("Invalid position", status=400)
 
-    if column_id:
-        column = get_object_or_404(Column, id=column_id, project=task.project)
         task.column = column
-        task.order = int(new_order)
-        task.save()
+        task.rank = rank
+        task.save(update_fields=["column", "rank", "updated_at"])
+        if needs_rebalance(rank):
+            project_id = task.project_id
+
+            def rebalanced():
+                bump_board_version(project_id)
+                publish_board(project_id)
+
+            rebalance_later(column.tasks.all(), done=rebalanced, key=("tasks", column.id))
+        bump_board_version(task.project_id)
+        if tied:
+            publish_board(task.project_id)
+        else:
+            publish_tasks(task.project_id, changed=[task])
 
     return HttpResponse("OK")
 
 
+def move_neighbours(siblings, after_id):
+    """
+    Ранги соседей, между которыми встает перемещаемая задача.
+
+    Следующий сосед - первая задача после after_id в порядке (rank, id), а
+    не первая с большим рангом: иначе при равных рангах задача встала бы
+    после всех них. Если after_id не найден среди соседей - ValueError.
+    """
+    if not after_id:
+        return None, siblings.values_list("rank", flat=True).first()
+    before = siblings.filter(id=int(after_id)).values_list("rank", flat=True).first()
+    if before is None:
+        raise ValueError(f"task {after_id} is not in the column")
+    after = siblings.filter(
+        Q(rank__gt=before) | Q(rank=before, id__gt=int(after_id))
+    ).values_list("rank", flat=True).first()
+    return before, after
+
+
+@login_required
+@require_POST
+def task_bulk(request, slug):
+    """
+    Массовые операции над выбранными задачами.
+
+    Перемещение, метки, приоритет и удаление применяются ко всем задачам
+    в одной транзакции набором bulk-запросов, доска обновляется один раз.
+    """
+    project = get_object_or_404(Project, slug=slug)
+    task_ids = [int(i) for i in request.POST.getlist("task_ids") if i.isdigit()]
+    tasks = project.tasks.filter(id__in=task_ids)
+    action = request.POST.get("action")
+    changed, deleted = [], []
+
+    with transaction.atomic():
+        if action == "move":
+            column_id = request.POST.get("column_id", "")
+            if not column_id.isdigit():
+                return HttpResponse("Invalid column", status=400)
+            column = get_object_or_404(Column, id=int(column_id), project=project)
+            moved = list(tasks.exclude(column=column).order_by("column__rank", "rank", "id"))
+            last = column.tasks.order_by("-rank").values_list("rank", flat=True).first()
+            now = timezone.now()
+            for task, rank in zip(moved, ranks_between(last or None, None, len(moved))):
+                task.column = column
+                task.rank = rank
+                task.updated_at = now
+            Task.objects.bulk_update(moved, ["column", "rank", "updated_at"], batch_size=500)
+            changed = moved
+
+        elif action == "priority":
+            priority = request.POST.get("priority")
+            if priority not in Task.Priority.values:
+                return HttpResponse("Unknown priority", status=400)
+            changed = list(tasks.values("id", "column_id", "rank"))
+            tasks.update(priority=priority, updated_at=timezone.now())
+
+        elif action in ("add_label", "remove_label"):
+            label_id = request.POST.get("label_id", "")
+            if not label_id.isdigit():
+                return HttpResponse("Invalid label", status=400)
+            label = get_object_or_404(Label, id=int(label_id), project=project)
+            changed = list(tasks.values("id", "column_id", "rank"))
+            TaskLabel = Task.labels.through
+            if action == "add_label":
+                TaskLabel.objects.bulk_create(
+                    [TaskLabel(task_id=task_id, label_id=label.id) for task_id in tasks.values_list("id", flat=True)],
+                    ignore_conflicts=True,
+                )
+            else:
+                TaskLabel.objects.filter(label=label, task__in=tasks).delete()
+
+        elif action == "delete":
+            # Как и в task_delete, удалить можно только свои задачи
+            own = tasks.filter(created_by=request.user)
+            deleted = list(own.values_list("id", flat=True))
+            own.delete()
+
+        else:
+            return HttpResponse("Unknown action", status=400)
+
+        bump_board_version(project.id)
+        publish_tasks(project.id, changed=changed, deleted=deleted)
+
+    response = HttpResponse()
+    response["HX-Trigger"] = "taskChanged"
+    return response
+
+
 # Column endpoints
 @login_required
 def column_create(request, slug):
@@ -289,8 +496,10 @@ def column_create(request, slug):
         if form.is_valid():
             column = form.save(commit=False)
             column.project = project
-            column.order = project.columns.count()
+            column.rank = next_rank(project.columns.all())
             column.save()
+            bump_board_version(project.id)
+            publish_board(project.id)
             response = HttpResponse()
             response["HX-Trigger"] = "columnChanged"
             return response
@@ -308,6 +517,8 @@ def column_edit(request, column_id):
         form = ColumnForm(request.POST, instance=column)
         if form.is_valid():
             form.save()
+            bump_board_version(column.project_id)
+            publish_board(column.project_id)
             response = HttpResponse()
             response["HX-Trigger"] = "columnChanged"
             return response
@@ -329,12 +540,23 @@ def column_delete(request, column_id):
     if column.project.columns.count() <= 1:
         return HttpResponse("Cannot delete last column", status=400)
 
-    # Переместить задачи в первую колонку
-    first_column = column.project.columns.exclude(id=column.id).first()
-    if first_column:
-        column.tasks.update(column=first_column)
-
-    column.delete()
+    # Задачи переезжают в конец первой колонки в той же транзакции, что и
+    # удаление: иначе при сбое их удалил бы каскад
+    with transaction.atomic():
+        first_column = column.project.columns.exclude(id=column.id).first()
+        if first_column:
+            tasks = list(column.tasks.order_by("rank", "id"))
+            last = first_column.tasks.order_by("-rank").values_list("rank", flat=True).first()
+            now = timezone.now()
+            for task, rank in zip(tasks, ranks_between(last or None, None, len(tasks))):
+                task.column = first_column
+                task.rank = rank
+                task.updated_at = now
+            Task.objects.bulk_update(tasks, ["column", "rank", "updated_at"], batch_size=500)
+
+        column.delete()
+        bump_board_version(column.project_id)
+    publish_board(column.project_id)
     response = HttpResponse()
     response["HX-Trigger"] = "columnChanged"
     return response
@@ -348,12 +570,17 @@ def checklist_add(request, task_id):
     text = request.POST.get("text", "").strip()
 
     if text:
-        item = ChecklistItem.objects.create(
-            task=task,
-            text=text,
-            order=task.checklist_items.count()
-        )
-        return render(request, "core/partials/checklist_item.html", {"item": item, "task": task})
+        with transaction.atomic():
+            item = ChecklistItem.objects.create(
+                task=task,
+                text=text,
+                rank=next_rank(task.checklist_items.all())
+            )
+            Task.objects.filter(id=task.id).update(total_checklist_count=F("total_checklist_count") + 1)
+            bump_board_version(task.project_id)
+            publish_tasks(task.project_id, changed=[task])
+        html = render_to_string("core/partials/checklist_item.html", {"item": item, "task": task}, request=request)
+        return HttpResponse(html + render_card_update(request, task.project, task.id))
 
     return HttpResponse("")
 
@@ -361,18 +588,43 @@ def checklist_add(request, task_id):
 @login_required
 @require_POST
 def checklist_toggle(request, item_id):
-    item = get_object_or_404(ChecklistItem, id=item_id)
-    item.is_completed = not item.is_completed
-    item.save()
-    return render(request, "core/partials/checklist_item.html", {"item": item, "task": item.task})
+    item = get_object_or_404(ChecklistItem.objects.select_related("task"), id=item_id)
+    with transaction.atomic():
+        # Условный UPDATE: из одновременных переключений одного и того же
+        # состояния срабатывает одно, и счетчик меняется только вместе с пунктом
+        changed = ChecklistItem.objects.filter(id=item.id, is_completed=item.is_completed).update(
+            is_completed=not item.is_completed
+        )
+        if changed:
+            item.is_completed = not item.is_completed
+            delta = 1 if item.is_completed else -1
+            Task.objects.filter(id=item.task_id).update(completed_checklist_count=F("completed_checklist_count") + delta)
+            bump_board_version(item.task.project_id)
+            publish_tasks(item.task.project_id, changed=[item.task])
+    if not changed:
+        # Пункт уже переключили (или удалили) другим запросом - отдаем текущее состояние
+        item = get_object_or_404(ChecklistItem.objects.select_related("task"), id=item_id)
+    html = render_to_string("core/partials/checklist_item.html", {"item": item, "task": item.task}, request=request)
+    return HttpResponse(html + render_card_update(request, item.task.project, item.task_id))
 
 
 @login_required
 @require_http_methods(["DELETE", "POST"])
 def checklist_delete(request, item_id):
-    item = get_object_or_404(ChecklistItem, id=item_id)
-    item.delete()
-    return HttpResponse("")
+    with transaction.atomic():
+        # Пункт перечитывается под блокировкой: счетчик выполненных считается
+        # по тому состоянию, которое действительно удаляется
+        item = get_object_or_404(ChecklistItem.objects.select_for_update(), id=item_id)
+        deleted, _ = item.delete()
+        # Повторное удаление (двойной клик, старая вкладка) счетчики не трогает
+        if deleted:
+            Task.objects.filter(id=item.task_id).update(
+                total_checklist_count=F("total_checklist_count") - 1,
+                completed_checklist_count=F("completed_checklist_count") - int(item.is_completed),
+            )
+            bump_board_version(item.task.project_id)
+            publish_tasks(item.task.project_id, changed=[item.task])
+    return HttpResponse(render_card_update(request, item.task.project, item.task_id))
 
 
 # Label endpoints
@@ -386,6 +638,7 @@ def label_create(request, slug):
             label = form.save(commit=False)
             label.project = project
             label.save()
+            bump_board_version(project.id)
             response = HttpResponse()
             response["HX-Trigger"] = "labelChanged"
             return response
@@ -398,7 +651,11 @@ def label_create(request, slug):
 @require_http_methods(["DELETE", "POST"])
 def label_delete(request, label_id):
     label = get_object_or_404(Label, id=label_id)
+    # Метка пропадет с карточек этих задач
+    changed = list(label.tasks.values("id", "column_id", "rank"))
     label.delete()
+    bump_board_version(label.project_id)
+    publish_tasks(label.project_id, changed=changed)
     response = HttpResponse()
     response["HX-Trigger"] = "labelChanged"
     return response
\ No newline at end of file
@@ -29,6 +29,9 @@ function initSortable() {
             dragClass: 'sortable-drag',
             chosenClass: 'sortable-chosen',
             forceFallback: true,
+            draggable: '.task-card',
+            filter: '.task-select',
+            preventOnFilter: false,
 
             onStart: function (evt) {
                 document.body.style.cursor = 'grabbing';
@@ -41,10 +44,12 @@ function initSortable() {
                 document.body.style.cursor = '';
                 const taskId = evt.item.dataset.taskId;
                 const columnId = evt.to.dataset.columnId;
-                const newIndex = evt.newIndex;
+                // Сервер ставит задачу сразу после предыдущей карточки
+                const prev = evt.item.previousElementSibling;
+                const afterId = prev && prev.classList.contains('task-card') ? prev.dataset.taskId : '';
 
                 updateEmptyStates();
-                updateColumnCounts();
+                updateColumnCounts(evt.from, evt.to);
 
                 fetch(`/task/${taskId}/move/`, {
                     method: 'POST',
@@ -52,7 +57,7 @@ function initSortable() {
                         'Content-Type': 'application/x-www-form-urlencoded',
                         'X-CSRFToken': csrftoken
                     },
-                    body: `column_id=${columnId}&order=${newIndex}`
+                    body: `column_id=${columnId}&after_id=${afterId}`
                 });
             },
 
@@ -84,26 +89,183 @@ function updateEmptyStates() {
     });
 }
 
-function updateColumnCounts() {
-    document.querySelectorAll('.column-body').forEach(column => {
-        const container = column.querySelector('.tasks-container');
-        const count = container ? container.querySelectorAll('.task-card').length : 0;
-        const header = column.closest('.board-column').querySelector('.column-count');
-        if (header) {
-            header.textContent = count;
+// Колонки загружены не полностью, поэтому счетчики не пересчитываются
+// по DOM, а сдвигаются на перенесенную карточку
+function updateColumnCounts(from, to) {
+    if (from === to) return;
+    changeColumnCount(from, -1);
+    changeColumnCount(to, 1);
+}
+
+function changeColumnCount(container, delta) {
+    const header = container.closest('.board-column').querySelector('.column-count');
+    if (header) {
+        header.textContent = Math.max(0, (parseInt(header.textContent, 10) || 0) + delta);
+    }
+}
+
+// Множественный выбор задач для массовых операций
+const selectedTasks = new Set();
+
+function updateBulkBar() {
+    const bar = document.getElementById('bulkBar');
+    if (!bar) return;
+    bar.hidden = selectedTasks.size === 0;
+    document.getElementById('bulkCount').textContent = selectedTasks.size;
+    document.getElementById('bulkTaskIds').innerHTML = Array.from(selectedTasks)
+        .map(id => `<input type="hidden" name="task_ids" value="${id}">`)
+        .join('');
+}
+
+function restoreSelection() {
+    document.querySelectorAll('.task-select').forEach(checkbox => {
+        checkbox.checked = selectedTasks.has(checkbox.value);
+        checkbox.closest('.task-card').classList.toggle('selected', checkbox.checked);
+    });
+}
+
+function clearSelection() {
+    selectedTasks.clear();
+    restoreSelection();
+    updateBulkBar();
+}
+
+document.body.addEventListener('change', function (evt) {
+    if (!evt.target.classList.contains('task-select')) return;
+    const checkbox = evt.target;
+    if (checkbox.checked) {
+        selectedTasks.add(checkbox.value);
+    } else {
+        selectedTasks.delete(checkbox.value);
+    }
+    checkbox.closest('.task-card').classList.toggle('selected', checkbox.checked);
+    updateBulkBar();
+});
+
+const bulkClear = document.getElementById('bulkClear');
+if (bulkClear) bulkClear.addEventListener('click', clearSelection);
+
+// Живое обновление доски: сервер присылает дельты задач (BoardConsumer),
+// карточки дозапрашиваются с текущими фильтрами и встают на свое место.
+// Пока сокет открыт, доска не перезагружается целиком (см. hx-trigger).
+let boardLive = false;
+let boardSocketOpened = false;
+
+function connectBoardSocket() {
+    const board = document.getElementById('board-columns');
+    if (!board || !board.dataset.boardSocket) return;
+
+    const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const socket = new WebSocket(`${wsProtocol}//${window.location.host}${board.dataset.boardSocket}`);
+
+    socket.onopen = function () {
+        // После переподключения пропущенные события восполняет перезагрузка
+        if (boardSocketOpened) {
+            htmx.trigger(document.body, 'boardChanged');
         }
+        boardSocketOpened = true;
+        boardLive = true;
+    };
+
+    socket.onmessage = function (e) {
+        const event = JSON.parse(e.data);
+        if (event.type === 'board') {
+            htmx.trigger(document.body, 'boardChanged');
+        } else if (event.type === 'tasks') {
+            applyTaskDelta(event);
+        }
+    };
+
+    socket.onclose = function () {
+        boardLive = false;
+        setTimeout(connectBoardSocket, 2000);
+    };
+}
+
+function applyTaskDelta(event) {
+    const board = document.getElementById('board-columns');
+    const state = board.querySelector('.board-state');
+    const params = new URLSearchParams(state ? state.dataset.filterQuery : '');
+    event.changed.forEach(task => params.append('task', task.id));
+
+    fetch(`${board.dataset.cardsUrl}?${params}`)
+        .then(response => response.text().then(html => ({ response, html })))
+        .then(({ response, html }) => {
+            event.deleted.forEach(id => removeCard(id));
+
+            const template = document.createElement('template');
+            template.innerHTML = html;
+            event.changed.forEach(task => {
+                removeCard(task.id);
+                // Карточки нет в ответе - задача не проходит фильтры
+                const card = template.content.querySelector(`.task-card[data-task-id="${task.id}"]`);
+                if (card) placeCard(card, task);
+            });
+
+            setColumnCounts(JSON.parse(response.headers.get('X-Column-Counts') || '{}'));
+            updateEmptyStates();
+            restoreSelection();
+        });
+}
+
+function removeCard(taskId) {
+    const card = document.querySelector(`#board-columns .task-card[data-task-id="${taskId}"]`);
+    if (card) card.remove();
+}
+
+// Карточка встает перед первой карточкой колонки с большим (rank, id)
+function placeCard(card, task) {
+    const container = document.querySelector(`.tasks-container[data-column-id="${task.column_id}"]`);
+    if (!container) return;
+
+    const next = Array.from(container.querySelectorAll('.task-card')).find(el =>
+        el.dataset.rank > task.rank || (el.dataset.rank === task.rank && Number(el.dataset.taskId) > task.id)
+    );
+    if (next) {
+        container.insertBefore(card, next);
+    } else if (!container.querySelector('.tasks-more')) {
+        container.appendChild(card);
+    } else {
+        // Карточка ниже загруженной части колонки - придет при догрузке
+        return;
+    }
+    htmx.process(card);
+}
+
+function setColumnCounts(counts) {
+    document.querySelectorAll('#board-columns .tasks-container').forEach(container => {
+        const header = container.closest('.board-column').querySelector('.column-count');
+        if (header) header.textContent = counts[container.dataset.columnId] || 0;
     });
 }
 
 initSortable();
+connectBoardSocket();
 
 document.body.addEventListener('htmx:afterSwap', function (evt) {
     if (evt.detail.target.id === 'board-columns') {
         initSortable();
     }
+    // Догруженные и обновленные карточки сохраняют выбор
+    restoreSelection();
+});
+
+// Ответы на правку задачи содержат только ее карточку и счетчики колонок
+// (out-of-band), отрендеренные с текущими фильтрами доски
+document.body.addEventListener('htmx:configRequest', function (evt) {
+    const state = document.querySelector('#board-columns .board-state');
+    if (state) evt.detail.headers['X-Board-Filters'] = state.dataset.filterQuery;
+});
+
+document.body.addEventListener('cardChanged', function () {
+    updateEmptyStates();
+    restoreSelection();
+    const modal = bootstrap.Modal.getInstance(document.getElementById('modal'));
+    if (modal) modal.hide();
 });
 
 document.body.addEventListener('taskChanged', function () {
+    clearSelection();
     const modal = bootstrap.Modal.getInstance(document.getElementById('modal'));
     if (modal) modal.hide();
 });
@@ -46,20 +46,16 @@ function confirmDelete(taskId, taskTitle) {
 
 document.getElementById('confirmDeleteBtn').addEventListener('click', function () {
     if (deleteTaskId) {
-        fetch(`/task/${deleteTaskId}/delete/`, {
-            method: 'POST',
+        // Ответ убирает карточку и обновляет счетчики колонок (out-of-band)
+        htmx.ajax('POST', `/task/${deleteTaskId}/delete/`, {
+            swap: 'none',
             headers: {
                 'X-CSRFToken': getCookie('csrftoken')
             }
-        }).then(response => {
-            if (response.ok) {
-                // Close modal
-                const modal = bootstrap.Modal.getInstance(document.getElementById('deleteModal'));
-                modal.hide();
-
-                // Trigger board refresh
-                document.body.dispatchEvent(new CustomEvent('taskChanged'));
-            }
+        }).then(() => {
+            // Close modal
+            const modal = bootstrap.Modal.getInstance(document.getElementById('deleteModal'));
+            modal.hide();
         });
     }
 });